@@ -57,3 +57,42 @@ correction='''
 
 {data_template}
 '''
+
+# 打包请求：多个小单元合并成一个请求，每个单元的回答用带编号的 pad 包裹
+packed_data_template='''
+=start_pad_1= annotated_code_lines_of_unit_1_here =end_pad_1=
+=start_pad_2= annotated_code_lines_of_unit_2_here =end_pad_2=
+……
+
+每个代码片段的注释结果都要用对应编号的 =start_pad_编号= 和 =end_pad_编号= 包裹，编号与输入中的 =unit_编号= 一致，不许遗漏任何一个片段
+'''
+
+packed_prompt='''
+你是一个聪明的代码助手，你的工作是在不破坏代码功能的同时，为代码添加详细的注释，便于人们的理解。
+请你为我解释下面的代码，逐行中文注释，并且不许减少一行代码。
+
+接下来是正式的任务：
+--------------------------------------------------------------------------------
+下面有多个代码片段，每个片段以 =unit_编号= 开头。请分别为每个片段添加逐行详细的中文注释。
+
+{input_1}
+
+我希望你识别出它们所涉及到的主题，并且采用下面的格式回复：
+
+{data_template}
+'''
+
+def packed_validation(data):
+    # 至少有一个单元的编号 pad 完整且有内容即视为通过，缺失的单元会退回单独请求
+    pattern = re.compile(r'=start_pad_(\d+)=(.*?)=end_pad_\1=', re.DOTALL | re.IGNORECASE)
+    return any(match.group(2).strip() for match in pattern.finditer(data))
+
+packed_correction='''
+下列内容中含有一个错误的数据格式：
+
+{answer}
+
+请你修改它，使其符合以下格式：
+
+{data_template}
+'''
@@ -1,2 +1,6 @@
 from .code_analyser import CodeAnalyser
-from .data_processor import DataProcessor
\ No newline at end of file
+from .data_processor import DataProcessor
+from .manifest import RunManifest
+from .stream_writer import StreamWriter
+from .request_packer import RequestPacker
+from .code_analyser import LineIndex
\ No newline at end of file
@@ -1,21 +1,59 @@
 import ast
+import bisect
+import heapq
+import itertools
 import os
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from Packages.tokens import estimate_tokens
+
+class LineIndex:
+    """源码的行索引：每个文件只分割一次，记录各行内容和每行的起始偏移，分析器和 merge_units 共用。"""
+
+    def __init__(self, source_code):
+        self.source_code = source_code
+        self.lines = source_code.splitlines()
+        # 第 k 行（从0开始）在源码中的起始偏移，按换行符计数
+        self.line_starts = [0] + [match.end() for match in re.finditer('\n', source_code)]
+
+    def __len__(self):
+        return len(self.lines)
+
+    def segment(self, start, end):
+        """返回第 start 到 end 行（从0开始，不含 end，与 lines[start:end] 相同）拼接后的源码。"""
+        return "\n".join(self.lines[start:end])
+
+    def line_of(self, offset):
+        """返回偏移所在的行号（从0开始），等于 source_code.count('\\n', 0, offset)。"""
+        return bisect.bisect_right(self.line_starts, offset) - 1
+
 
 class CodeAnalyser:
-    def __init__(self, threshold=4096):
+    def __init__(self, threshold=4096, metrics=None, token_budget=None, estimator=estimate_tokens, output_ratio=1.0):
+        """
+        :param threshold: 按字符数合并时每个单元的字符上限
+        :param token_budget: 指定时改为按token预算合并，单元的输入token数加预计输出token数不超过该预算，
+                             单独超出预算的单元按行拆分
+        :param estimator: 估算文本token数的函数，默认为本地的快速近似，可换成模型对应的分词器
+        :param output_ratio: 预计输出token数与输入token数之比，逐行添加注释后输出通常与输入相当或更长
+        """
         self.threshold = threshold
+        self.metrics = metrics  # 可选的MetricsRegistry，按语言记录每个文件的分析耗时和单元数
+        self.token_budget = token_budget
+        self.estimator = estimator
+        self.output_ratio = output_ratio
 
     def get_source_segment(self, source, node):
-        """获取给定AST节点的源代码片段。"""
-        lines = source.splitlines()
-        start_line = node.lineno - 1
-        end_line = node.end_lineno
-        return "\n".join(lines[start_line:end_line])
+        """获取给定AST节点的源代码片段，source 可以是源码字符串或 LineIndex。"""
+        if not isinstance(source, LineIndex):
+            source = LineIndex(source)
+        return source.segment(node.lineno - 1, node.end_lineno)
 
     def py_analyser(self, source_code, file_path):
         """解析Python代码并提取代码单元。"""
         tree = ast.parse(source_code)
+        line_index = LineIndex(source_code)
         units = []
 
         import_unit = []
@@ -23,7 +61,7 @@ class CodeAnalyser:
 
         for node in ast.iter_child_nodes(tree):
             if isinstance(node, (ast.Import, ast.ImportFrom)):
-                import_unit.append(self.get_source_segment(source_code, node))
+                import_unit.append(self.get_source_segment(line_index, node))
             elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
                 if import_unit:
                     units.append({
@@ -38,14 +76,14 @@ class CodeAnalyser:
                 if last_end_line < start_line:
                     units.append({
                         "index": len(units) + 1,
-                        "source_code": "\n".join(source_code.splitlines()[last_end_line:start_line]),
+                        "source_code": line_index.segment(last_end_line, start_line),
                         "file_path": file_path,
                         "start_line": last_end_line + 1,
                         "end_line": start_line
                     })
                 units.append({
                     "index": len(units) + 1,
-                    "source_code": self.get_source_segment(source_code, node),
+                    "source_code": self.get_source_segment(line_index, node),
                     "file_path": file_path,
                     "start_line": node.lineno,
                     "end_line": node.end_lineno
@@ -63,21 +101,21 @@ class CodeAnalyser:
             })
 
         # 添加任何剩余的代码
-        if last_end_line < len(source_code.splitlines()):
+        if last_end_line < len(line_index):
             units.append({
                 "index": len(units) + 1,
-                "source_code": "\n".join(source_code.splitlines()[last_end_line:]),
+                "source_code": line_index.segment(last_end_line, len(line_index)),
                 "file_path": file_path,
                 "start_line": last_end_line + 1,
-                "end_line": len(source_code.splitlines())
+                "end_line": len(line_index)
             })
 
         # 合并单元以确保每个单元至少达到阈值字符长度
-        return self.merge_units(units, source_code, file_path)
+        return self.merge_units(units, line_index, file_path)
 
     def generic_analyser(self, source_code, file_path, patterns):
-        """通用代码解析器，用于提取代码单元。"""
-        lines = source_code.splitlines()  # 将源代码按行分割
+        """通用代码解析器，用于提取代码单元。各正则的匹配按源码顺序归并，得到有序且互不重叠的单元。"""
+        line_index = LineIndex(source_code)  # 将源代码按行分割并建立行索引
         units = []  # 存储解析后的代码单元
 
         last_end_line = 0  # 记录上一个单元的结束行号
@@ -90,46 +128,99 @@ class CodeAnalyser:
                     "end_line": end  # 单元的结束行号
                 })
 
-        # 处理关键行
-        for pattern in patterns:
-            for match in pattern.finditer(source_code):
-                start_line = source_code.count('\n', 0, match.start())  # 关键行的起始行号
-                end_line = source_code.count('\n', 0, match.end()) + 1  # 关键行的结束行号
-                if last_end_line < start_line:
-                    add_unit(last_end_line, start_line)  # 添加空白区域作为一个单元
-                add_unit(start_line, end_line)  # 添加关键行作为一个单元
-                last_end_line = end_line  # 更新上一个单元的结束行号
+        # 各正则的匹配结果本身按位置有序，归并后按源码顺序一次处理所有关键行
+        matches = heapq.merge(*(pattern.finditer(source_code) for pattern in patterns), key=lambda match: (match.start(), match.end()))
 
-        if last_end_line < len(lines):
-            add_unit(last_end_line, len(lines))  # 添加剩余的代码作为一个单元
+        # 处理关键行
+        for match in matches:
+            start_line = max(line_index.line_of(match.start()), last_end_line)  # 关键行的起始行号，与上一个单元重叠的部分截去
+            end_line = line_index.line_of(match.end()) + 1  # 关键行的结束行号
+            if end_line <= last_end_line:
+                continue  # 关键行已包含在上一个单元中
+            if last_end_line < start_line:
+                add_unit(last_end_line, start_line)  # 添加空白区域作为一个单元
+            add_unit(start_line, end_line)  # 添加关键行作为一个单元
+            last_end_line = end_line  # 更新上一个单元的结束行号
+
+        if last_end_line < len(line_index):
+            add_unit(last_end_line, len(line_index))  # 添加剩余的代码作为一个单元
 
         # 合并单元以确保每个单元至少达到阈值字符长度
-        return self.merge_units(units, source_code, file_path)
+        return self.merge_units(units, line_index, file_path)
+
+    def cumulative_costs(self, lines):
+        """前缀和数组：costs[k] 为前 k 行的大小之和。
+
+        按字符合并时每行计入行尾换行符，按token预算合并时为该行输入加预计输出的token数，
+        任意行区间的大小都可以由两个前缀和相减在常数时间内得到。
+        """
+        costs = [0] * (len(lines) + 1)
+        total = 0
+        if self.token_budget is None:
+            for i, line in enumerate(lines, 1):
+                total += len(line) + 1
+                costs[i] = total
+        else:
+            scale = 1 + self.output_ratio
+            for i, line in enumerate(lines, 1):
+                total += self.estimator(line + "\n") * scale
+                costs[i] = total
+        return costs
+
+    def split_oversized(self, units, costs):
+        """按token预算合并时，把单独超出预算的单元按行拆成不超出预算的若干段。"""
+        split_units = []
+        for unit in units:
+            start, end = unit['start_line'], min(unit['end_line'], len(costs) - 1)
+            if costs[end] - costs[start - 1] <= self.token_budget:
+                split_units.append(unit)
+                continue
+            piece_start = start
+            for line_number in range(start, end + 1):
+                if line_number > piece_start and costs[line_number] - costs[piece_start - 1] > self.token_budget:
+                    split_units.append({"start_line": piece_start, "end_line": line_number - 1})
+                    piece_start = line_number
+            split_units.append({"start_line": piece_start, "end_line": end})
+        return split_units
 
     def merge_units(self, units, source_code, file_path):
-        """合并单元以确保每个单元至少达到阈值字符长度。"""
-        lines = source_code.splitlines()
+        """合并相邻单元，使每个单元尽量接近但不超过字符阈值（或token预算）。source_code 可以是源码字符串或 LineIndex。"""
+        line_index = source_code if isinstance(source_code, LineIndex) else LineIndex(source_code)
+        lines = line_index.lines
+        costs = self.cumulative_costs(lines)
+        if self.token_budget is not None:
+            units = self.split_oversized(units, costs)
+        limit = self.threshold if self.token_budget is None else self.token_budget
+        # 按字符合并时，"\n".join 不在最后一行后加换行，大小比各行之和少1
+        join_adjust = 1 if self.token_budget is None else 0
+
         merged_units = []  # 存储合并后的代码单元
-        current_unit = []  # 当前合并的单元
+        current_cost = 0  # 当前合并单元的大小（各行大小之和）
+        current_lines = 0  # 当前合并单元的行数
         current_start_line = 0  # 当前合并单元的起始行号
 
         for unit in units:
-            if len(current_unit) == 0:
+            # 与 lines[start_line - 1:end_line] 切片相同的区间，越界部分截断
+            first = max(unit['start_line'] - 1, 0)
+            last = min(unit['end_line'], len(lines))
+            unit_cost, unit_lines = (costs[last] - costs[first], last - first) if last > first else (0, 0)
+            if current_lines == 0:
                 current_start_line = unit['start_line']  # 初始化当前合并单元的起始行号
-                current_unit = lines[unit['start_line'] - 1:unit['end_line']]  # 初始化当前合并单元
+                current_cost, current_lines = unit_cost, unit_lines  # 初始化当前合并单元
             else:
-                current_unit.extend(lines[unit['start_line'] - 1:unit['end_line']])  # 扩展当前合并单元
+                current_cost += unit_cost  # 扩展当前合并单元
+                current_lines += unit_lines
 
-            if len("\n".join(current_unit)) > self.threshold:
+            if current_lines and current_cost - join_adjust > limit:
                 merged_units.append({
                     "index": len(merged_units) + 1,  # 合并单元的索引
                     "start_line": current_start_line,  # 合并单元的起始行号
                     "end_line": unit['start_line'] - 1  # 合并单元的结束行号
                 })
-                current_unit = lines[unit['start_line'] - 1:unit['end_line']]  # 重置当前合并单元
+                current_cost, current_lines = unit_cost, unit_lines  # 重置当前合并单元
                 current_start_line = unit['start_line']  # 重置当前合并单元的起始行号
 
-        if current_unit:
+        if current_lines:
             merged_units.append({
                 "index": len(merged_units) + 1,  # 合并单元的索引
                 "start_line": current_start_line,  # 合并单元的起始行号
@@ -141,7 +232,7 @@ class CodeAnalyser:
         for merged_unit in merged_units:
             final_units.append({
                 "index": merged_unit['index'],  # 单元的索引
-                "source_code": "\n".join(lines[merged_unit['start_line'] - 1:merged_unit['end_line']]),  # 单元的源代码
+                "source_code": line_index.segment(merged_unit['start_line'] - 1, merged_unit['end_line']),  # 单元的源代码
                 "file_path": file_path,  # 文件路径
                 "start_line": merged_unit['start_line'],  # 单元的起始行号
                 "end_line": merged_unit['end_line']  # 单元的结束行号
@@ -266,7 +357,12 @@ class CodeAnalyser:
             print(f"Unsupported file type: {file_path}")
             return []
 
-    def get_units(self, root_folder, exclude_paths=None):
+    def worker_copy(self):
+        """返回不带指标注册表的副本，可以传给子进程（注册表中的锁无法序列化，指标由主进程记录）。"""
+        return CodeAnalyser(threshold=self.threshold, token_budget=self.token_budget, estimator=self.estimator, output_ratio=self.output_ratio)
+
+    def find_code_files(self, root_folder, exclude_paths=None):
+        """按遍历顺序列出目录下所有支持的源文件，跳过 exclude_paths 中的文件或目录。"""
         if exclude_paths is None:
             exclude_paths = []
         # 将相对路径转为绝对路径，便于后续处理
@@ -283,12 +379,53 @@ class CodeAnalyser:
                     # 跳过在exclude_paths中的文件或目录
                     if not any(os.path.abspath(file_path).startswith(excluded) for excluded in exclude_paths):
                         code_files.append(file_path)
+        return code_files
+
+    def iter_file_units(self, root_folder, exclude_paths=None, processes=None):
+        """逐个文件产出代码单元列表，文件分析完即可交给下游，无需等待整个仓库分析结束。
+
+        processes 大于1时用进程池并行分析文件，结果仍按文件遍历顺序产出，
+        单元索引与串行分析完全相同。并行时 estimator 需要可以被 pickle（模块级函数）。
+        """
+        code_files = self.find_code_files(root_folder, exclude_paths)
+        if processes and processes > 1 and len(code_files) > 1:
+            executor = ProcessPoolExecutor(max_workers=min(processes, len(code_files)))
+            # 小批量分发，前面的文件尽早返回；map 按提交顺序返回结果
+            results = executor.map(analyse_file, itertools.repeat(self.worker_copy()), code_files, chunksize=8)
+        else:
+            executor = None
+            results = (analyse_file(self, file_path) for file_path in code_files)
+
+        unit_count = 0
+        try:
+            for file_path, (units, elapsed) in zip(code_files, results):
+                if self.metrics is not None:
+                    language = os.path.splitext(file_path)[1].lstrip('.')
+                    self.metrics.observe('annotator_analyse_file_seconds', elapsed, language=language)
+                    self.metrics.inc('annotator_analysed_files_total', language=language)
+                    self.metrics.inc('annotator_analysed_units_total', len(units), language=language)
+                relative_path = os.path.relpath(file_path, root_folder)
+                for unit in units:
+                    unit['file_path'] = relative_path
+                    # 全局递增编号，保证不同文件的单元索引互不冲突
+                    unit_count += 1
+                    unit['index'] = unit_count
+                yield units
+        finally:
+            if executor is not None:
+                # 提前停止迭代时取消尚未开始的分析
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def get_units(self, root_folder, exclude_paths=None, processes=None):
+        """分析整个目录，返回所有代码单元；processes 大于1时用进程池并行分析文件。"""
         all_units = []
-        for file_path in code_files:
-            relative_path = os.path.relpath(file_path, root_folder)
-            units = self.get_code_units(file_path)
-            for unit in units:
-                unit['file_path'] = relative_path
-                all_units.append(unit)
-                
+        for units in self.iter_file_units(root_folder, exclude_paths, processes=processes):
+            all_units.extend(units)
         return all_units
+
+
+def analyse_file(analyser, file_path):
+    """分析单个文件，返回 (代码单元列表, 耗时)；定义在模块级以便进程池调用。"""
+    start_time = time.perf_counter()
+    units = analyser.get_code_units(file_path)
+    return units, time.perf_counter() - start_time
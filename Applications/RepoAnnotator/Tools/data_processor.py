@@ -1,42 +1,57 @@
 import os
+import time
 
 class DataProcessor:
 
     @staticmethod
-    def restructure_files(task_list, file_path_list, old_root, new_root):
-        # 创建一个映射，index 到 file_path
-        index_to_path = {index: path for index, path in file_path_list}
-        
-        # 按照 index 排序的 task_list
-        sorted_task_list = sorted(task_list, key=lambda x: x[1])
-        
+    def restructure_files(task_list, file_path_list, old_root, new_root, source_list=None, metrics=None):
+        # 创建一个映射，index 到 LLM 输出；失败的任务为 None，直接跳过
+        outputs = {task[1]: task[0] for task in task_list if task and task[0]}
+
+        # 没有输出的单元回退为原始源码，避免生成的文件缺行
+        sources = {index: source for source, index in source_list} if source_list else {}
+
         # 用于存储新的文件内容
         file_contents = {}
-        
-        for task in sorted_task_list:
-            _, index = task
-            old_file_path = index_to_path[index]
-            new_file_path = old_file_path.replace(old_root, new_root)
-            
-            if new_file_path not in file_contents:
-                file_contents[new_file_path] = []
-            
-            file_contents[new_file_path].append((index, old_file_path))
-        
+
+        # 按照 index 顺序收集每个文件的内容
+        for index, file_path in sorted(file_path_list):
+            content = outputs.get(index, sources.get(index))
+            if content is None:
+                continue
+            new_file_path = DataProcessor.new_file_path(file_path, old_root, new_root)
+            file_contents.setdefault(new_file_path, []).append(content)
+
         # 在新根目录下重建文件架构并写入内容
         for new_file_path, contents in file_contents.items():
-            # 确保目录存在
-            os.makedirs(os.path.dirname(new_file_path), exist_ok=True)
-            
-            # 按照 index 顺序写入内容
-            with open(new_file_path, 'w', encoding='utf-8') as f:
-                for _, old_file_path in sorted(contents):
-                    with open(old_file_path, 'r', encoding='utf-8') as old_file:
-                        f.write(old_file.read())
-                        f.write('\n')
+            DataProcessor.write_file(new_file_path, contents, metrics=metrics)
+
+    @staticmethod
+    def new_file_path(file_path, old_root, new_root):
+        """把源文件路径映射到新根目录下。"""
+        relative_path = os.path.relpath(file_path, old_root) if os.path.isabs(file_path) else file_path
+        return os.path.join(new_root, relative_path)
+
+    @staticmethod
+    def write_file(new_file_path, contents, metrics=None):
+        """按顺序写入各单元内容，先写临时文件再重命名，保证文件要么完整要么不存在。"""
+        start_time = time.perf_counter()
+        # 确保目录存在
+        os.makedirs(os.path.dirname(new_file_path), exist_ok=True)
+
+        temp_path = new_file_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for content in contents:
+                f.write(content)
+                f.write('\n')
+        os.replace(temp_path, new_file_path)
+        if metrics is not None:
+            metrics.observe('annotator_write_file_seconds', time.perf_counter() - start_time)
+            metrics.inc('annotator_written_files_total')
+            metrics.inc('annotator_written_bytes_total', os.path.getsize(new_file_path))
 
     @staticmethod
     def transitor(data):
         task_list = [(item['source_code'], item['index']) for item in data if item['source_code']]
         file_path_list = [(item['index'], item['file_path']) for item in data if item['source_code']]
-        return task_list, file_path_list
\ No newline at end of file
+        return task_list, file_path_list
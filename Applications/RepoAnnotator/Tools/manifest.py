@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+
+class RunManifest:
+    """记录上一次运行的文件哈希、单元边界和单元输出，用于增量标注。"""
+
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.files = {}  # 相对路径 -> {"hash": 文件哈希, "units": [单元记录]}
+        self.file_hashes = {}  # 本次运行中计算出的文件哈希
+        if os.path.isfile(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as file:
+                self.files = json.load(file).get('files', {})
+
+    @staticmethod
+    def hash_text(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def hash_file(file_path):
+        with open(file_path, 'rb') as file:
+            return hashlib.sha256(file.read()).hexdigest()
+
+    def split(self, unit_list, root_folder):
+        """将单元分为可复用上次输出的单元和需要重新请求的单元。
+
+        :return: (reused_results, pending_units)，reused_results 为 (output, index) 列表
+        """
+        reused_results = []
+        pending_units = []
+        lookups = {}
+
+        for unit in unit_list:
+            file_path = unit['file_path']
+            if file_path not in lookups:
+                file_hash = self.hash_file(os.path.join(root_folder, file_path))
+                self.file_hashes[file_path] = file_hash
+                previous = self.files.get(file_path)
+                if previous is None:
+                    lookups[file_path] = None
+                elif previous['hash'] == file_hash:
+                    # 文件未变化时边界一致，按位置直接复用
+                    lookups[file_path] = ('position', {(record['start_line'], record['end_line']): record for record in previous['units']})
+                else:
+                    # 文件有改动时按单元内容哈希查找未变化的单元
+                    lookups[file_path] = ('hash', {record['hash']: record for record in previous['units']})
+
+            lookup = lookups[file_path]
+            record = None
+            if lookup is not None:
+                mode, records = lookup
+                key = (unit['start_line'], unit['end_line']) if mode == 'position' else self.hash_text(unit['source_code'])
+                record = records.get(key)
+
+            if record and record.get('output'):
+                reused_results.append((record['output'], unit['index']))
+            else:
+                pending_units.append(unit)
+
+        return reused_results, pending_units
+
+    def update(self, unit_list, result_list, root_folder):
+        """用本次运行的单元和结果重写清单，删除的文件随之移除。"""
+        outputs = {result[1]: result[0] for result in result_list if result and result[0]}
+        files = {}
+        for unit in unit_list:
+            file_path = unit['file_path']
+            if file_path not in files:
+                file_hash = self.file_hashes.get(file_path) or self.hash_file(os.path.join(root_folder, file_path))
+                files[file_path] = {'hash': file_hash, 'units': []}
+            files[file_path]['units'].append({
+                'start_line': unit['start_line'],
+                'end_line': unit['end_line'],
+                'hash': self.hash_text(unit['source_code']),
+                'output': outputs.get(unit['index'])  # 失败的单元记为None，下次运行会重试
+            })
+        self.files = files
+
+    def save(self):
+        """原子地写回清单文件。"""
+        manifest_dir = os.path.dirname(self.manifest_path)
+        if manifest_dir:
+            os.makedirs(manifest_dir, exist_ok=True)
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({'files': self.files}, file, ensure_ascii=False)
+        os.replace(temp_path, self.manifest_path)
@@ -0,0 +1,64 @@
+from Packages.tokens import estimate_tokens
+
+class RequestPacker:
+    """把多个小单元打包成一个请求，摊薄每个请求中固定的提示词开销。
+
+    包内单元以 =unit_编号= 分隔，回答中对应 =start_pad_编号= / =end_pad_编号=；
+    解析失败的单元由 unpack 返回，交给单独请求处理。
+    """
+
+    def __init__(self, token_budget=1500, max_units=16, estimator=estimate_tokens):
+        self.token_budget = token_budget  # 每个打包请求中单元源码的token上限
+        self.max_units = max_units  # 每个打包请求最多包含的单元数
+        self.estimator = estimator
+        self.packs = {}  # 打包任务索引 -> 包内单元的任务元组列表（按编号顺序）
+
+    @staticmethod
+    def render(task_list):
+        return '\n\n'.join(f'=unit_{number}=\n{task[0]}' for number, task in enumerate(task_list, 1))
+
+    def pack(self, task_list):
+        """按原顺序贪心打包，同一文件的相邻单元尽量落在同一个请求中。
+
+        :return: (packed_list, single_list)，packed_list 为 (打包源码, 打包索引) 任务，
+                 single_list 为超出预算或凑不成包、需要单独请求的单元
+        """
+        packed_list = []
+        single_list = []
+        group = []
+        group_tokens = 0
+
+        def flush():
+            if len(group) < 2:
+                single_list.extend(group)
+                return
+            # 打包索引取负数，避免与单元索引冲突（花费统计按索引归属）
+            pack_index = -(len(self.packs) + 1)
+            self.packs[pack_index] = list(group)
+            packed_list.append((self.render(group), pack_index))
+
+        for task in task_list:
+            tokens = self.estimator(task[0])
+            if tokens > self.token_budget:
+                single_list.append(task)
+                continue
+            if group and (group_tokens + tokens > self.token_budget or len(group) >= self.max_units):
+                flush()
+                group = []
+                group_tokens = 0
+            group.append(task)
+            group_tokens += tokens
+        flush()
+        return packed_list, single_list
+
+    def unpack(self, input_tuple, result):
+        """拆分一个打包任务的结果，返回 (单元任务, 内容) 列表，解析失败的单元内容为None。"""
+        contents = {}
+        if result and result[0]:
+            # 从缓存或检查点读回的字典键是字符串
+            contents = {int(number): content for number, content in result[0].items()}
+        return [(task, contents.get(number)) for number, task in enumerate(self.packs[input_tuple[-1]], 1)]
+
+    def weights(self, pack_index):
+        """包内各单元按源码token数分摊花费的权重。"""
+        return [self.estimator(task[0]) for task in self.packs[pack_index]]
@@ -0,0 +1,77 @@
+import threading
+from .data_processor import DataProcessor
+
+class StreamWriter:
+    """流式写出器：某个文件的所有单元完成后立即原子写出该文件。
+
+    文件写出后即释放其单元的源码和输出，内存占用只与尚未写出的文件有关。
+    """
+
+    def __init__(self, file_path_list, old_root, new_root, source_list=None, metrics=None):
+        self.old_root = old_root
+        self.new_root = new_root
+        self.lock = threading.Lock()
+        self.index_to_path = {}  # 尚未写出的单元: index -> file_path
+        self.sources = {}  # 尚未写出的单元的原始源码，失败时回退使用
+        self.file_indices = {}  # 尚未写出的文件: file_path -> [index]
+        self.remaining = {}  # 每个文件还在等待的单元数量
+        self.buffers = {}  # 正在处理中的文件: file_path -> {index: content}
+        self.written_files = []
+        self.metrics = metrics  # 可选的MetricsRegistry，记录写出耗时和字节数
+        self.register(file_path_list, source_list)
+
+    def register(self, file_path_list, source_list=None):
+        """登记新的单元。边分析边处理时，一个文件的全部单元必须在其中任何单元完成之前登记。"""
+        with self.lock:
+            for index, file_path in file_path_list:
+                self.index_to_path[index] = file_path
+                self.file_indices.setdefault(file_path, []).append(index)
+                self.remaining[file_path] = self.remaining.get(file_path, 0) + 1
+            if source_list:
+                self.sources.update((index, source) for source, index in source_list)
+
+    def _release(self, file_path):
+        # 调用方持有锁：文件即将写出，不再需要其单元的源码和索引
+        for index in self.file_indices.pop(file_path, []):
+            self.index_to_path.pop(index, None)
+            self.sources.pop(index, None)
+
+    def add(self, index, content):
+        """登记一个单元的输出，失败的单元传入None时回退为原始源码。"""
+        with self.lock:
+            file_path = self.index_to_path.get(index)
+            if file_path is None or file_path not in self.remaining:
+                return
+            if content is None:
+                content = self.sources.get(index)
+            self.buffers.setdefault(file_path, {})[index] = content
+            self.remaining[file_path] -= 1
+            if self.remaining[file_path] > 0:
+                return
+            del self.remaining[file_path]
+            contents = self.buffers.pop(file_path)
+            self._release(file_path)
+        self._write(file_path, contents)
+
+    def on_result(self, input_tuple, result):
+        """供 MultiProcessor.multitask_perform 回调使用。"""
+        self.add(input_tuple[-1], result[0] if result else None)
+
+    def _write(self, file_path, contents):
+        new_file_path = DataProcessor.new_file_path(file_path, self.old_root, self.new_root)
+        DataProcessor.write_file(new_file_path, [contents[index] for index in sorted(contents) if contents[index] is not None], metrics=self.metrics)
+        with self.lock:
+            self.written_files.append(new_file_path)
+
+    def close(self):
+        """写出仍有单元未完成的文件，缺失的单元回退为原始源码。"""
+        with self.lock:
+            pending = list(self.remaining)
+        for file_path in pending:
+            with self.lock:
+                contents = self.buffers.pop(file_path, {})
+                self.remaining.pop(file_path, None)
+                for index in self.file_indices.get(file_path, []):
+                    contents.setdefault(index, self.sources.get(index))
+                self._release(file_path)
+            self._write(file_path, contents)
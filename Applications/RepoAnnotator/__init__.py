@@ -1 +1,6 @@
-from .repo_annotator import RepoAnnotator
\ No newline at end of file
+def __getattr__(name):
+    # 延迟导入 RepoAnnotator：只使用 Tools 中的代码分析器时（包括进程池的子进程）不加载各服务的SDK
+    if name == 'RepoAnnotator':
+        from .repo_annotator import RepoAnnotator
+        return RepoAnnotator
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
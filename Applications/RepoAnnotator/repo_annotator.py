@@ -1,31 +1,243 @@
 import os
 import sys
+from functools import partial
 
 # 将项目根目录添加到 sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
-from Packages.LLM_API import LLMLoader
-from Packages.LLM_Parser import LLMParser
-from Packages.Multi_Process import MultiProcessor
+from Packages.LLM_API import LLMLoader, CostTracker, HTTPPool, LocalBatchService
+from Packages.tokens import estimate_tokens
+from Packages.LLM_Parser import LLMParser, PadDetector
+from Packages.Multi_Process import MultiProcessor, AsyncMultiProcessor, ResultCache, CheckpointJournal, AIMDController, HedgePolicy, BatchRunner, MetricsRegistry, Tracer
 
 from Applications.RepoAnnotator.Tools import DataProcessor
 from Applications.RepoAnnotator.Tools import CodeAnalyser
+from Applications.RepoAnnotator.Tools import RunManifest
+from Applications.RepoAnnotator.Tools import StreamWriter
+from Applications.RepoAnnotator.Tools import RequestPacker
 from Applications.RepoAnnotator.Config.code_annotator import data_template, prompt, correction, validation
+from Applications.RepoAnnotator.Config.code_annotator import packed_data_template, packed_prompt, packed_correction, packed_validation
 
 class RepoAnnotator:
 
     @staticmethod
-    def run(root_folder, exclude_list, new_root_folder, service_type='qwen', threshold=64, num_threads=50):
+    def run(root_folder, exclude_list, new_root_folder, service_type='qwen', threshold=64, num_threads=50, cache_dir=None, cache_size=512 * 1024 * 1024, incremental=False, manifest_path=None, checkpoint_path=None, stream_output=True, engine='thread', timeout=100, adaptive_concurrency=False, budget=None, schedule='fifo', backends=None, hedge_percentile=None, hedge_ratio=0.1, stream_prefix=None, pack_budget=None, batch_mode=None, batch_dir=None, batch_poll_interval=60, service_options=None, metrics=None, metrics_path=None, metrics_port=None, trace_path=None, trace_sample_rate=1.0, token_budget=None, analysis_processes=None):
         # 初始化LLM API
-        loader = LLMLoader(service_type=service_type)
+        # service_type='composite' 时按 backends 组合多个服务，分摊额度并自动故障切换
+        # 连接池大小与并发数一致，所有线程复用长连接
+        # 指标注册表：metrics_port 提供运行中可抓取的HTTP接口，metrics_path 在结束时写出（.prom 为 Prometheus 文本，否则为JSON）
+        if metrics is None and (metrics_path or metrics_port):
+            metrics = MetricsRegistry()
+        if metrics is not None and metrics_port:
+            metrics.serve(metrics_port)
+
+        # service_type='fake' 时使用离线假服务，service_options 设置其延迟分布、错误率等，用于压测
+        if service_type == 'fake':
+            service_options = {'prompt_templates': [prompt, packed_prompt], 'correction_templates': [correction, packed_correction], **(service_options or {})}
+        loader = LLMLoader(service_type=service_type, backends=backends, pool_size=num_threads, service_options=service_options, metrics=metrics)
         llm = loader.service
         parser = LLMParser()
 
-        analyser = CodeAnalyser(threshold=threshold)
-        unit_list = analyser.get_units(root_folder, exclude_paths=exclude_list)
-        task_list, file_path_list = DataProcessor.transitor(unit_list)
+        # 指定token_budget时按估算的token数（含注释后的输出）切分单元，取代按字符数的threshold
+        analyser = CodeAnalyser(threshold=threshold, metrics=metrics, token_budget=token_budget)
+        # analysis_processes 大于1时用进程池并行分析源文件；流式写出且不使用增量、打包、批量和检查点时，
+        # 分析完的文件立即进入任务队列，前面文件的请求与其余文件的分析同时进行，单元索引与串行分析相同
+        stream_units = False
+        if analysis_processes and analysis_processes > 1:
+            blockers = [] if stream_output else ['stream_output=False']
+            blockers += [name for name, value in (('incremental', incremental), ('pack_budget', pack_budget), ('batch_mode', batch_mode), ('checkpoint_path', checkpoint_path)) if value]
+            stream_units = not blockers
+            if blockers:
+                print(f"并行分析: 因 {', '.join(blockers)} 需要在请求前得到全部单元，分析全部完成后才开始请求")
+        if stream_units:
+            unit_list, source_list, file_path_list = [], [], []
+        else:
+            unit_list = analyser.get_units(root_folder, exclude_paths=exclude_list, processes=analysis_processes)
+            unit_list = [unit for unit in unit_list if unit['source_code']]
+            source_list, file_path_list = DataProcessor.transitor(unit_list)
+
+        # 增量模式下只把内容有变化的单元交给MultiProcessor，其余沿用上次的输出
+        reused_list = []
+        pending_units = unit_list
+        if incremental:
+            manifest = RunManifest(manifest_path or os.path.join(new_root_folder, '.annotator_manifest.json'))
+            reused_list, pending_units = manifest.split(unit_list, root_folder)
+            print(f"增量标注: 复用 {len(reused_list)} 个单元，重新处理 {len(pending_units)} 个单元")
+        task_list, _ = DataProcessor.transitor(pending_units)
+
+        # 指定cache_dir时启用磁盘缓存，重复运行时跳过未变化的单元
+        cache = ResultCache(cache_dir, max_size=cache_size) if cache_dir else None
+
+        # 自适应并发：num_threads 作为上限，根据延迟和限流情况自动增减在途请求数
+        concurrency = AIMDController(initial_limit=min(8, num_threads), max_limit=num_threads) if adaptive_concurrency else None
+
+        # 按价格表统计实时花费；设置budget后，预算不足时停止接收新单元
+        cost_tracker = CostTracker.from_service(llm, budget=budget, total_units=len(task_list))
+
+        # 指定hedge_percentile时，耗时超过该延迟分位数的请求会再发一次，额外请求不超过hedge_ratio
+        hedge = HedgePolicy(percentile=hedge_percentile, max_extra_ratio=hedge_ratio) if hedge_percentile else None
+
+        # 指定stream_prefix时以流式接收回答，前stream_prefix个字符内没有=start_pad=就中止并立即重试
+        stream_detector = partial(PadDetector, max_prefix=stream_prefix) if stream_prefix else None
+
+        # 指定trace_path时记录每个单元各阶段的 span（.jsonl 为JSONL，其余为可在 chrome://tracing 中打开的 Chrome trace），按 trace_sample_rate 采样
+        tracer = None
+        if trace_path:
+            tracer = Tracer(trace_path, sample_rate=trace_sample_rate, token_counter=estimate_tokens)
+            tracer.files = dict(file_path_list)
+
+        # engine='async' 时在单个事件循环上并发请求，num_threads 即最大在途请求数
+        processor_class = AsyncMultiProcessor if engine == 'async' else MultiProcessor
+        processor_options = dict(cache=cache, timeout=timeout, concurrency=concurrency, cost_tracker=cost_tracker, schedule=schedule, hedge=hedge, metrics=metrics, tracer=tracer)
+        code_annotator = processor_class(llm, parser.parse_pads, data_template, prompt, correction, validation, stream_detector=stream_detector, **processor_options)
+
+        # 流式写出：每个文件的单元全部完成后立即写出，无需等待整个仓库处理完毕
+        writer = None
+        on_result = None
+        if stream_output:
+            writer = StreamWriter(file_path_list, root_folder, new_root_folder, source_list, metrics=metrics)
+            for output, index in reused_list:
+                writer.add(index, output)
+            on_result = writer.on_result
+
+        # 流式写出且不需要更新增量清单时，结果只交给写出器而不保留，内存只与尚未写出的文件有关
+        keep_results = writer is None or incremental
+
+        # 打包请求和批量任务中完成的单元同样写入检查点日志并通知流式写出器
+        early_results = []
+        journal = CheckpointJournal(checkpoint_path) if checkpoint_path and (pack_budget or batch_mode) else None
+        completed = journal.load(task_list) if journal is not None else {}
+        pending_list = [task for task in task_list if task[-1] not in completed]
+
+        def record_unit(task, content):
+            early_results.append((content if keep_results else None, task[-1]))
+            if journal is not None:
+                journal.append(content, task[-1], key=journal.task_key(task))
+            if on_result is not None:
+                on_result(task, (content, task[-1]))
+
+        # batch_mode='provider' 使用服务自带的批量接口，'local' 使用本地替身；未完成的单元最后改为在线请求
+        batch_llm = None
+        if batch_mode:
+            batch_dir = batch_dir or os.path.join(new_root_folder, '.annotator_batch')
+            batch_llm = llm if batch_mode == 'provider' else LocalBatchService(llm, os.path.join(batch_dir, 'local'), num_threads=num_threads)
+
+        # 指定pack_budget时，先把小单元按token预算打包请求，解析失败的单元再单独请求
+        packer = None
+        packed_units = 0
+        if pack_budget:
+            packer = RequestPacker(token_budget=pack_budget)
+            packed_list, _ = packer.pack(pending_list)
+            pack_annotator = processor_class(llm, parser.parse_numbered_pads, packed_data_template, packed_prompt, packed_correction, packed_validation, **processor_options)
+
+            def on_pack_result(input_tuple, result):
+                for task, content in packer.unpack(input_tuple, result):
+                    if content is not None:
+                        record_unit(task, content)
+
+            print(f"打包请求: {sum(len(tasks) for tasks in packer.packs.values())} 个单元合并为 {len(packed_list)} 个请求")
+            if batch_llm is not None:
+                BatchRunner(pack_annotator, batch_llm, os.path.join(batch_dir, 'packed'), poll_interval=batch_poll_interval).run(packed_list, on_result=on_pack_result)
+            else:
+                pack_annotator.multitask_perform(packed_list, num_threads, on_result=on_pack_result)
+            packed_units = len(early_results)
+            # 打包请求的花费按源码token数分摊到包内单元，保证每个文件的花费统计准确
+            for pack_index, tasks in packer.packs.items():
+                cost_tracker.split_cost(pack_index, [task[-1] for task in tasks], packer.weights(pack_index))
+
+        if batch_llm is not None:
+            finished = {index for _, index in early_results}
+            BatchRunner(code_annotator, batch_llm, os.path.join(batch_dir, 'units'), poll_interval=batch_poll_interval).run(
+                [task for task in pending_list if task[-1] not in finished], on_result=lambda task, result: record_unit(task, result[0]))
+
+        if journal is not None:
+            journal.close()
+        finished = {index for _, index in early_results}
+        task_list = [task for task in task_list if task[-1] not in finished]
+
+        streamed_units = 0
+        if stream_units:
+            def stream_tasks():
+                nonlocal streamed_units
+                for units in analyser.iter_file_units(root_folder, exclude_paths=exclude_list, processes=analysis_processes):
+                    units = [unit for unit in units if unit['source_code']]
+                    tasks, paths = DataProcessor.transitor(units)
+                    # 只保留索引和路径用于花费统计，源码交给写出器后随文件写出释放
+                    streamed_units += len(tasks)
+                    file_path_list.extend(paths)
+                    # 文件的全部单元先登记到写出器再入队，避免文件在部分单元完成时被提前写出
+                    writer.register(paths, tasks)
+                    cost_tracker.total_units += len(tasks)
+                    if tracer is not None:
+                        tracer.files.update(paths)
+                    yield from tasks
+
+            task_list = stream_tasks()
+
+        if checkpoint_path:
+            # 使用检查点日志时，中断后以相同参数重新运行即可从断点继续
+            result_list = code_annotator.resume(task_list, num_threads, CheckpointJournal(checkpoint_path), on_result=on_result, keep_results=keep_results)
+        else:
+            result_list = code_annotator.multitask_perform(task_list, num_threads, on_result=on_result, keep_results=keep_results)
+        processed_units = streamed_units if stream_units else len(task_list)
+        if keep_results:
+            failed_units = sum(1 for result in result_list if not (result and result[0] is not None))
+            result_list = result_list + early_results + reused_list
+        else:
+            # 只返回了没有结果的单元索引
+            failed_units = len(result_list)
+            result_list = []
+
+        # 运行摘要，包含花费统计（含每个文件的花费）
+        summary = {
+            'total_units': streamed_units if stream_units else len(unit_list),
+            'processed_units': processed_units + len(early_results),
+            'reused_units': len(reused_list),
+            'skipped_units': len(code_annotator.skipped),
+            'timed_out_units': len(code_annotator.timed_out),
+            'failed_units': failed_units,
+            'cost': cost_tracker.summary(file_path_list)
+        }
+        if cache is not None:
+            summary['cache'] = cache.stats()
+            print(f"缓存统计: {summary['cache']}")
+        if packer is not None:
+            summary['packing'] = {
+                'packed_requests': len(packer.packs),
+                'packed_units': packed_units,
+                'fallback_units': sum(len(tasks) for tasks in packer.packs.values()) - packed_units
+            }
+            print(f"打包请求: {summary['packing']}")
+        summary['http'] = HTTPPool.metrics()
+        if stream_detector is not None:
+            summary['stream_aborted_units'] = len(code_annotator.stream_aborts)
+        if hedge is not None:
+            summary['hedge'] = hedge.stats()
+            print(f"对冲请求: {summary['hedge']}")
+        if concurrency is not None:
+            summary['concurrency'] = concurrency.metrics()
+            print(f"并发控制: {summary['concurrency']}")
+        print(f"花费: {summary['cost']['spent']:.4f} 元，平均每单元 {summary['cost']['cost_per_unit']:.6f} 元，预计总花费 {summary['cost']['projected_cost']:.4f} 元")
+        if code_annotator.skipped:
+            print(f"预算不足，跳过了 {len(code_annotator.skipped)} 个单元，这些单元保留原始代码")
+
+        if writer is not None:
+            writer.close()
+        else:
+            DataProcessor.restructure_files(result_list, file_path_list, root_folder, new_root_folder, source_list, metrics=metrics)
+
+        if incremental:
+            manifest.update(unit_list, result_list, root_folder)
+            manifest.save()
+
+        if tracer is not None:
+            tracer.close()
+            print(f"追踪记录已写入 {trace_path}")
 
-        code_annotator = MultiProcessor(llm, parser.parse_pads, data_template, prompt, correction, validation)
-        task_list = code_annotator.multitask_perform(task_list, num_threads)
+        if metrics is not None:
+            summary['metrics'] = metrics.snapshot()
+            if metrics_path:
+                metrics.write(metrics_path)
+                print(f"指标已写入 {metrics_path}")
 
-        DataProcessor.restructure_files(task_list, file_path_list, root_folder, new_root_folder)
+        return summary
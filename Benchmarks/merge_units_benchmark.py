@@ -0,0 +1,82 @@
+"""测量 CodeAnalyser.merge_units 在不同行数的文件上的耗时，检查其随行数线性增长。
+
+每行一个单元是合并的最坏情况：每个单元都要计算一次当前合并单元的大小。
+旧实现每次都重新拼接整个合并单元（耗时与阈值内的行数成正比），作为对照一并测量。
+
+用法: python Benchmarks/merge_units_benchmark.py --lines 1000 10000 100000 --thresholds 4096 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# 将项目根目录添加到 sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Applications.RepoAnnotator.Tools.code_analyser import CodeAnalyser
+
+
+def legacy_merge_units(units, source_code, threshold):
+    """按字符阈值合并的旧实现：每加入一个单元都重新拼接并计算长度，只返回行号区间。"""
+    lines = source_code.splitlines()
+    merged_units = []
+    current_unit = []
+    current_start_line = 0
+    for unit in units:
+        if len(current_unit) == 0:
+            current_start_line = unit['start_line']
+            current_unit = lines[unit['start_line'] - 1:unit['end_line']]
+        else:
+            current_unit.extend(lines[unit['start_line'] - 1:unit['end_line']])
+        if len("\n".join(current_unit)) > threshold:
+            merged_units.append((current_start_line, unit['start_line'] - 1))
+            current_unit = lines[unit['start_line'] - 1:unit['end_line']]
+            current_start_line = unit['start_line']
+    if current_unit:
+        merged_units.append((current_start_line, unit['end_line']))
+    return merged_units
+
+
+def build_source(num_lines, seed):
+    """生成每行长度随机的源码，以及每行一个的单元列表。"""
+    rng = random.Random(seed)
+    source_code = '\n'.join('x' * rng.randint(0, 80) for _ in range(num_lines))
+    units = [{'start_line': line, 'end_line': line} for line in range(1, num_lines + 1)]
+    return source_code, units
+
+
+def best_time(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--thresholds', type=int, nargs='+', default=[4096, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--legacy-max-lines', type=int, default=10000, help='超过该行数时不再测量旧实现（旧实现为平方级，耗时过长）')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for threshold in args.thresholds:
+        analyser = CodeAnalyser(threshold=threshold)
+        print(f"阈值 {threshold} 字符")
+        for num_lines in args.lines:
+            source_code, units = build_source(num_lines, args.seed)
+            elapsed, merged = best_time(lambda: analyser.merge_units(units, source_code, 'benchmark.py'), args.repeat)
+            line = f"  {num_lines:>7} 行: {elapsed * 1000:9.2f}ms，每行 {elapsed / num_lines * 1e6:6.3f}us，{len(merged)} 个单元"
+            if num_lines <= args.legacy_max_lines:
+                legacy_elapsed, legacy_merged = best_time(lambda: legacy_merge_units(units, source_code, threshold), args.repeat)
+                assert legacy_merged == [(unit['start_line'], unit['end_line']) for unit in merged], '合并结果与旧实现不一致'
+                line += f"；旧实现 {legacy_elapsed * 1000:9.2f}ms，每行 {legacy_elapsed / num_lines * 1e6:8.3f}us"
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,382 @@
+"""在合成仓库上端到端运行 RepoAnnotator.run，输出吞吐量、单元延迟分位数、各阶段耗时和峰值内存的JSON报告。
+
+后端为 FakeService，不发出任何网络请求。用 --baseline 指定上一次的报告即可比较两个提交的吞吐量。
+
+用法: python Benchmarks/pipeline_benchmark.py --files 200 --threads 32 --latency 0.05 --output bench.json
+"""
+import argparse
+import functools
+import inspect
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# 将项目根目录添加到 sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Packages.LLM_API import FakeService
+from Packages.LLM_Parser import LLMParser
+from Packages.Multi_Process import MultiProcessor, AsyncMultiProcessor
+from Packages.Multi_Process import multi_process, async_multi_process
+from Applications.RepoAnnotator.Tools import CodeAnalyser, DataProcessor, StreamWriter
+from Applications.RepoAnnotator.repo_annotator import RepoAnnotator
+
+try:
+    import resource
+except ImportError:
+    # Windows 上没有 resource 模块，不统计峰值内存
+    resource = None
+
+
+def py_function(name, body_lines):
+    body = '\n'.join(f'    value_{i} = x * {i} + {i}' for i in range(body_lines))
+    return f'def {name}(x):\n{body}\n    return x\n'
+
+
+def js_function(name, body_lines):
+    body = '\n'.join(f'    let value_{i} = x * {i} + {i};' for i in range(body_lines))
+    return f'function {name}(x) {{\n{body}\n    return x;\n}}\n'
+
+
+def c_function(name, body_lines):
+    body = '\n'.join(f'    int value_{i} = x * {i} + {i};' for i in range(body_lines))
+    return f'int {name}(int x) {{\n{body}\n    return x;\n}}\n'
+
+
+def java_function(name, body_lines):
+    body = '\n'.join(f'        int value_{i} = x * {i} + {i};' for i in range(body_lines))
+    return f'    public static int {name}(int x) {{\n{body}\n        return x;\n    }}\n'
+
+
+def php_function(name, body_lines):
+    body = '\n'.join(f'    $value_{i} = $x * {i} + {i};' for i in range(body_lines))
+    return f'function {name}($x) {{\n{body}\n    return $x;\n}}\n'
+
+
+def ruby_function(name, body_lines):
+    body = '\n'.join(f'  value_{i} = x * {i} + {i}' for i in range(body_lines))
+    return f'def {name}(x)\n{body}\n  x\nend\n'
+
+
+def go_function(name, body_lines):
+    body = '\n'.join(f'    value{i} := x * {i} + {i}\n    _ = value{i}' for i in range(body_lines))
+    return f'func {name}(x int) {{\n{body}\n}}\n'
+
+
+def html_block(name, body_lines):
+    body = '\n'.join(f'  <p id="{name}_{i}">{name} {i}</p>' for i in range(body_lines))
+    return f'<script>\n  var {name} = {body_lines};\n</script>\n<div>\n{body}\n</div>\n'
+
+
+# 扩展名 -> (文件头, 单元生成函数, 文件尾)，覆盖 CodeAnalyser 支持的全部语言
+LANGUAGES = {
+    '.py': ('import os\nimport sys\n\n', py_function, ''),
+    '.js': ("import fs from 'fs';\n\n", js_function, ''),
+    '.c': ('#include <stdio.h>\n\n', c_function, ''),
+    '.cpp': ('#include <vector>\n\n', c_function, ''),
+    '.java': ('package bench;\n\npublic class Bench {\n', java_function, '}\n'),
+    '.php': ('<?php\nnamespace Bench;\n\n', php_function, ''),
+    '.rb': ("require 'json'\n\n", ruby_function, ''),
+    '.go': ('package bench\n\n', go_function, ''),
+    '.html': ('<!DOCTYPE html>\n<html>\n<body>\n', html_block, '</body>\n</html>\n'),
+}
+
+
+def generate_repo(root_folder, num_files, seed, skew=1.2, mean_units=6):
+    """生成合成仓库：各语言轮流出现，每个文件的单元数服从 pareto 分布（大部分文件很小，少数文件很大）。"""
+    rng = random.Random(seed)
+    extensions = sorted(LANGUAGES)
+    for file_number in range(num_files):
+        extension = extensions[file_number % len(extensions)]
+        header, make_unit, footer = LANGUAGES[extension]
+        num_units = max(1, int(rng.paretovariate(skew) * mean_units * (skew - 1) / skew))
+        units = [make_unit(f'unit_{file_number}_{k}', rng.randint(2, 12)) for k in range(num_units)]
+        folder = os.path.join(root_folder, f'pkg_{file_number % 10}')
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f'module_{file_number}{extension}'), 'w', encoding='utf-8') as file:
+            file.write(header + '\n'.join(units) + footer)
+
+
+def percentile(sorted_values, q):
+    """最近秩法分位数，sorted_values 需已排序。"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class StageProfiler:
+    """在基准测试期间包装流水线各阶段的函数，累计每个阶段的耗时。
+
+    嵌套调用只在最外层计时（例如 parse_numbered_pads 内部调用的 parse_pads），
+    并发执行的阶段（解析、写出、请求）累计的是各线程耗时之和。
+    """
+
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+        self.unit_latencies = []
+        self.queue_waits = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.patched = []
+        self.run_started = {}  # 处理器 id -> 最近一次 multitask_perform 开始时间
+
+    def add(self, stage, elapsed):
+        with self.lock:
+            self.totals[stage] = self.totals.get(stage, 0.0) + elapsed
+            self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def patch(self, owner, name, wrapper):
+        original = owner.__dict__[name]
+        self.patched.append((owner, name, original))
+        function = original.__func__ if isinstance(original, staticmethod) else original
+        wrapped = functools.wraps(function)(wrapper(function))
+        setattr(owner, name, staticmethod(wrapped) if isinstance(original, staticmethod) else wrapped)
+
+    def stage(self, owner, name, stage):
+        def wrapper(function):
+            if inspect.iscoroutinefunction(function):
+                async def timed(*args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return await function(*args, **kwargs)
+                    finally:
+                        self.add(stage, time.perf_counter() - start)
+                return timed
+
+            def timed(*args, **kwargs):
+                depth = getattr(self.local, stage, 0)
+                setattr(self.local, stage, depth + 1)
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    setattr(self.local, stage, depth)
+                    if depth == 0:
+                        self.add(stage, time.perf_counter() - start)
+            return timed
+        self.patch(owner, name, wrapper)
+
+    def stage_iterator(self, owner, name, stage):
+        """包装生成器函数：调用生成器函数本身不做任何工作，按每次取出下一个元素的耗时计时。
+
+        流式分析时分析与请求同时进行，记录的是取任务一方等待分析结果的时间。
+        """
+        def wrapper(function):
+            def timed(*args, **kwargs):
+                iterator = function(*args, **kwargs)
+                try:
+                    while True:
+                        start = time.perf_counter()
+                        try:
+                            item = next(iterator)
+                        except StopIteration:
+                            return
+                        finally:
+                            self.add(stage, time.perf_counter() - start)
+                        yield item
+                finally:
+                    iterator.close()
+            return timed
+        self.patch(owner, name, wrapper)
+
+    def units(self, owner, name):
+        """记录每个任务（打包时为一个打包请求）从开始处理到得到结果的延迟，以及开始处理前在队列中等待的时间。"""
+        def record(processor, start):
+            with self.lock:
+                self.unit_latencies.append(time.perf_counter() - start)
+                self.queue_waits.append(start - self.run_started.get(id(processor), start))
+
+        def wrapper(function):
+            if inspect.iscoroutinefunction(function):
+                async def timed(processor, *args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return await function(processor, *args, **kwargs)
+                    finally:
+                        record(processor, start)
+                return timed
+
+            def timed(processor, *args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(processor, *args, **kwargs)
+                finally:
+                    record(processor, start)
+            return timed
+        self.patch(owner, name, wrapper)
+
+    def runs(self, owner, name):
+        def wrapper(function):
+            def timed(processor, *args, **kwargs):
+                self.run_started[id(processor)] = time.perf_counter()
+                return function(processor, *args, **kwargs)
+            return timed
+        self.patch(owner, name, wrapper)
+
+    def install(self):
+        # get_units 与流式分析都经过 iter_file_units，只包装它才能同时覆盖两种模式
+        self.stage_iterator(CodeAnalyser, 'iter_file_units', 'analyse')
+        self.stage(multi_process, 'order_tasks', 'schedule')
+        self.stage(async_multi_process, 'order_tasks', 'schedule')
+        self.stage(FakeService, 'ask', 'llm')
+        self.stage(FakeService, 'ask_async', 'llm')
+        self.stage(LLMParser, 'parse_pads', 'parse')
+        self.stage(LLMParser, 'parse_numbered_pads', 'parse')
+        self.stage(StreamWriter, '_write', 'write')
+        self.stage(DataProcessor, 'restructure_files', 'write')
+        self.units(MultiProcessor, 'process_tuple')
+        self.units(AsyncMultiProcessor, 'process_tuple_async')
+        self.runs(MultiProcessor, 'multitask_perform')
+        self.runs(AsyncMultiProcessor, 'multitask_perform')
+
+    def uninstall(self):
+        for owner, name, original in reversed(self.patched):
+            setattr(owner, name, original)
+        self.patched = []
+
+    @staticmethod
+    def distribution(values):
+        values = sorted(values)
+        return {
+            'count': len(values),
+            'mean': sum(values) / len(values) if values else None,
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'p99': percentile(values, 99),
+            'max': values[-1] if values else None,
+        }
+
+    def report(self):
+        stages = {stage: {'seconds': round(self.totals[stage], 6), 'calls': self.counts[stage]} for stage in sorted(self.totals)}
+        return stages, self.distribution(self.unit_latencies), self.distribution(self.queue_waits)
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位为KB，macOS 上单位为字节
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 2)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(args):
+    work_dir = tempfile.mkdtemp(prefix='annotator_bench_')
+    root_folder = os.path.join(work_dir, 'repo')
+    new_root_folder = os.path.join(work_dir, 'annotated')
+    try:
+        generate_repo(root_folder, args.files, args.seed, skew=args.skew)
+        service_options = {
+            'latency': args.latency,
+            'distribution': args.distribution,
+            'seconds_per_token': args.seconds_per_token,
+            'error_rate': args.error_rate,
+            'malformed_rate': args.malformed_rate,
+            'seed': args.seed,
+        }
+        profiler = StageProfiler()
+        profiler.install()
+        try:
+            start = time.perf_counter()
+            summary = RepoAnnotator.run(root_folder, [], new_root_folder, service_type='fake', threshold=args.threshold,
+                                        num_threads=args.threads, engine=args.engine, schedule=args.schedule,
+                                        pack_budget=args.pack_budget, service_options=service_options,
+                                        analysis_processes=args.analysis_processes)
+            wall_time = time.perf_counter() - start
+        finally:
+            profiler.uninstall()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    stages, unit_latency, queue_wait = profiler.report()
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': vars(args),
+        'files': args.files,
+        'total_units': summary['total_units'],
+        'processed_units': summary['processed_units'],
+        'wall_time': round(wall_time, 6),
+        'units_per_second': round(summary['processed_units'] / wall_time, 3) if wall_time else None,
+        'unit_latency': unit_latency,
+        'queue_wait': queue_wait,
+        'stages': stages,
+        'peak_rss_mb': peak_rss_mb(),
+        'http': summary.get('http'),
+        'packing': summary.get('packing'),
+    }
+
+
+def compare(report, baseline, tolerance):
+    """与基线报告比较吞吐量和p95延迟，返回是否出现超过容差的退化。"""
+    regressed = False
+    old, new = baseline['units_per_second'], report['units_per_second']
+    if old and new:
+        change = (new - old) / old
+        print(f"吞吐量: {old:.2f} -> {new:.2f} 单元/秒 ({change:+.1%})")
+        regressed = change < -tolerance
+    old, new = baseline['unit_latency']['p95'], report['unit_latency']['p95']
+    if old and new:
+        print(f"p95 单元延迟: {old * 1000:.1f} -> {new * 1000:.1f} ms ({(new - old) / old:+.1%})")
+    if regressed:
+        print(f"吞吐量下降超过 {tolerance:.0%}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--skew', type=float, default=1.2, help='文件大小 pareto 分布的形状参数，越小越偏斜')
+    parser.add_argument('--threshold', type=int, default=256)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--engine', choices=['thread', 'async'], default='thread')
+    parser.add_argument('--schedule', default='fifo')
+    parser.add_argument('--pack-budget', type=int, default=None)
+    parser.add_argument('--analysis-processes', type=int, default=None, help='并行分析源文件的进程数，大于1时分析与请求同时进行')
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--distribution', default='lognormal', choices=FakeService.DISTRIBUTIONS)
+    parser.add_argument('--seconds-per-token', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--malformed-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='JSON报告的输出路径，默认打印到标准输出')
+    parser.add_argument('--baseline', default=None, help='用于比较的历史JSON报告')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='允许的吞吐量下降比例，超过时以状态码1退出')
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text)
+        print(f"{report['processed_units']} 个单元，{report['units_per_second']} 单元/秒，报告已写入 {args.output}")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        if compare(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,8 @@
 from .qwen import QwenService
-from .loader import LLMLoader
\ No newline at end of file
+from .loader import LLMLoader
+from .rate_limiter import RateLimiter
+from .cost_tracker import CostTracker
+from .composite import CompositeService
+from .http_pool import HTTPPool
+from .local_batch import LocalBatchService
+from .fake import FakeService
\ No newline at end of file
@@ -0,0 +1,172 @@
+import asyncio
+import contextvars
+import inspect
+import threading
+import time
+from .errors import ERROR_PREFIXES, THROTTLE_MARKERS, THROTTLE_STATUS_PATTERN, is_throttled
+
+class CompositeService:
+    """把多个LLM服务组合成一个服务，按加权轮询或最低延迟分发请求，出错或限流时自动切换。
+
+    对外提供与 QwenService 相同的 ask / ask_async 接口，可直接交给 MultiProcessor 使用。
+    """
+    # 错误前缀和限流判断见 errors.py，保留为类属性以兼容原有用法
+    ERROR_PREFIXES = ERROR_PREFIXES
+    THROTTLE_MARKERS = THROTTLE_MARKERS
+    THROTTLE_STATUS_PATTERN = THROTTLE_STATUS_PATTERN
+    is_throttled = staticmethod(is_throttled)
+
+    def __init__(self, services, weights=None, routing='weighted', cooldown=30, throttle_cooldown=10):
+        if not services:
+            raise ValueError('至少需要一个服务')
+        self.services = list(services)
+        self.weights = list(weights) if weights else [1] * len(self.services)
+        self.routing = routing  # 'weighted' 加权轮询，'least_latency' 最低延迟
+        self.cooldown = cooldown  # 服务出错后暂停分发的秒数
+        self.throttle_cooldown = throttle_cooldown  # 服务被限流后暂停分发的秒数
+        self.version = '+'.join(getattr(service, 'version', type(service).__name__) for service in self.services)
+        self.lock = threading.Lock()
+        # admit 选定的服务顺序，线程和协程各自独立
+        self.pinned = contextvars.ContextVar('pinned_candidates', default=None)
+        # 最近一次成功回答的服务，线程和协程各自独立，用于按实际回答的后端统计用量和花费
+        self.last_service = contextvars.ContextVar('last_service', default=None)
+        self.current_weights = [0] * len(self.services)
+        self.latency_ewma = [None] * len(self.services)
+        self.unavailable_until = [0.0] * len(self.services)
+        self.stats = [{'requests': 0, 'errors': 0, 'throttles': 0} for _ in self.services]
+
+    def _candidates(self):
+        """返回本次请求依次尝试的服务下标，首选项由路由策略决定。"""
+        with self.lock:
+            now = time.time()
+            available = [i for i in range(len(self.services)) if self.unavailable_until[i] <= now]
+            if not available:
+                # 所有服务都在冷却中时，按最早恢复的顺序尝试
+                available = sorted(range(len(self.services)), key=lambda i: self.unavailable_until[i])
+
+            if self.routing == 'least_latency':
+                # 尚无延迟数据的服务优先尝试，以便收集延迟
+                return sorted(available, key=lambda i: self.latency_ewma[i] or 0.0)
+
+            # 平滑加权轮询（与 nginx 相同的算法）
+            total = sum(self.weights[i] for i in available)
+            for i in available:
+                self.current_weights[i] += self.weights[i]
+            first = max(available, key=lambda i: self.current_weights[i])
+            self.current_weights[first] -= total
+            return [first] + [i for i in available if i != first]
+
+    def _record(self, i, latency, error=None):
+        with self.lock:
+            self.stats[i]['requests'] += 1
+            if error is None:
+                previous = self.latency_ewma[i]
+                self.latency_ewma[i] = latency if previous is None else 0.8 * previous + 0.2 * latency
+                return
+            self.stats[i]['errors'] += 1
+            if self.is_throttled(error):
+                self.stats[i]['throttles'] += 1
+                self.unavailable_until[i] = time.time() + self.throttle_cooldown
+            else:
+                self.unavailable_until[i] = time.time() + self.cooldown
+
+    def _check(self, answer):
+        # 以字符串形式返回的错误视为失败，交给下一个服务
+        if isinstance(answer, str) and answer.startswith(self.ERROR_PREFIXES):
+            raise RuntimeError(answer)
+        return answer
+
+    def admit(self, prompt):
+        """选定当前线程（或协程）下一次请求的首选服务，并预先取得该服务的限流额度；切换到其余服务时仍在请求中等待额度。"""
+        candidates = self._candidates()
+        self.pinned.set(candidates)
+        rate_limiter = getattr(self.services[candidates[0]], 'rate_limiter', None)
+        if rate_limiter is not None:
+            rate_limiter.admit(prompt)
+
+    async def admit_async(self, prompt):
+        """admit 的协程版本。"""
+        candidates = self._candidates()
+        self.pinned.set(candidates)
+        rate_limiter = getattr(self.services[candidates[0]], 'rate_limiter', None)
+        if rate_limiter is not None:
+            await rate_limiter.admit_async(prompt)
+
+    def _take_pinned(self):
+        candidates = self.pinned.get()
+        if candidates is not None:
+            self.pinned.set(None)
+        return candidates
+
+    def discard(self):
+        """放弃 admit 选定的服务和预先取得的额度。"""
+        candidates = self._take_pinned()
+        rate_limiter = getattr(self.services[candidates[0]], 'rate_limiter', None) if candidates else None
+        if rate_limiter is not None:
+            rate_limiter.discard()
+
+    def ask(self, prompt, timeout=None):
+        last_error = None
+        # 使用 admit 选定的服务顺序，保证预先取得的额度属于实际请求的服务
+        candidates = self._take_pinned() or self._candidates()
+        for i in candidates:
+            service = self.services[i]
+            start_time = time.time()
+            try:
+                if timeout is not None and 'timeout' in inspect.signature(service.ask).parameters:
+                    answer = self._check(service.ask(prompt, timeout=timeout))
+                else:
+                    answer = self._check(service.ask(prompt))
+            except Exception as e:
+                last_error = e
+                self._record(i, time.time() - start_time, e)
+                continue
+            self._record(i, time.time() - start_time)
+            self.last_service.set(service)
+            return answer
+        raise RuntimeError(f"所有服务均请求失败: {last_error}")
+
+    async def ask_async(self, prompt, timeout=None):
+        last_error = None
+        candidates = self._take_pinned() or self._candidates()
+        for i in candidates:
+            service = self.services[i]
+            start_time = time.time()
+            try:
+                if hasattr(service, 'ask_async'):
+                    if timeout is not None and 'timeout' in inspect.signature(service.ask_async).parameters:
+                        answer = await service.ask_async(prompt, timeout=timeout)
+                    else:
+                        answer = await service.ask_async(prompt)
+                else:
+                    loop = asyncio.get_running_loop()
+                    # 复制上下文，同步服务在线程中仍能使用预先取得的限流额度
+                    answer = await loop.run_in_executor(None, contextvars.copy_context().run, service.ask, prompt)
+                answer = self._check(answer)
+            except Exception as e:
+                last_error = e
+                self._record(i, time.time() - start_time, e)
+                continue
+            self._record(i, time.time() - start_time)
+            self.last_service.set(service)
+            return answer
+        raise RuntimeError(f"所有服务均请求失败: {last_error}")
+
+    def served_version(self):
+        """返回当前线程（或协程）最近一次成功请求所用服务的模型名。"""
+        service = self.last_service.get()
+        return getattr(service, 'version', type(service).__name__) if service is not None else None
+
+    def last_usage(self):
+        """返回当前线程最近一次成功请求所用服务的token用量。"""
+        service = self.last_service.get()
+        last_usage = getattr(service, 'last_usage', None)
+        return last_usage() if callable(last_usage) else None
+
+    def metrics(self):
+        """返回各服务的请求数、错误数、限流次数和平均延迟。"""
+        with self.lock:
+            return {
+                getattr(service, 'version', type(service).__name__) + f'#{i}': dict(self.stats[i], latency_ewma=self.latency_ewma[i])
+                for i, service in enumerate(self.services)
+            }
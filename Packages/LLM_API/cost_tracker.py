@@ -0,0 +1,161 @@
+import json
+import threading
+from ..tokens import estimate_tokens
+
+class CostTracker:
+    """根据价格表统计运行中的实时花费，并在预算不足时拒绝新的单元。"""
+
+    # 批量推理按实时价格的折扣计费，价格表中的 batch_discount 可覆盖
+    BATCH_DISCOUNT = 0.5
+
+    def __init__(self, input_price=0.0, output_price=0.0, budget=None, total_units=0, batch_discount=BATCH_DISCOUNT, prices=None, output_ratio=1.0):
+        self.input_price = input_price  # 每个输入token的价格（元）
+        self.output_price = output_price  # 每个输出token的价格（元）
+        self.batch_discount = batch_discount  # 批量请求的价格折扣
+        self.prices = prices or {}  # 模型名 -> (输入价格, 输出价格, 批量折扣)，组合服务按实际回答的后端计价
+        self.budget = budget  # 花费上限（元），None表示不限制
+        self.output_ratio = output_ratio  # 预计输出token数与输入token数之比，用于在还没有单元完成时估算花费
+        self.total_units = total_units
+        self.lock = threading.Lock()
+        self.spent = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.unit_costs = {}  # 单元索引 -> 花费
+        self.in_flight = 0
+        self.in_flight_estimate = 0.0  # 按提示词估算的在途单元花费
+        self.completed = 0
+        self.skipped = 0
+
+    @classmethod
+    def read_price(cls, price_file, model, budget=None):
+        """从 qwen_price.json 格式的价格表中读取指定模型的 (输入价格, 输出价格, 批量折扣)。
+
+        设置了预算却找不到价格时抛出 ValueError，按0计价的花费永远不会超出预算。
+        """
+        try:
+            with open(price_file, 'r', encoding='utf-8') as file:
+                prices = json.load(file).get(model, {})
+        except (OSError, ValueError):
+            prices = {}
+        if not prices:
+            if budget is not None:
+                raise ValueError(f"价格表中未找到模型 {model}，无法按预算 {budget} 控制花费")
+            print(f"价格表中未找到模型 {model}，花费按0计算")
+        return prices.get('input_price', 0.0), prices.get('output_price', 0.0), prices.get('batch_discount', cls.BATCH_DISCOUNT)
+
+    @classmethod
+    def from_price_file(cls, price_file, model, **kwargs):
+        """从 qwen_price.json 格式的价格表中读取指定模型的价格。"""
+        input_price, output_price, batch_discount = cls.read_price(price_file, model, kwargs.get('budget'))
+        return cls(input_price, output_price, batch_discount=batch_discount, **kwargs)
+
+    @classmethod
+    def service_price(cls, service, budget=None):
+        """服务自带价格（如 FakeService 的模拟价格）时直接使用，否则查服务的价格表。"""
+        if getattr(service, 'input_price', None) is not None:
+            return service.input_price, service.output_price or 0.0, getattr(service, 'batch_discount', cls.BATCH_DISCOUNT)
+        return cls.read_price(getattr(service, 'price_json_file_path', ''), getattr(service, 'version', ''), budget)
+
+    @classmethod
+    def from_service(cls, service, **kwargs):
+        """按服务的价格构造。组合服务的每个后端分别计价，无法确定回答来自哪个后端时按最贵的后端估算。"""
+        backends = getattr(service, 'services', None) or [service]
+        prices = {getattr(backend, 'version', type(backend).__name__): cls.service_price(backend, kwargs.get('budget')) for backend in backends}
+        input_price = max(price[0] for price in prices.values())
+        output_price = max(price[1] for price in prices.values())
+        batch_discount = max(price[2] for price in prices.values())
+        return cls(input_price, output_price, batch_discount=batch_discount, prices=prices, **kwargs)
+
+    def cost_per_unit(self):
+        with self.lock:
+            return self._cost_per_unit()
+
+    def _cost_per_unit(self):
+        return self.spent / self.completed if self.completed else 0.0
+
+    def estimate_cost(self, prompt):
+        """按提示词的token数和 output_ratio 估算一次请求的花费。"""
+        return estimate_tokens(prompt) * (self.input_price + self.output_price * self.output_ratio)
+
+    def admit(self, prompt=None):
+        """预算允许时登记一个在途单元并返回True，否则返回False。
+
+        :param prompt: 单元的提示词，还没有单元完成时按它估算花费，使第一批并发的单元也受预算限制
+        """
+        estimate = self.estimate_cost(prompt) if prompt is not None else 0.0
+        with self.lock:
+            if self.budget is not None:
+                # 已花费 + 在途单元的预计花费 + 新单元的预计花费不能超过预算
+                if self.completed:
+                    expected = self.spent + (self.in_flight + 1) * self._cost_per_unit()
+                else:
+                    expected = self.spent + self.in_flight_estimate + estimate
+                if expected > self.budget:
+                    self.skipped += 1
+                    return False
+            self.in_flight += 1
+            self.in_flight_estimate += estimate
+            return True
+
+    def record(self, unit_index, prompt, answer, usage=None, model=None, batch=False):
+        """记录一次请求的花费，usage 为 (输入token数, 输出token数)，缺省时按文本估算。
+
+        :param model: 实际回答请求的模型，按该模型的价格计价；缺省或不在价格表中时使用默认价格
+        :param batch: 是否为批量请求，批量请求按折扣价计价
+        """
+        input_tokens, output_tokens = usage if usage else (estimate_tokens(prompt), estimate_tokens(answer))
+        input_price, output_price, batch_discount = self.prices.get(model, (self.input_price, self.output_price, self.batch_discount))
+        cost = input_tokens * input_price + output_tokens * output_price
+        if batch:
+            cost *= batch_discount
+        with self.lock:
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.spent += cost
+            self.unit_costs[unit_index] = self.unit_costs.get(unit_index, 0.0) + cost
+
+    def split_cost(self, index, unit_indices, weights=None):
+        """把记在 index 下的花费（例如打包请求）按权重分摊给 unit_indices 中的单元。"""
+        if not weights or not sum(weights):
+            weights = [1] * len(unit_indices)
+        total = sum(weights)
+        with self.lock:
+            cost = self.unit_costs.pop(index, 0.0)
+            for unit_index, weight in zip(unit_indices, weights):
+                self.unit_costs[unit_index] = self.unit_costs.get(unit_index, 0.0) + cost * weight / total
+
+    def complete(self, prompt=None):
+        """登记一个在途单元完成，prompt 与 admit 时传入的相同。"""
+        estimate = self.estimate_cost(prompt) if prompt is not None else 0.0
+        with self.lock:
+            self.in_flight -= 1
+            self.in_flight_estimate = max(self.in_flight_estimate - estimate, 0.0)
+            self.completed += 1
+
+    def projected_cost(self):
+        """按当前单元平均花费预测整个运行的总花费。"""
+        with self.lock:
+            remaining = max(self.total_units - self.completed - self.skipped, 0)
+            return self.spent + remaining * self._cost_per_unit()
+
+    def summary(self, file_path_list=None):
+        """汇总花费，传入 (index, file_path) 列表时附带每个文件的花费。"""
+        projected = self.projected_cost()
+        with self.lock:
+            result = {
+                'spent': self.spent,
+                'budget': self.budget,
+                'cost_per_unit': self._cost_per_unit(),
+                'projected_cost': projected,
+                'input_tokens': self.input_tokens,
+                'output_tokens': self.output_tokens,
+                'completed_units': self.completed,
+                'skipped_units': self.skipped
+            }
+            if file_path_list is not None:
+                file_costs = {}
+                for index, file_path in file_path_list:
+                    if index in self.unit_costs:
+                        file_costs[file_path] = file_costs.get(file_path, 0.0) + self.unit_costs[index]
+                result['file_costs'] = file_costs
+        return result
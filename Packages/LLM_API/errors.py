@@ -0,0 +1,15 @@
+import re
+
+# 服务以字符串形式返回的错误前缀，以及表示被限流的关键字
+ERROR_PREFIXES = ('请求失败', '请求过程中发生错误', '无法获取回答')
+THROTTLE_MARKERS = ('Throttling', 'RateQuota', 'rate_limit', 'Rate limit', 'Too Many Requests')
+# 429 只在以状态码的形式出现时才算限流（如 "请求失败: 429 - ..."、"Error code: 429"），错误信息中的行号、token数等不算
+THROTTLE_STATUS_PATTERN = re.compile(r'(?:请求失败: |HTTP |[Ss]tatus code:? |Error code: )429\b')
+
+def is_throttled(error):
+    """判断异常或错误信息是否表示被限流，异常带有HTTP状态码时（openai、httpx 的异常）优先按状态码判断。"""
+    status_code = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    if status_code == 429:
+        return True
+    message = str(error)
+    return any(marker in message for marker in THROTTLE_MARKERS) or THROTTLE_STATUS_PATTERN.search(message) is not None
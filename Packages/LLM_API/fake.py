@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+from ..tokens import estimate_tokens
+
+class FakeService:
+    """不发任何网络请求的假服务，用于离线压测 MultiProcessor、LLMParser 和 DataProcessor。
+
+    回答为 =start_pad= / =end_pad= 包裹的逐行注释代码，打包请求（=unit_编号=）按编号分别包裹。
+    错误格式的回答把 pad 写成 **start_pad**，纠错请求会把它改回正确格式。
+    每次请求的结果只取决于 seed、提示词以及该提示词第几次被请求，与线程调度顺序无关，
+    因此同样的参数多次运行得到相同的结果，重试时又会重新抽样。
+    """
+    DISTRIBUTIONS = ('constant', 'uniform', 'exponential', 'lognormal', 'pareto')
+
+    def __init__(self, version='fake', latency=0.0, distribution='constant', sigma=1.0, alpha=1.5, seconds_per_token=0.0,
+                 error_rate=0.0, throttle_rate=0.0, malformed_rate=0.0, seed=0, prompt_templates=None, correction_templates=None,
+                 input_price=None, output_price=None):
+        """
+        :param latency: 平均延迟（秒），按 distribution 抽样
+        :param distribution: 'constant'、'uniform'（0到2倍平均值）、'exponential'、'lognormal'（sigma为对数标准差）、'pareto'（alpha为形状参数，长尾）
+        :param seconds_per_token: 每个输出token额外增加的延迟，模拟生成时间
+        :param error_rate: 返回服务错误的概率
+        :param throttle_rate: 返回限流错误的概率
+        :param malformed_rate: 返回缺少 pad 的错误格式回答的概率
+        :param prompt_templates: 提示词模板列表，用于从提示词中取出 {input_1} 作为被注释的代码；未匹配时注释整个提示词
+        :param correction_templates: 纠错提示词模板列表，匹配时从 {answer} 中修复 pad 格式后返回
+        :param input_price: 每个输入token的模拟价格（元），供 CostTracker 计价；None表示没有价格，此时不能设置预算
+        :param output_price: 每个输出token的模拟价格（元）
+        """
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f'未知的延迟分布: {distribution}')
+        self.version = version
+        self.latency = latency
+        self.distribution = distribution
+        self.sigma = sigma
+        self.alpha = alpha
+        self.seconds_per_token = seconds_per_token
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.malformed_rate = malformed_rate
+        self.seed = seed
+        self.input_price = input_price
+        self.output_price = output_price
+        self.patterns = [self.template_pattern(template) for template in (prompt_templates or [])]
+        self.correction_patterns = [self.template_pattern(template, 'answer') for template in (correction_templates or [])]
+        self.rate_limiter = None  # 由 LLMLoader 配置的共享限流器
+        self.usage_local = threading.local()
+        self.lock = threading.Lock()
+        self.attempts = {}  # 提示词哈希 -> 已请求次数
+        self.stats = {'requests': 0, 'errors': 0, 'throttles': 0, 'malformed': 0}
+
+    @staticmethod
+    def template_pattern(template, field='input_1'):
+        """把提示词模板转换为正则，{field} 处为捕获组，其余占位符匹配任意内容。"""
+        parts = re.split(r'(\{\w+\})', template)
+        regex = ''.join('(.*)' if part == '{' + field + '}' else '.*?' if re.fullmatch(r'\{\w+\}', part) else re.escape(part) for part in parts)
+        return re.compile(regex, re.DOTALL)
+
+    def _rng(self, prompt):
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        with self.lock:
+            attempt = self.attempts.get(digest, 0)
+            self.attempts[digest] = attempt + 1
+            self.stats['requests'] += 1
+        return random.Random(f'{self.seed}:{digest}:{attempt}')
+
+    def _sample_latency(self, rng):
+        if self.distribution == 'constant':
+            return self.latency
+        if self.distribution == 'uniform':
+            return rng.uniform(0, 2 * self.latency)
+        if self.distribution == 'exponential':
+            return rng.expovariate(1 / self.latency) if self.latency else 0.0
+        if self.distribution == 'lognormal':
+            # 调整 mu 使均值等于 latency
+            return rng.lognormvariate(0, self.sigma) * self.latency / math.exp(self.sigma ** 2 / 2)
+        # paretovariate 的最小值为1、均值为 alpha / (alpha - 1)，alpha <= 1 时均值不存在，只按 latency 缩放
+        scale = self.latency * (self.alpha - 1) / self.alpha if self.alpha > 1 else self.latency
+        return rng.paretovariate(self.alpha) * scale
+
+    @staticmethod
+    def _match(patterns, prompt):
+        for pattern in patterns:
+            match = pattern.fullmatch(prompt)
+            if match:
+                return match.group(1)
+        return None
+
+    @staticmethod
+    def annotate(code):
+        # 每行代码前加一行注释，空行保持不变
+        return '\n'.join(f'# 模拟注释: 第{number}行\n{line}' if line.strip() else line for number, line in enumerate(code.split('\n'), 1))
+
+    def _answer(self, prompt, rng):
+        """返回 (回答, 模拟耗时)。"""
+        draw = rng.random()
+        if draw < self.error_rate:
+            with self.lock:
+                self.stats['errors'] += 1
+            return "请求过程中发生错误: 模拟的服务错误", self._sample_latency(rng)
+        if draw < self.error_rate + self.throttle_rate:
+            with self.lock:
+                self.stats['throttles'] += 1
+            return "请求失败: Throttling.RateQuota - Requests rate limit exceeded (模拟)", 0.0
+
+        broken_answer = self._match(self.correction_patterns, prompt)
+        if broken_answer is not None:
+            # 纠错请求：把 **start_pad** 改回 =start_pad=
+            answer = re.sub(r'\*\*((?:start|end)_pad(?:_\d+)?)\*\*', r'=\1=', broken_answer)
+        else:
+            code = self._match(self.patterns, prompt)
+            units = re.split(r'(?:^|\n\n)=unit_(\d+)=\n', prompt if code is None else code)
+            if len(units) > 1:
+                # 打包请求：units 为 [前缀, 编号1, 代码1, 编号2, 代码2, ...]
+                answer = '\n'.join(f'=start_pad_{number}=\n{self.annotate(unit_code)}\n=end_pad_{number}=' for number, unit_code in zip(units[1::2], units[2::2]))
+            else:
+                answer = f'=start_pad=\n{self.annotate(units[0])}\n=end_pad='
+        if rng.random() < self.malformed_rate:
+            with self.lock:
+                self.stats['malformed'] += 1
+            answer = re.sub(r'=((?:start|end)_pad(?:_\d+)?)=', r'**\1**', answer)
+        return answer, self._sample_latency(rng) + estimate_tokens(answer) * self.seconds_per_token
+
+    def _record_usage(self, prompt, answer, estimated_tokens):
+        usage = (estimate_tokens(prompt), estimate_tokens(answer))
+        self.usage_local.last_usage = usage
+        if self.rate_limiter:
+            self.rate_limiter.correct(estimated_tokens, sum(usage))
+        return usage
+
+    def ask(self, prompt, timeout=None):
+        self.usage_local.last_usage = None
+        estimated_tokens = self.rate_limiter.acquire(prompt) if self.rate_limiter else 0
+        answer, delay = self._answer(prompt, self._rng(prompt))
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            return "请求过程中发生错误: Request timed out."
+        time.sleep(delay)
+        self._record_usage(prompt, answer, estimated_tokens)
+        return answer
+
+    async def ask_async(self, prompt, timeout=None):
+        estimated_tokens = await self.rate_limiter.acquire_async(prompt) if self.rate_limiter else 0
+        answer, delay = self._answer(prompt, self._rng(prompt))
+        if timeout is not None and delay > timeout:
+            await asyncio.sleep(timeout)
+            return "请求过程中发生错误: Request timed out."
+        await asyncio.sleep(delay)
+        self._record_usage(prompt, answer, estimated_tokens)
+        return answer
+
+    def ask_stream(self, prompt, timeout=None, chunk_size=16):
+        """逐段返回回答，总耗时按块均摊；错误以异常抛出，与 QwenService.ask_stream 一致。"""
+        self.usage_local.last_usage = None
+        estimated_tokens = self.rate_limiter.acquire(prompt) if self.rate_limiter else 0
+        answer, delay = self._answer(prompt, self._rng(prompt))
+        if answer.startswith(('请求失败', '请求过程中发生错误')):
+            time.sleep(delay)
+            raise RuntimeError(answer)
+        chunks = [answer[i:i + chunk_size] for i in range(0, len(answer), chunk_size)]
+        for chunk in chunks:
+            time.sleep(delay / len(chunks))
+            yield chunk
+        self._record_usage(prompt, answer, estimated_tokens)
+
+    async def ask_stream_async(self, prompt, timeout=None, chunk_size=16):
+        estimated_tokens = await self.rate_limiter.acquire_async(prompt) if self.rate_limiter else 0
+        answer, delay = self._answer(prompt, self._rng(prompt))
+        if answer.startswith(('请求失败', '请求过程中发生错误')):
+            await asyncio.sleep(delay)
+            raise RuntimeError(answer)
+        chunks = [answer[i:i + chunk_size] for i in range(0, len(answer), chunk_size)]
+        for chunk in chunks:
+            await asyncio.sleep(delay / len(chunks))
+            yield chunk
+        self._record_usage(prompt, answer, estimated_tokens)
+
+    def last_usage(self):
+        return getattr(self.usage_local, 'last_usage', None)
+
+    def metrics(self):
+        with self.lock:
+            return dict(self.stats)
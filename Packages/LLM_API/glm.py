@@ -2,6 +2,7 @@ from zhipuai import ZhipuAI
 import os
 from dotenv import load_dotenv
 import base64
+from .http_pool import HTTPPool
 
 class GLMService:
     def __init__(self, version="glm-3-turbo"):
@@ -9,23 +10,28 @@ class GLMService:
         load_dotenv()
         self.version=version
         self.total_tokens_used = 0  # 用于保存总共使用的token数量
+        self.rate_limiter = None  # 由 LLMLoader 配置的共享限流器
         # 从环境变量中导入API密钥
         self.api_key = os.getenv('GLM_API', None)
-        self.client = ZhipuAI(api_key=self.api_key)  # 创建客户端实例
+        self.base_url = 'https://open.bigmodel.cn/api/paas/v4'
+        self.client = ZhipuAI(api_key=self.api_key, base_url=self.base_url, http_client=HTTPPool.client(self.base_url))  # 创建客户端实例，连接来自共享连接池
 
-    def ask(self, query):
+    def ask(self, query, timeout=None):
         """
         使用zhipuai库向GLM-3-Turbo模型发送请求并获取回答
         :param query: 用户的查询字符串
+        :param timeout: 单次请求的超时时间（秒）
         :return: 模型的回答字符串
         """
         if self.version in ['glm-4v']:
             self.version='glm-4'
+        estimated_tokens = self.rate_limiter.acquire(query) if self.rate_limiter else 0
         response = self.client.chat.completions.create(
             model=self.version,
             messages=[
                 {"role": "user", "content": query}
-            ]
+            ],
+            timeout=timeout
         )
         # 检查响应并提取信息
         if response.choices:
@@ -34,6 +40,8 @@ class GLMService:
             # 更新token使用量
             if hasattr(response, 'usage'):
                 self.total_tokens_used += response.usage.total_tokens
+                if self.rate_limiter:
+                    self.rate_limiter.correct(estimated_tokens, response.usage.total_tokens)
             return message
         else:
             return "无法获取回答。"
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import weakref
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import h2  # 安装 h2 后 httpx 才支持 HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+class HTTPPool:
+    """所有服务共享的HTTP连接池，同一个 base URL 只建立一个连接池，连接保持长连接复用。
+
+    OpenAI 兼容的服务通过 client() / async_client() 取得 httpx 客户端，
+    直接发 requests 请求的服务通过 session() 取得 requests.Session。
+    """
+    max_connections = 100  # 每个 base URL 的最大连接数
+    max_keepalive_connections = 50  # 空闲时保留的长连接数
+    keepalive_expiry = 30  # 空闲长连接的保留秒数
+    http2 = HTTP2_AVAILABLE
+
+    clients = {}  # base URL -> httpx.Client
+    async_clients = weakref.WeakKeyDictionary()  # 事件循环 -> {base URL: httpx.AsyncClient}，异步连接不能跨事件循环使用
+    sessions = {}  # base URL -> requests.Session
+    counters = {}  # base URL -> httpx 请求数、新建连接数、TLS握手数
+    lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, max_connections=None, max_keepalive_connections=None, keepalive_expiry=None, http2=None):
+        """修改连接池参数，只对之后新建的连接池生效。"""
+        with cls.lock:
+            if max_connections is not None:
+                cls.max_connections = max_connections
+                # 保留的长连接数不超过最大连接数
+                cls.max_keepalive_connections = min(cls.max_keepalive_connections, max_connections)
+            if max_keepalive_connections is not None:
+                cls.max_keepalive_connections = max_keepalive_connections
+            if keepalive_expiry is not None:
+                cls.keepalive_expiry = keepalive_expiry
+            if http2 is not None:
+                cls.http2 = http2 and HTTP2_AVAILABLE
+
+    @classmethod
+    def limits(cls):
+        return httpx.Limits(max_connections=cls.max_connections,
+                            max_keepalive_connections=cls.max_keepalive_connections,
+                            keepalive_expiry=cls.keepalive_expiry)
+
+    @classmethod
+    def client(cls, base_url):
+        """返回 base_url 共享的 httpx.Client，可作为 OpenAI(http_client=...) 传入。"""
+        with cls.lock:
+            if base_url not in cls.clients:
+                cls.clients[base_url] = httpx.Client(
+                    limits=cls.limits(), http2=cls.http2,
+                    event_hooks={'request': [cls._request_hook(base_url)]}
+                )
+            return cls.clients[base_url]
+
+    @classmethod
+    def async_client(cls, base_url):
+        """返回当前事件循环中 base_url 共享的 httpx.AsyncClient。"""
+        loop = asyncio.get_running_loop()
+        with cls.lock:
+            clients = cls.async_clients.setdefault(loop, {})
+            if base_url not in clients:
+                clients[base_url] = httpx.AsyncClient(
+                    limits=cls.limits(), http2=cls.http2,
+                    event_hooks={'request': [cls._async_request_hook(base_url)]}
+                )
+            return clients[base_url]
+
+    @classmethod
+    def session(cls, base_url):
+        """返回 base_url 共享的 requests.Session，requests.Session 本身可以在多个线程间共享连接池。"""
+        with cls.lock:
+            if base_url not in cls.sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=cls.max_connections)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                cls.sessions[base_url] = session
+            return cls.sessions[base_url]
+
+    @classmethod
+    def _count(cls, base_url, name):
+        with cls.lock:
+            counter = cls.counters.setdefault(base_url, {'requests': 0, 'connections': 0, 'tls_handshakes': 0})
+            counter[name] += 1
+
+    @classmethod
+    def _trace(cls, base_url, event):
+        # httpcore 在新建TCP连接和完成TLS握手时回调，复用已有连接时不会触发
+        if event == 'connection.connect_tcp.complete':
+            cls._count(base_url, 'connections')
+        elif event == 'connection.start_tls.complete':
+            cls._count(base_url, 'tls_handshakes')
+
+    @classmethod
+    def _request_hook(cls, base_url):
+        def trace(event, info):
+            cls._trace(base_url, event)
+
+        def hook(request):
+            cls._count(base_url, 'requests')
+            request.extensions['trace'] = trace
+        return hook
+
+    @classmethod
+    def _async_request_hook(cls, base_url):
+        async def trace(event, info):
+            cls._trace(base_url, event)
+
+        async def hook(request):
+            cls._count(base_url, 'requests')
+            request.extensions['trace'] = trace
+        return hook
+
+    @classmethod
+    def metrics(cls):
+        """返回每个 base URL 的请求数、新建连接数、TLS握手数和连接复用率。"""
+        with cls.lock:
+            result = {base_url: dict(counter) for base_url, counter in cls.counters.items()}
+            for base_url, session in cls.sessions.items():
+                counter = result.setdefault(base_url, {'requests': 0, 'connections': 0, 'tls_handshakes': 0})
+                # urllib3 连接池自带请求数和新建连接数
+                pools = session.adapters['https://'].poolmanager.pools
+                for pool in [pools[key] for key in pools.keys()]:
+                    counter['requests'] += pool.num_requests
+                    counter['connections'] += pool.num_connections
+        for counter in result.values():
+            counter['reused'] = max(counter['requests'] - counter['connections'], 0)
+            counter['reuse_ratio'] = counter['reused'] / counter['requests'] if counter['requests'] else 0.0
+        return result
@@ -1,6 +1,6 @@
 import os
 import base64
-import requests
+from .http_pool import HTTPPool
 from dotenv import load_dotenv
 from http import HTTPStatus
 
@@ -10,11 +10,14 @@ class HuidaService:
         load_dotenv()
 
         self.model = model
+        self.version = model
         self.api_key = os.getenv('HUIDA_API_KEY', None)
-        self.url = 'https://api.huida.app/v1/chat/completions'
+        self.base_url = 'https://api.huida.app/v1'
+        self.url = self.base_url + '/chat/completions'
         self.initialized = False
         self.input_word_count = 0  # 输入字数
         self.output_word_count = 0  # 输出字数
+        self.rate_limiter = None  # 由 LLMLoader 配置的共享限流器
 
         if self.api_key:
             self.initialized = True
@@ -26,7 +29,11 @@ class HuidaService:
         with open(image_path, "rb") as image_file:
             return base64.b64encode(image_file.read()).decode("utf-8")
 
-    def ask_once(self, message, image_path=None, language='中文'):
+    def ask(self, message, language='中文', timeout=None):
+        """与 QwenService.ask 一致的统一入口，供 MultiProcessor 和 CompositeService 调用。"""
+        return self.ask_once(message, language=language, timeout=timeout)
+
+    def ask_once(self, message, image_path=None, language='中文', timeout=None):
         if not self.initialized:
             raise RuntimeError("服务未初始化")
 
@@ -52,11 +59,15 @@ class HuidaService:
             "messages": messages
         }
 
-        response = requests.post(self.url, headers=headers, json=data, verify=False)
+        estimated_tokens = self.rate_limiter.acquire(message) if self.rate_limiter else 0
+        response = HTTPPool.session(self.base_url).post(self.url, headers=headers, json=data, verify=False, timeout=timeout)
         if response.status_code == HTTPStatus.OK:
             output_content = response.json()["choices"][0]["message"]['content']
             self.input_word_count = len(message)
             self.output_word_count = len(output_content)
+            usage = response.json().get('usage')
+            if self.rate_limiter and usage:
+                self.rate_limiter.correct(estimated_tokens, usage.get('total_tokens'))
             return output_content
         else:
             return f"请求失败: {response.status_code} - {response.text}"
\ No newline at end of file
@@ -0,0 +1,116 @@
+import functools
+import inspect
+import time
+from .errors import ERROR_PREFIXES, is_throttled
+from ..tokens import estimate_tokens
+
+def instrument_service(service, metrics, provider=None):
+    """包装服务实例的 ask / ask_async / ask_stream / ask_stream_async，把每次请求记录到指标注册表。
+
+    只替换实例上已有的方法，方法签名不变（inspect.signature 沿 __wrapped__ 取原方法），
+    MultiProcessor 按签名和 hasattr 选择调用方式的逻辑不受影响。
+    记录的指标按 provider 标签区分：请求耗时直方图、按结果分类的请求数、输入输出token数和在途请求数。
+    """
+    provider = provider or getattr(service, 'version', type(service).__name__)
+
+    def status_of(answer=None, error=None):
+        if error is None and not (isinstance(answer, str) and answer.startswith(ERROR_PREFIXES)):
+            return 'ok'
+        return 'throttled' if is_throttled(error if error is not None else answer) else 'error'
+
+    def record(prompt, start_time, answer=None, error=None, usage=None):
+        metrics.add('annotator_llm_in_flight', -1, provider=provider)
+        metrics.observe('annotator_llm_request_seconds', time.perf_counter() - start_time, provider=provider)
+        status = status_of(answer, error)
+        metrics.inc('annotator_llm_requests_total', status=status, provider=provider)
+        if status != 'ok':
+            return
+        # 服务提供真实用量时优先使用，否则按文本估算
+        tokens_in, tokens_out = usage or (estimate_tokens(prompt), estimate_tokens(answer))
+        metrics.inc('annotator_llm_tokens_total', tokens_in, direction='in', provider=provider)
+        metrics.inc('annotator_llm_tokens_total', tokens_out, direction='out', provider=provider)
+
+    def last_usage():
+        # last_usage 按线程记录，只在同步请求返回后立即读取
+        last_usage = getattr(service, 'last_usage', None)
+        return last_usage() if callable(last_usage) else None
+
+    if hasattr(service, 'ask'):
+        ask = service.ask
+
+        @functools.wraps(ask)
+        def timed_ask(prompt, *args, **kwargs):
+            metrics.add('annotator_llm_in_flight', 1, provider=provider)
+            start_time = time.perf_counter()
+            try:
+                answer = ask(prompt, *args, **kwargs)
+            except Exception as e:
+                record(prompt, start_time, error=e)
+                raise
+            record(prompt, start_time, answer=answer, usage=last_usage())
+            return answer
+        service.ask = timed_ask
+
+    if inspect.iscoroutinefunction(getattr(service, 'ask_async', None)):
+        ask_async = service.ask_async
+
+        @functools.wraps(ask_async)
+        async def timed_ask_async(prompt, *args, **kwargs):
+            metrics.add('annotator_llm_in_flight', 1, provider=provider)
+            start_time = time.perf_counter()
+            try:
+                answer = await ask_async(prompt, *args, **kwargs)
+            except Exception as e:
+                record(prompt, start_time, error=e)
+                raise
+            record(prompt, start_time, answer=answer)
+            return answer
+        service.ask_async = timed_ask_async
+
+    if hasattr(service, 'ask_stream'):
+        ask_stream = service.ask_stream
+
+        @functools.wraps(ask_stream)
+        def timed_ask_stream(prompt, *args, **kwargs):
+            metrics.add('annotator_llm_in_flight', 1, provider=provider)
+            start_time = time.perf_counter()
+            chunks = []
+            error = None
+            stream = ask_stream(prompt, *args, **kwargs)
+            try:
+                for chunk in stream:
+                    chunks.append(chunk)
+                    yield chunk
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                stream.close()
+                # 调用方提前关闭时同样按已收到的文本记录
+                record(prompt, start_time, answer=''.join(chunks), error=error)
+        service.ask_stream = timed_ask_stream
+
+    if hasattr(service, 'ask_stream_async'):
+        ask_stream_async = service.ask_stream_async
+
+        @functools.wraps(ask_stream_async)
+        async def timed_ask_stream_async(prompt, *args, **kwargs):
+            metrics.add('annotator_llm_in_flight', 1, provider=provider)
+            start_time = time.perf_counter()
+            chunks = []
+            error = None
+            stream = ask_stream_async(prompt, *args, **kwargs)
+            try:
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    yield chunk
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                await stream.aclose()
+                # 调用方提前关闭时同样按已收到的文本记录
+                record(prompt, start_time, answer=''.join(chunks), error=error)
+        service.ask_stream_async = timed_ask_stream_async
+
+    return service
@@ -1,31 +1,96 @@
+import threading
 from .qwen import QwenService
+from .composite import CompositeService
+from .rate_limiter import RateLimiter
+from .http_pool import HTTPPool
+from .instrumentation import instrument_service
 
 class LLMLoader:
-    def __init__(self, service_type=None, version=None):
-        self.service = self._initialize_service(service_type, version)
+    # 各服务默认的每分钟请求数（rpm）和每分钟token数（tpm）额度，可通过 rate_limit 参数覆盖
+    RATE_LIMITS = {
+        'qwen': {'rpm': 1200, 'tpm': 1000000},
+        'zhipu': {'rpm': 600, 'tpm': 600000},
+        'kimi': {'rpm': 200, 'tpm': 128000},
+        'deepseek': {'rpm': 600, 'tpm': 1000000},
+        'huida': {'rpm': 500, 'tpm': 300000},
+        'sensetime': {'rpm': 60, 'tpm': 300000},
+    }
+    rate_limiters = {}  # 同一服务类型的所有实例共享同一个限流器
+    rate_limiters_lock = threading.Lock()
+
+    def __init__(self, service_type=None, version=None, rate_limit=None, backends=None, routing='weighted', pool_size=None, service_options=None, metrics=None):
+        """
+        :param backends: service_type='composite' 时的后端列表，元素为服务类型字符串，
+                         或 (服务类型, 版本[, 权重]) 元组，例如 [('qwen', 'long', 2), 'zhipu']
+        :param routing: 组合服务的路由策略，'weighted' 或 'least_latency'
+        :param pool_size: 每个 base URL 共享连接池的最大连接数，一般不小于并发线程数
+        :param service_options: 传给服务构造函数的额外参数，目前用于 service_type='fake' 的延迟、错误率等设置
+        :param metrics: 可选的MetricsRegistry，按服务记录请求耗时、请求结果、token数和在途请求数
+        """
+        if pool_size:
+            HTTPPool.configure(max_connections=pool_size, max_keepalive_connections=pool_size)
+        if service_type == 'composite':
+            self.service = self._initialize_composite(backends or [], rate_limit, routing, metrics)
+            return
+        self.service = self._initialize_service(service_type, version, service_options or {})
+        # rate_limit=False 关闭限流；传入 {'rpm': ..., 'tpm': ...} 覆盖默认额度
+        if rate_limit is not False:
+            self.service.rate_limiter = self.get_rate_limiter(service_type or 'qwen', rate_limit)
+        if metrics is not None:
+            instrument_service(self.service, metrics)
+
+    def _initialize_composite(self, backends, rate_limit, routing, metrics=None):
+        services = []
+        weights = []
+        for backend in backends:
+            backend = (backend,) if isinstance(backend, str) else tuple(backend)
+            service_type = backend[0]
+            version = backend[1] if len(backend) > 1 else None
+            weight = backend[2] if len(backend) > 2 else 1
+            # 每个后端使用各自服务类型的共享限流器，指标按后端分别记录
+            services.append(LLMLoader(service_type, version, rate_limit=rate_limit, metrics=metrics).service)
+            weights.append(weight)
+        return CompositeService(services, weights=weights, routing=routing)
+
+    @classmethod
+    def get_rate_limiter(cls, service_type, rate_limit=None):
+        with cls.rate_limiters_lock:
+            if rate_limit or service_type not in cls.rate_limiters:
+                config = dict(cls.RATE_LIMITS.get(service_type, {}))
+                config.update(rate_limit or {})
+                cls.rate_limiters[service_type] = RateLimiter(**config)
+            return cls.rate_limiters[service_type]
     
-    def _initialize_service(self, service_type, version):
+    def _initialize_service(self, service_type, version, service_options=None):
         if service_type in ['qwen', None]:
             version = version or 'long'
             # 'glm-4' 'glm-4v' 'glm-3-turbo'
             return QwenService(version)
-#        elif service_type in ['zhipu']:
-#            version = version or 'glm-3-turbo'
-#            return GLMService(version)
-#        elif service_type in ['kimi']:
-#            version = version or '32k'
-#            # '8k'1M/12￥ '32k'1M/24￥ '128k'1M/60￥
-#            return KimiService(version)
-#        elif service_type in ['deepseek']:
-#            version = version or 'chat'
-#            return DeepSeekService(version)
-#        elif service_type in ['huida']:
-#            version = version or 'gpt-4o'
-#            # '8k'1M/12￥ '32k'1M/24￥ '128k'1M/60￥
-#            return HuidaService(version)
-#        elif service_type in ['sensetime']:
-#            version = version or 'SenseChat'
-#            # SenseChat SenseChat-32K SenseChat-128K SenseChat-Turbo SenseChat-FunctionCall
-#            return SenseService(version=version)
+        elif service_type in ['zhipu']:
+            from .glm import GLMService
+            version = version or 'glm-3-turbo'
+            return GLMService(version)
+        elif service_type in ['kimi']:
+            from .moonshot import KimiService
+            version = version or '32k'
+            # '8k'1M/12￥ '32k'1M/24￥ '128k'1M/60￥
+            return KimiService(version)
+        elif service_type in ['deepseek']:
+            from .deepseek import DeepSeekService
+            version = version or 'chat'
+            return DeepSeekService(version)
+        elif service_type in ['huida']:
+            from .huida import HuidaService
+            version = version or 'gpt-4o'
+            return HuidaService(version)
+        elif service_type in ['sensetime']:
+            from .sense_time import SenseService
+            version = version or 'SenseChat'
+            # SenseChat SenseChat-32K SenseChat-128K SenseChat-Turbo SenseChat-FunctionCall
+            return SenseService(version=version)
+        elif service_type in ['fake']:
+            from .fake import FakeService
+            # 离线压测用的假服务，不需要API密钥和网络
+            return FakeService(version=version or 'fake', **(service_options or {}))
         else:
             raise ValueError('未知的服务类型')
\ No newline at end of file
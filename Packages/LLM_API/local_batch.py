@@ -0,0 +1,110 @@
+import json
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+class LocalBatchService:
+    """批量接口的本地替身：批量任务保存在本地目录中，由后台线程调用被包装的服务逐条完成。
+
+    输入输出文件与 OpenAI 兼容的批量接口格式一致，没有批量端点或没有网络时也能跑通完整流程。
+    进程中断后再次查询状态会从已完成的位置继续处理。
+    """
+
+    batch_discounted = False  # 逐条调用在线接口，不享受批量折扣
+
+    def __init__(self, service, batch_dir, num_threads=4):
+        self.service = service  # 实际回答请求的服务，需提供 ask
+        self.version = getattr(service, 'version', type(service).__name__)
+        self.batch_dir = batch_dir
+        self.num_threads = num_threads
+        self.workers = {}  # batch_id -> 处理线程
+        self.lock = threading.Lock()
+
+    def batch_request(self, custom_id, prompt):
+        return {
+            'custom_id': custom_id,
+            'method': 'POST',
+            'url': '/v1/chat/completions',
+            'body': {'model': self.version, 'messages': [{'role': 'user', 'content': prompt}]}
+        }
+
+    def _path(self, batch_id, name):
+        return os.path.join(self.batch_dir, batch_id, name)
+
+    def _write_status(self, batch_id, status):
+        temp_path = self._path(batch_id, 'status.json.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({'status': status}, file)
+        os.replace(temp_path, self._path(batch_id, 'status.json'))
+
+    def submit_batch(self, file_path):
+        batch_id = 'batch_' + uuid.uuid4().hex
+        os.makedirs(os.path.join(self.batch_dir, batch_id))
+        shutil.copyfile(file_path, self._path(batch_id, 'input.jsonl'))
+        self._write_status(batch_id, 'in_progress')
+        self._start(batch_id)
+        return batch_id
+
+    def _start(self, batch_id):
+        with self.lock:
+            worker = self.workers.get(batch_id)
+            if worker is not None and worker.is_alive():
+                return
+            worker = threading.Thread(target=self._process, args=(batch_id,), daemon=True)
+            self.workers[batch_id] = worker
+            worker.start()
+
+    def _read_jsonl(self, file_path):
+        records = []
+        if not os.path.isfile(file_path):
+            return records
+        with open(file_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # 中断时最后一行可能只写了一半
+                    continue
+        return records
+
+    def _process(self, batch_id):
+        requests = self._read_jsonl(self._path(batch_id, 'input.jsonl'))
+        output_path = self._path(batch_id, 'output.jsonl')
+        done = {record['custom_id'] for record in self._read_jsonl(output_path)}
+        write_lock = threading.Lock()
+
+        with open(output_path, 'a', encoding='utf-8') as output:
+            def answer(request):
+                prompt = request['body']['messages'][-1]['content']
+                try:
+                    content = self.service.ask(prompt)
+                    record = {'custom_id': request['custom_id'], 'error': None, 'response': {
+                        'status_code': 200,
+                        'body': {'model': self.version, 'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}}]}
+                    }}
+                except Exception as e:
+                    record = {'custom_id': request['custom_id'], 'response': None, 'error': {'message': str(e)}}
+                with write_lock:
+                    output.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    output.flush()
+
+            with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
+                list(executor.map(answer, [request for request in requests if request['custom_id'] not in done]))
+        self._write_status(batch_id, 'completed')
+
+    def batch_status(self, batch_id):
+        with open(self._path(batch_id, 'status.json'), 'r', encoding='utf-8') as file:
+            status = json.load(file)['status']
+        if status == 'in_progress':
+            # 提交任务的进程已经退出时，在当前进程中继续处理
+            self._start(batch_id)
+        return {
+            'status': status,
+            'completed': len(self._read_jsonl(self._path(batch_id, 'output.jsonl'))),
+            'total': len(self._read_jsonl(self._path(batch_id, 'input.jsonl')))
+        }
+
+    def batch_results(self, batch_id):
+        return self._read_jsonl(self._path(batch_id, 'output.jsonl'))
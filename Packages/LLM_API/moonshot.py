@@ -2,6 +2,7 @@ import os
 from dotenv import load_dotenv
 from pathlib import Path
 from openai import OpenAI
+from .http_pool import HTTPPool
 
 class KimiService:
     def __init__(self, version='8k'):
@@ -12,6 +13,7 @@ class KimiService:
         self.client = None
         self.initialized = False
         self.total_tokens_used = 0  # 添加一个成员变量用于保存总共使用的token数量
+        self.rate_limiter = None  # 由 LLMLoader 配置的共享限流器
         # 从环境变量中导入API密钥和基础URL
         api_key = os.getenv('KIMI_API', None)
         base_url ='https://api.moonshot.cn/v1'
@@ -20,27 +22,36 @@ class KimiService:
     def init_service(self, api_key: str, base_url: str) -> bool:
         self.client = OpenAI(
             api_key=api_key,
-            base_url=base_url
+            base_url=base_url,
+            http_client=HTTPPool.client(base_url)  # 共享连接池，避免每次请求重新握手
         )
         self.initialized = True
         return True
 
-    def ask_once(self, prompt: str) -> str:
+    def ask(self, prompt: str, timeout: float = None) -> str:
+        """与 QwenService.ask 一致的统一入口，供 MultiProcessor 和 CompositeService 调用。"""
+        return self.ask_once(prompt, timeout=timeout)
+
+    def ask_once(self, prompt: str, timeout: float = None) -> str:
         if not self.initialized:
             raise ValueError("服务未初始化，请先调用 init_service 方法初始化服务。")
         
         if not self.client:
             raise ValueError("OpenAI 客户端未正确初始化，请检查初始化过程。")
-        
+
+        estimated_tokens = self.rate_limiter.acquire(prompt) if self.rate_limiter else 0
         response = self.client.chat.completions.create(
             max_tokens=8192,
             model=self.version,
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            timeout=timeout
         )
 
         if response:
             total_tokens = response.usage.total_tokens
             self.total_tokens_used += total_tokens  # 更新总共使用的token数量
+            if self.rate_limiter:
+                self.rate_limiter.correct(estimated_tokens, total_tokens)
             #print("本次使用的token数量：", total_tokens)
             return response.choices[0].message.content
         else:
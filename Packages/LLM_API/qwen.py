@@ -1,12 +1,14 @@
 import os
 import random
+import threading
 from dotenv import load_dotenv, find_dotenv
 from http import HTTPStatus
 from pathlib import Path
 import dashscope
 import requests
 import json
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+from .http_pool import HTTPPool
 
 class QwenService:
     def __init__(self, version='long'):
@@ -19,6 +21,10 @@ class QwenService:
         self.input_tokens = 0  # 输入字数
         self.output_tokens = 0  # 输出字数
         self.stream = False  # 默认不使用stream模式
+        self.base_url = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+        self.sync_client = None  # OpenAI兼容接口的客户端，首次调用时创建，连接来自共享连接池
+        self.rate_limiter = None  # 由 LLMLoader 配置的共享限流器
+        self.usage_local = threading.local()  # 每个线程最近一次请求的token用量
         # 获取项目根目录
         self.project_root = os.getenv('PROJECT_ROOT')
         if not self.project_root:
@@ -47,13 +53,17 @@ class QwenService:
         else:
             raise ValueError("API密钥未在环境变量中设置")
         
-    def ask(self, prompt: str, language='中文', stream: bool = None) -> str:
+    def ask(self, prompt: str, language='中文', stream: bool = None, timeout: float = None) -> str:
         if not self.initialized:
             raise RuntimeError("服务未初始化")
         
         if stream is None:
             stream = self.stream
         try:
+            self.usage_local.last_usage = None
+            # 按预估token数占用限流额度，拿到usage后再修正
+            estimated_tokens = self.rate_limiter.acquire(prompt) if self.rate_limiter else 0
+
             # 计算输入字数
             self.input_tokens += len(prompt)
             
@@ -62,15 +72,13 @@ class QwenService:
                         {'role': 'user', 'content': prompt}]
             
             if stream:
-                client = OpenAI(
-                    api_key=os.getenv('QWEN_API'),
-                    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-                )
+                client = self.openai_client()
                 
                 completion = client.chat.completions.create(
                     model=self.version,
                     messages=messages,
-                    stream=True
+                    stream=True,
+                    timeout=timeout
                 )
                 
                 output_content = ""
@@ -85,7 +93,9 @@ class QwenService:
                 return output_content
             
             else:
-                resp = self.client.call(model=self.version, messages=messages, seed=random.randint(1, 10000), result_format='message')
+                # timeout 为单次请求的超时时间（秒），超时后底层连接会被关闭
+                request_options = {'request_timeout': timeout} if timeout else {}
+                resp = self.client.call(model=self.version, messages=messages, seed=random.randint(1, 10000), result_format='message', **request_options)
 
                 if resp.status_code == HTTPStatus.OK:
                     output_content = ""
@@ -96,6 +106,9 @@ class QwenService:
                             # 从usage中读取tokens使用情况
                             self.input_tokens += resp.usage['input_tokens']
                             self.output_tokens += resp.usage['output_tokens']
+                            self.usage_local.last_usage = (resp.usage['input_tokens'], resp.usage['output_tokens'])
+                            if self.rate_limiter:
+                                self.rate_limiter.correct(estimated_tokens, resp.usage['input_tokens'] + resp.usage['output_tokens'])
                         else:
                             output_content = "未找到有效的响应内容"
                             self.output_tokens += len(output_content)
@@ -108,16 +121,160 @@ class QwenService:
         except Exception as e:
             return f"请求过程中发生错误: {e}"
         
+    def openai_client(self):
+        """返回OpenAI兼容接口的客户端，所有请求共用同一个连接池。"""
+        if self.sync_client is None:
+            self.sync_client = OpenAI(api_key=os.getenv('QWEN_API'), base_url=self.base_url, http_client=HTTPPool.client(self.base_url))
+        return self.sync_client
+
+    def openai_async_client(self):
+        # 异步连接不能跨事件循环复用，每个事件循环使用各自的连接池
+        return AsyncOpenAI(api_key=os.getenv('QWEN_API'), base_url=self.base_url, http_client=HTTPPool.async_client(self.base_url))
+
+    def last_usage(self):
+        """返回当前线程最近一次 ask 调用的 (输入token数, 输出token数)，未知时返回None。"""
+        return getattr(self.usage_local, 'last_usage', None)
+
+    def ask_stream(self, prompt: str, language='中文', timeout: float = None):
+        """以生成器形式逐段返回回答，调用方关闭生成器即中止请求。请求出错时抛出异常。"""
+        if not self.initialized:
+            raise RuntimeError("服务未初始化")
+
+        self.usage_local.last_usage = None
+        estimated_tokens = self.rate_limiter.acquire(prompt) if self.rate_limiter else 0
+        self.input_tokens += len(prompt)
+        messages = [{'role': 'system', 'content': f'你是一个忠实细致的助手，你的输出应该使用{language}'},
+                    {'role': 'user', 'content': prompt}]
+        client = self.openai_client()
+        completion = client.chat.completions.create(
+            model=self.version,
+            messages=messages,
+            stream=True,
+            stream_options={'include_usage': True},
+            seed=random.randint(1, 10000),
+            timeout=timeout
+        )
+        try:
+            for chunk in completion:
+                # 最后一个chunk只携带usage，没有choices
+                if chunk.usage:
+                    self.input_tokens += chunk.usage.prompt_tokens
+                    self.output_tokens += chunk.usage.completion_tokens
+                    self.usage_local.last_usage = (chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+                    if self.rate_limiter:
+                        self.rate_limiter.correct(estimated_tokens, chunk.usage.total_tokens)
+                if chunk.choices and chunk.choices[0].delta.content is not None:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # 提前中止时关闭连接，服务端随即停止生成
+            completion.close()
+
+    async def ask_stream_async(self, prompt: str, language='中文', timeout: float = None):
+        """ask_stream 的异步生成器版本。"""
+        if not self.initialized:
+            raise RuntimeError("服务未初始化")
+
+        async_client = self.openai_async_client()
+        estimated_tokens = await self.rate_limiter.acquire_async(prompt) if self.rate_limiter else 0
+        messages = [{'role': 'system', 'content': f'你是一个忠实细致的助手，你的输出应该使用{language}'},
+                    {'role': 'user', 'content': prompt}]
+        completion = await async_client.chat.completions.create(
+            model=self.version,
+            messages=messages,
+            stream=True,
+            stream_options={'include_usage': True},
+            seed=random.randint(1, 10000),
+            timeout=timeout
+        )
+        try:
+            async for chunk in completion:
+                if chunk.usage:
+                    self.input_tokens += chunk.usage.prompt_tokens
+                    self.output_tokens += chunk.usage.completion_tokens
+                    if self.rate_limiter:
+                        self.rate_limiter.correct(estimated_tokens, chunk.usage.total_tokens)
+                if chunk.choices and chunk.choices[0].delta.content is not None:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await completion.close()
+
+    async def ask_async(self, prompt: str, language='中文', timeout: float = None) -> str:
+        """ask 的协程版本，供 AsyncMultiProcessor 在事件循环中并发调用。"""
+        if not self.initialized:
+            raise RuntimeError("服务未初始化")
+
+        async_client = self.openai_async_client()
+        try:
+            estimated_tokens = await self.rate_limiter.acquire_async(prompt) if self.rate_limiter else 0
+            messages = [{'role': 'system', 'content': f'你是一个忠实细致的助手，你的输出应该使用{language}'},
+                        {'role': 'user', 'content': prompt}]
+            completion = await async_client.chat.completions.create(
+                model=self.version,
+                messages=messages,
+                seed=random.randint(1, 10000),
+                timeout=timeout
+            )
+            if completion.choices and completion.choices[0].message and completion.choices[0].message.content:
+                output_content = completion.choices[0].message.content
+                # 从usage中读取tokens使用情况
+                if completion.usage:
+                    self.input_tokens += completion.usage.prompt_tokens
+                    self.output_tokens += completion.usage.completion_tokens
+                    if self.rate_limiter:
+                        self.rate_limiter.correct(estimated_tokens, completion.usage.total_tokens)
+                return output_content
+            return "未找到有效的响应内容"
+        except Exception as e:
+            return f"请求过程中发生错误: {e}"
+
+    def batch_request(self, custom_id: str, prompt: str, language='中文') -> dict:
+        """生成批量请求文件中的一行，消息格式与 ask 一致。"""
+        return {
+            'custom_id': custom_id,
+            'method': 'POST',
+            'url': '/v1/chat/completions',
+            'body': {
+                'model': self.version,
+                'messages': [{'role': 'system', 'content': f'你是一个忠实细致的助手，你的输出应该使用{language}'},
+                             {'role': 'user', 'content': prompt}]
+            }
+        }
+
+    def submit_batch(self, file_path: str) -> str:
+        """上传JSONL批量请求文件并创建批量任务，返回任务ID。"""
+        if not self.initialized:
+            raise RuntimeError("服务未初始化")
+
+        client = self.openai_client()
+        file = client.files.create(file=Path(file_path), purpose="batch")
+        batch = client.batches.create(input_file_id=file.id, endpoint="/v1/chat/completions", completion_window="24h")
+        return batch.id
+
+    def batch_status(self, batch_id: str) -> dict:
+        batch = self.openai_client().batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return {
+            'status': batch.status,
+            'completed': (counts.completed + counts.failed) if counts else 0,
+            'total': counts.total if counts else 0
+        }
+
+    def batch_results(self, batch_id: str) -> list:
+        """下载批量任务的结果，返回每行结果的字典列表；任务过期时只包含已完成的部分。"""
+        client = self.openai_client()
+        batch = client.batches.retrieve(batch_id)
+        if not batch.output_file_id:
+            return []
+        content = client.files.content(batch.output_file_id).text
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+
     def ask_file(self, file_path: str, prompt: str, language='中文') -> str:
         if not self.initialized:
             raise RuntimeError("服务未初始化")
 
         file_id = None
         try:
-            client = OpenAI(
-                api_key=os.getenv('QWEN_API'),
-                base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-            )
+            client = self.openai_client()
             
             file = client.files.create(file=Path(file_path), purpose="file-extract")
             file_id = file.id
@@ -162,10 +319,7 @@ class QwenService:
             raise RuntimeError("服务未初始化")
 
         try:
-            client = OpenAI(
-                api_key=os.getenv('QWEN_API'),
-                base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-            )
+            client = self.openai_client()
             
             files = client.files.list()
             file_ids = [file.id for file in files.data]
@@ -181,10 +335,7 @@ class QwenService:
             raise RuntimeError("服务未初始化")
 
         try:
-            client = OpenAI(
-                api_key=os.getenv('QWEN_API'),
-                base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-            )
+            client = self.openai_client()
             
             client.files.delete(file_id)
             return f"文件 {file_id} 已删除"
@@ -199,10 +350,7 @@ class QwenService:
             raise RuntimeError("服务未初始化")
 
         try:
-            client = OpenAI(
-                api_key=os.getenv('QWEN_API'),
-                base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-            )
+            client = self.openai_client()
             
             files = client.files.list()
             for file in files.data:
@@ -0,0 +1,122 @@
+import asyncio
+import contextvars
+import threading
+import time
+from ..tokens import estimate_tokens
+
+
+class RateLimiter:
+    """同时限制每分钟请求数（RPM）和每分钟token数（TPM）的令牌桶限流器。
+
+    请求发出前按估计的token数扣减额度，拿到响应后再用 usage 中的真实用量修正。
+    """
+
+    def __init__(self, rpm=None, tpm=None, output_ratio=1.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.output_ratio = output_ratio  # 预估输出token数与输入token数的比例
+        self.request_level = float(rpm) if rpm else 0.0
+        self.token_level = float(tpm) if tpm else 0.0
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+        self.wait_time = 0.0  # 累计等待时间（秒）
+        # 通过 admit 预先取得的额度，线程和协程各自独立
+        self.admitted = contextvars.ContextVar('rate_limiter_admitted', default=None)
+
+    def estimate(self, prompt):
+        """估计一次请求会消耗的token数（输入 + 预估输出）。"""
+        input_tokens = estimate_tokens(prompt)
+        return int(input_tokens * (1 + self.output_ratio))
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.last_refill
+        self.last_refill = now
+        if self.rpm:
+            self.request_level = min(float(self.rpm), self.request_level + elapsed * self.rpm / 60)
+        if self.tpm:
+            self.token_level = min(float(self.tpm), self.token_level + elapsed * self.tpm / 60)
+
+    def _try_acquire(self, tokens):
+        """两个额度都足够时扣减并返回0，否则返回需要等待的秒数。"""
+        with self.lock:
+            self._refill()
+            # 单次请求超过整个桶的容量时，等桶满即可放行
+            needed_tokens = min(tokens, self.tpm) if self.tpm else 0
+            wait = 0.0
+            if self.rpm and self.request_level < 1:
+                wait = max(wait, (1 - self.request_level) * 60 / self.rpm)
+            if self.tpm and self.token_level < needed_tokens:
+                wait = max(wait, (needed_tokens - self.token_level) * 60 / self.tpm)
+            if wait > 0:
+                return wait
+            if self.rpm:
+                self.request_level -= 1
+            if self.tpm:
+                self.token_level -= tokens
+            return 0.0
+
+    def admit(self, prompt):
+        """预先取得当前线程（或协程）下一次请求的额度，服务随后调用 acquire / acquire_async 时直接使用而不再等待。
+
+        调用方（如 MultiProcessor）在开始计算截止时间之前调用，等待额度的时间不会使单元被判为超时。
+        """
+        tokens = self.acquire(prompt)
+        self.admitted.set(tokens)
+        return tokens
+
+    async def admit_async(self, prompt):
+        """admit 的协程版本。"""
+        tokens = await self.acquire_async(prompt)
+        self.admitted.set(tokens)
+        return tokens
+
+    def discard(self):
+        """放弃预先取得但未使用的额度，退还占用的请求数和预估扣减的token数。"""
+        tokens = self._take_admitted()
+        if tokens is None:
+            return
+        with self.lock:
+            if self.rpm:
+                self.request_level = min(float(self.rpm), self.request_level + 1)
+            if self.tpm:
+                self.token_level = min(float(self.tpm), self.token_level + tokens)
+
+    def _take_admitted(self):
+        tokens = self.admitted.get()
+        if tokens is not None:
+            self.admitted.set(None)
+        return tokens
+
+    def acquire(self, prompt):
+        """阻塞直到请求数和token数额度都允许，返回本次预估扣减的token数；已通过 admit 取得额度时立即返回。"""
+        admitted = self._take_admitted()
+        if admitted is not None:
+            return admitted
+        tokens = self.estimate(prompt)
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait <= 0:
+                return tokens
+            self.wait_time += wait
+            time.sleep(wait)
+
+    async def acquire_async(self, prompt):
+        """acquire 的协程版本，等待时不阻塞事件循环。"""
+        admitted = self._take_admitted()
+        if admitted is not None:
+            return admitted
+        tokens = self.estimate(prompt)
+        while True:
+            wait = self._try_acquire(tokens)
+            if wait <= 0:
+                return tokens
+            self.wait_time += wait
+            await asyncio.sleep(wait)
+
+    def correct(self, estimated_tokens, actual_tokens):
+        """用响应中的真实token用量修正预估扣减的额度，额度可以暂时为负。"""
+        if not self.tpm or actual_tokens is None:
+            return
+        with self.lock:
+            self.token_level -= actual_tokens - estimated_tokens
@@ -1,10 +1,10 @@
-import requests
 import json
 import jwt
 import os
 import time
 import threading
 from dotenv import load_dotenv
+from .http_pool import HTTPPool
 
 class SenseService:
     def __init__(self, version='SenseChat',refresh_interval=1700):
@@ -18,6 +18,7 @@ class SenseService:
         self.lock = threading.Lock()
         self.refresh_token()
         self.total_tokens_used = 0 
+        self.rate_limiter = None  # 由 LLMLoader 配置的共享限流器
 
     def generate_jwt_token(self):
         headers = {"alg": "HS256", "typ": "JWT"}
@@ -40,10 +41,14 @@ class SenseService:
             "Content-Type": "application/json"
         }
         
-        response = requests.get(url, headers=headers)
+        response = HTTPPool.session(self.base_url).get(url, headers=headers)
         return print(response.json())
 
-    def ask_once(self,messages=None, know_ids=None, max_new_tokens=None, n=1, repetition_penalty=1.05, stream=False, temperature=0.8, top_p=0.7, user=None, knowledge_config=None, plugins=None, retry_count=0):
+    def ask(self, prompt, timeout=None):
+        """与 QwenService.ask 一致的统一入口，供 MultiProcessor 和 CompositeService 调用。"""
+        return self.ask_once(messages=prompt, timeout=timeout)
+
+    def ask_once(self,messages=None, know_ids=None, max_new_tokens=None, n=1, repetition_penalty=1.05, stream=False, temperature=0.8, top_p=0.7, user=None, knowledge_config=None, plugins=None, retry_count=0, timeout=None):
         url = self.base_url+'/chat-completions'
         headers = {"Content-Type": "application/json", "Authorization": "Bearer "+self.authorization}
         payload = {
@@ -62,23 +67,26 @@ class SenseService:
             'plugins':{}
         }
 
-        response = requests.post(url, headers=headers, data=json.dumps(payload))
+        estimated_tokens = self.rate_limiter.acquire(messages) if self.rate_limiter else 0
+        response = HTTPPool.session(self.base_url).post(url, headers=headers, data=json.dumps(payload), timeout=timeout)
+        if response.status_code == 401:
+            if retry_count < 3:  # 允许最多重试3次
+                self.refresh_token()  # 刷新token
+                return self.ask_once(messages, know_ids, max_new_tokens, n, repetition_penalty, stream, temperature, top_p, user, knowledge_config, plugins, retry_count + 1, timeout)
+            else:
+                # 超过重试次数，可以返回错误信息或抛出异常
+                return {"error": "Authentication failed after 3 retries."}
         response_data = response.json()
 
         # 提取'message'字段的值
         total_tokens = response_data['data']['usage']['total_tokens']
         self.total_tokens_used += total_tokens  # 更新总共使用的token数量
+        if self.rate_limiter:
+            self.rate_limiter.correct(estimated_tokens, total_tokens)
         message = response_data['data']['choices'][0]['message']
         if response.status_code == 200:
             print("本次使用的token数量：", total_tokens)
             return message
-        elif response.status_code == 401:
-            if retry_count < 3:  # 允许最多重试3次
-                self.refresh_token()  # 刷新token
-                return self.send_request(know_ids, max_new_tokens, messages, model, n, repetition_penalty, stream, temperature, top_p, user, knowledge_config, plugins, retry_count + 1)
-            else:
-                # 超过重试次数，可以返回错误信息或抛出异常
-                return {"error": "Authentication failed after 3 retries."}
         else:
             return response.status_code
 
@@ -93,7 +101,7 @@ class SenseService:
             "input": [input_text]
         }
 
-        response = requests.post(url, headers=headers, data=json.dumps(payload))
+        response = HTTPPool.session(self.base_url).post(url, headers=headers, data=json.dumps(payload))
         if response.status_code == 200:
             response_data = response.json()
             embedding = {}
@@ -104,7 +112,7 @@ class SenseService:
         elif response.status_code == 401:
             if retry_count < 3:
                 self.refresh_token()  # 刷新token
-                return self.embeddings(model, input_text, retry_count + 1)
+                return self.embed(input_text, model, retry_count + 1)
             else:
                 return {"error": "Authentication failed after 3 retries."}
         else:
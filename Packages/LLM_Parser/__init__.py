@@ -1 +1,2 @@
-from .llm_parser import LLMParser
\ No newline at end of file
+from .llm_parser import LLMParser
+from .pad_detector import PadDetector
\ No newline at end of file
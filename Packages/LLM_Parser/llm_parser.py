@@ -81,6 +81,27 @@ class LLMParser:
         except Exception as e:
             raise RuntimeError(f"解析失败，错误信息：{e}。原文字串为{str_with_pads}")
 
+    def parse_numbered_pads(self, str_with_pads):
+        """
+        解析打包请求的回答，每个单元的内容由 =start_pad_编号= 和 =end_pad_编号= 包裹。
+
+        :param str_with_pads: 包含多个编号 pad 的回答
+        :return: 编号 -> 内容 的字典，只包含成功解析且内容非空的单元
+        """
+        results = {}
+        pattern = re.compile(r'=start_pad_(\d+)=(.*)=end_pad_\1=', re.DOTALL | re.IGNORECASE)
+        str_with_pads_lower = str_with_pads.lower()
+        for number in sorted({int(n) for n in re.findall(r'=start_pad_(\d+)=', str_with_pads_lower)}):
+            # 同一编号取第一个开始标志到最后一个结束标志，与 parse_pads 一致
+            match = pattern.match(str_with_pads, str_with_pads_lower.find(f'=start_pad_{number}='))
+            if not match:
+                continue
+            # 单个单元的内容按 parse_pads 相同的规则处理
+            content = self.parse_pads(f'=start_pad={match.group(2)}=end_pad=')
+            if content:
+                results[number] = content
+        return results
+
 
     def parse_code(self,markdown_text):
         """
@@ -0,0 +1,69 @@
+class PadDetector:
+    """流式回答的增量 pad 检测器，规则与 validation / LLMParser.parse_pads 一致。
+
+    不区分大小写；内容从第一个 =start_pad= 之后开始，到最后一个 =end_pad= 为止。
+    前 max_prefix 个字符内没有出现 =start_pad= 时把 rejected 置为True，调用方可据此中止请求。
+    feed 交出的是尚未经过 parse_pads 标点替换的原始内容，最终结果仍以 parse_pads 为准。
+
+    =end_pad= 出现之前，=start_pad= 之后的内容就会陆续交出，而整段回答之后仍可能校验失败
+    （没有 =end_pad=、被中止重试或改用纠错后的回答）。调用方要么在最终校验失败时丢弃已收到的内容，
+    要么先缓存，等 end_index 不再为 -1（已出现 =end_pad=）后再使用。
+    """
+
+    def __init__(self, max_prefix=None, start_pad='=start_pad=', end_pad='=end_pad='):
+        self.max_prefix = max_prefix  # =start_pad= 必须出现在前多少个字符内，None表示不限制
+        self.start_pad = start_pad
+        self.end_pad = end_pad
+        # 收到的文本按块保存，只在读取 text 时拼接一次，避免逐块拼接字符串的平方级开销
+        self.chunks = []
+        self.length = 0  # 已收到的字符数
+        self.tail = ''  # 末尾可能是半个标志的字符，与下一块拼接后查找跨块的标志
+        self.pending = []  # 从 emitted 开始尚未交出的内容
+        self.content_start = None  # =start_pad= 之后的位置
+        self.end_index = -1  # 目前最后一个 =end_pad= 的位置
+        self.emitted = 0  # 已交出的内容终点
+        self.rejected = False
+
+    @property
+    def text(self):
+        """目前收到的全部文本。"""
+        return ''.join(self.chunks)
+
+    def feed(self, chunk):
+        """追加一段流式输出，返回新确认的 pad 内容（可能为空字符串）。
+
+        返回的内容只在整段回答最终通过校验时有效，见类说明。
+        """
+        # 标志可能跨越两个chunk，在上一段末尾的几个字符加上本段中查找
+        window = self.tail + chunk
+        window_lower = window.lower()
+        offset = self.length - len(self.tail)  # window 在全文中的起点
+        self.chunks.append(chunk)
+        self.length += len(chunk)
+        self.tail = window[max(len(window) - max(len(self.start_pad), len(self.end_pad)) + 1, 0):]
+
+        if self.content_start is None:
+            start_index = window_lower.find(self.start_pad)
+            if start_index == -1:
+                if self.max_prefix is not None and self.length - len(self.start_pad) >= self.max_prefix:
+                    self.rejected = True
+                return ''
+            self.content_start = self.emitted = offset + start_index + len(self.start_pad)
+            self.pending = [window[self.content_start - offset:]]
+        else:
+            self.pending.append(chunk)
+
+        end_index = window_lower.rfind(self.end_pad, self.content_start - offset if self.content_start > offset else 0)
+        if end_index != -1:
+            self.end_index = offset + end_index
+
+        # 出现 =end_pad= 后，它之前的内容已确定；之后的文字要等到下一个 =end_pad= 才能确认
+        # 尚未出现时保留末尾可能是半个 =end_pad= 的字符
+        limit = self.end_index if self.end_index != -1 else self.length - len(self.end_pad) + 1
+        if limit <= self.emitted:
+            return ''
+        pending = ''.join(self.pending)
+        content = pending[:limit - self.emitted]
+        self.pending = [pending[limit - self.emitted:]]
+        self.emitted = limit
+        return content
@@ -1 +1,10 @@
-from .multi_process import MultiProcessor
\ No newline at end of file
+from .multi_process import MultiProcessor
+from .result_cache import ResultCache
+from .checkpoint import CheckpointJournal
+from .async_multi_process import AsyncMultiProcessor
+from .concurrency import AIMDController
+from .scheduling import order_tasks, SCHEDULES
+from .hedging import HedgePolicy
+from .batch_runner import BatchRunner
+from .metrics import MetricsRegistry
+from .tracing import Tracer
\ No newline at end of file
@@ -0,0 +1,389 @@
+import asyncio
+import contextvars
+import inspect
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+from .multi_process import MultiProcessor, current_unit
+from .deadline import Deadline, Cancelled, current_deadline
+from .scheduling import order_tasks
+
+class AsyncMultiProcessor(MultiProcessor):
+    """基于asyncio的执行引擎，在单个事件循环上并发成百上千个请求。
+
+    构造参数与 MultiProcessor 一致；LLM 服务提供 ask_async 时直接等待协程，
+    否则退回到线程池中执行同步的 ask，线程池大小与 num_threads 一致，不受事件循环默认线程池大小的限制。
+    与线程版相同，截止时间只计算请求实际发出后的耗时，等待并发名额、限流额度和退避期间不计时。
+    """
+
+    def __init__(self, llm, parse_method, data_template, prompt_template, correction_template, validator, cache=None, timeout=100, max_reschedules=1, concurrency=None, cost_tracker=None, schedule='fifo', hedge=None, stream_detector=None, stream_retries=1, metrics=None, tracer=None):
+        super().__init__(llm, parse_method, data_template, prompt_template, correction_template, validator,
+                         cache=cache, timeout=timeout, max_reschedules=max_reschedules, concurrency=concurrency,
+                         cost_tracker=cost_tracker, schedule=schedule, hedge=hedge, stream_detector=stream_detector,
+                         stream_retries=stream_retries, metrics=metrics, tracer=tracer)
+        self.executor = None  # 执行同步 ask 和取任务的线程池，在 multitask_perform_async 中按 num_threads 创建
+
+    async def ask(self, prompt, llm=None):
+        llm = llm or self.llm
+        if not hasattr(llm, 'ask_async'):
+            loop = asyncio.get_running_loop()
+            # run_in_executor 不会复制 contextvars，手动复制以保留当前单元索引和 span
+            return await loop.run_in_executor(self.executor, contextvars.copy_context().run, self.ask_llm, prompt, llm)
+
+        deadline = current_deadline.get()
+        admission = None
+        if self.concurrency is not None:
+            # 不能在事件循环中阻塞等待，轮询获取并发名额；等待期间截止时间不计时
+            while not self.concurrency.try_acquire():
+                await asyncio.sleep(0.01)
+        try:
+            # 与线程版相同，在截止时间开始计时之前取得限流额度
+            admission = await self.admit_async(prompt, llm) if deadline is not None else None
+            if deadline is not None and deadline.cancelled:
+                # 等待期间尝试已被放弃（例如对冲请求的另一支已超时），不再发出请求，避免重复请求和计费
+                raise Cancelled()
+        except BaseException:
+            # 请求没有发出（包括等待期间被取消），归还并发名额和限流额度
+            self.release_unused(admission)
+            raise
+        if deadline is not None:
+            deadline.resume()
+        start_time = time.time()
+        error = throttled = False
+        try:
+            with self.span('llm.ask', provider=getattr(llm, 'version', type(llm).__name__)) as span:
+                if self.stream_detector is not None and hasattr(llm, 'ask_stream_async'):
+                    answer = await self.stream_llm_async(prompt, llm)
+                elif self.timeout is not None and 'timeout' in inspect.signature(llm.ask_async).parameters:
+                    answer = await llm.ask_async(prompt, timeout=self.timeout)
+                else:
+                    answer = await llm.ask_async(prompt)
+                error = isinstance(answer, str) and answer.startswith(self.ERROR_PREFIXES)
+                # last_usage 按线程记录，不适用于同一线程上并发的协程
+                self.record_cost(prompt, answer, use_last_usage=False, llm=llm)
+                self.trace_tokens(span, prompt, answer, use_last_usage=False, error=error)
+                return self.check_answer(answer)
+        except Exception as e:
+            error = True
+            throttled = self.is_throttled(e)
+            raise
+        finally:
+            if deadline is not None:
+                deadline.pause()
+            if self.concurrency is not None:
+                self.release_concurrency(time.time() - start_time, error, throttled)
+
+    @classmethod
+    async def admit_async(cls, prompt, llm):
+        """admit 的协程版本，等待限流额度时不阻塞事件循环。"""
+        admission = cls.admission_of(llm)
+        if admission is None or not hasattr(admission, 'admit_async'):
+            return None
+        await admission.admit_async(prompt)
+        return admission
+
+    async def stream_llm_async(self, prompt, llm):
+        """stream_llm 的协程版本。"""
+        for attempt in range(self.stream_retries + 1):
+            detector = self.stream_detector()
+            if self.timeout is not None and 'timeout' in inspect.signature(llm.ask_stream_async).parameters:
+                stream = llm.ask_stream_async(prompt, timeout=self.timeout)
+            else:
+                stream = llm.ask_stream_async(prompt)
+            try:
+                async for chunk in stream:
+                    content = detector.feed(chunk)
+                    if content and self.on_chunk is not None:
+                        self.on_chunk(current_unit.get(), content)
+                    if detector.rejected and attempt < self.stream_retries:
+                        break
+            finally:
+                await stream.aclose()
+            if not detector.rejected or attempt == self.stream_retries:
+                return detector.text
+            self.stream_aborts.append(current_unit.get())
+            self.record_cost(prompt, detector.text, use_last_usage=False, llm=llm)
+            print(f"Stream aborted: start pad missing in the first {len(detector.text)} chars. Retry {attempt + 1}/{self.stream_retries}")
+
+    async def hedged_ask_async(self, prompt):
+        """hedged_ask 的协程版本：落后的请求不取消，只忽略其结果，以便统计节省的尾延迟。"""
+        hedge = self.hedge
+        delay = hedge.delay()
+        hedge.record_primary()
+        start_time = time.time()
+        race = {'hedge_won_at': None}
+
+        def on_primary_done(task):
+            hedge.record_latency(time.time() - start_time)
+            if race['hedge_won_at'] is not None:
+                hedge.record_saved(time.time() - race['hedge_won_at'])
+
+        primary = asyncio.ensure_future(self.ask(prompt))
+        primary.add_done_callback(on_primary_done)
+        tasks = {primary: 'primary'}
+        can_hedge = delay is not None
+        fallback = None
+        while tasks:
+            done, _ = await asyncio.wait(tasks, timeout=delay if can_hedge else None, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # 主请求超过延迟分位数仍未返回，预算允许时发出对冲请求
+                can_hedge = False
+                if hedge.try_hedge():
+                    tasks[asyncio.ensure_future(self.ask(prompt, hedge.hedge_llm))] = 'hedge'
+                continue
+            for task in done:
+                name = tasks.pop(task)
+                error = task.exception()
+                answer = None if error else task.result()
+                if error is None and self.validator(answer):
+                    if name == 'hedge':
+                        race['hedge_won_at'] = time.time()
+                        hedge.record_win()
+                    return answer
+                if fallback is None or fallback[1] is not None:
+                    fallback = (answer, error)
+
+        answer, error = fallback
+        if error is not None:
+            raise error
+        return answer
+
+    async def task_perform_async(self, **kwargs):
+        try:
+            prompt = self.generate_prompt(**kwargs)
+            return await (self.hedged_ask_async(prompt) if self.hedge is not None else self.ask(prompt))
+        except Cancelled:
+            raise
+        except Exception as e:
+            # 限流错误交给 process_tuple_async 退避重试
+            if self.is_throttled(e):
+                raise
+            print(f"Error in task_perform: {str(e)}")
+            return None
+
+    async def process_tuple_async(self, input_tuple):
+        input_data = input_tuple[:-1]
+        index = input_tuple[-1]
+        attempts = 0
+        base_wait_time = 1  # 初始等待时间
+        current_unit.set(index)
+
+        with self.trace_unit(index) as unit_span:
+            key = None
+            if self.cache is not None:
+                key = self.cache_key(input_data)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    self.count('annotator_units_total', status='cached')
+                    unit_span.set(status='cached')
+                    return (cached, index)
+
+            start_time = time.time()
+            if self.metrics is not None:
+                self.metrics.add('annotator_in_flight_units', 1)
+            try:
+                while attempts < 3:
+                    with self.span('attempt', attempt=attempts + 1):
+                        try:
+                            input_dict = {f'input_{i+1}': input_data[i] for i in range(len(input_data))}
+                            answer = await self.task_perform_async(**input_dict)
+                            if answer is None:
+                                self.count('annotator_retries_total', reason='empty')
+                                attempts += 1
+                                continue
+                            # 先校验原始回答，通过后再解析
+                            if not self.validate(answer):
+                                self.count('annotator_corrections_total')
+                                with self.span('correct_data'):
+                                    answer = await self.ask(self.generate_correction_prompt(answer))
+                                if not answer or not self.validate(answer):
+                                    break
+                            with self.span('parse'):
+                                structured_data = self.parse_method(answer)
+                            if key is not None:
+                                self.cache.set(key, structured_data)
+                            self.finish_unit(start_time, 'ok')
+                            unit_span.set(status='ok', attempts=attempts + 1)
+                            return (structured_data, index)
+                        except Cancelled:
+                            # 尝试已被看门狗放弃，结果由重新排队的任务或超时处理负责
+                            self.finish_unit(start_time, 'timed_out')
+                            unit_span.set(status='timed_out', attempts=attempts + 1)
+                            return (None, index)
+                        except Exception as e:
+                            if self.is_throttled(e):
+                                self.count('annotator_retries_total', reason='throttled')
+                                wait_time = base_wait_time * (2 ** attempts) + random.uniform(0, 1)
+                                print(f"Rate limit exceeded. Retrying in {wait_time:.2f} seconds. Attempt {attempts + 1}/3")
+                                with self.span('backoff', wait=wait_time):
+                                    await asyncio.sleep(wait_time)
+                                attempts += 1
+                            else:
+                                self.count('annotator_retries_total', reason='error')
+                                print(f"An error occurred: {str(e)}. Attempt {attempts + 1}/3")
+                                attempts += 1
+            except asyncio.CancelledError:
+                # 请求累计耗时超过截止时间，被 run_attempt_async 取消
+                self.finish_unit(start_time, 'timed_out')
+                unit_span.set(status='timed_out', attempts=attempts + 1)
+                raise
+
+            self.finish_unit(start_time, 'failed')
+            unit_span.set(status='failed', attempts=attempts)
+            return (None, index)
+
+    async def run_attempt_async(self, input_tuple, deadline):
+        """处理一次任务尝试，请求累计耗时超过截止时间时取消该尝试并设置 deadline.cancelled。
+
+        截止时间通过上下文传给 ask；时钟暂停期间剩余时间不变，按剩余时间等待即可，不需要轮询。
+        """
+        current_deadline.set(deadline)
+        attempt = asyncio.ensure_future(self.process_tuple_async(input_tuple))
+        try:
+            while True:
+                remaining = deadline.remaining()
+                if remaining is not None and remaining <= 0:
+                    deadline.expire()
+                    attempt.cancel()
+                    # 等待取消完成，process_tuple_async 在取消时记录超时
+                    await asyncio.gather(attempt, return_exceptions=True)
+                    return None
+                done, _ = await asyncio.wait({attempt}, timeout=remaining)
+                if done:
+                    return attempt.result()
+        except asyncio.CancelledError:
+            attempt.cancel()
+            raise
+        finally:
+            deadline.finish()
+
+    async def multitask_perform_async(self, tuple_list, num_threads, journal=None, on_result=None, on_chunk=None, keep_results=True):
+        """tuple_list 也可以是迭代器，此时在线程池中逐个取出任务，边取边启动，结果按到达顺序排列。
+
+        keep_results=False 时结果只交给 on_result 而不保留，返回没有结果的单元索引。
+        """
+        # 默认线程池只有 min(32, CPU数+4) 个线程，同步服务的在途请求数会被限制在 num_threads 以下；
+        # 改用与 num_threads 一致的线程池，另留一个线程给流式取任务
+        self.executor = ThreadPoolExecutor(max_workers=max(1, num_threads) + 1, thread_name_prefix='async-ask')
+        try:
+            streaming = not isinstance(tuple_list, (list, tuple))
+            results = [] if streaming or not keep_results else [None] * len(tuple_list)
+            failed = []
+            arrived = 0
+            self.timed_out = []
+            self.skipped = []
+            self.stream_aborts = []
+            self.on_chunk = on_chunk
+            semaphore = asyncio.BoundedSemaphore(max(1, num_threads))  # 限制同时在途的请求数
+            start_time = time.time()  # 列表中的单元同时进入等待，用于记录排队的 span
+            if self.metrics is not None:
+                self.metrics.set('annotator_queue_depth', 0 if streaming else len(tuple_list))
+
+            async def run_one(idx, input_tuple, pbar, enqueued_at=start_time):
+                result = None
+                admitted = True
+                if self.cost_tracker is not None:
+                    # 在并发名额内做准入判断，使在途单元数与线程版一致
+                    async with semaphore:
+                        admitted = self.cost_tracker.admit(self.unit_prompt(input_tuple))
+                if not admitted:
+                    # 预算不足，不再请求该单元
+                    self.skipped.append(input_tuple[-1])
+                    if not keep_results:
+                        failed.append(input_tuple[-1])
+                    self.count('annotator_units_total', status='skipped')
+                    if self.metrics is not None:
+                        self.metrics.add('annotator_queue_depth', -1)
+                    if on_result is not None:
+                        on_result(input_tuple, None)
+                    pbar.update(1)
+                    return
+                for attempt in range(self.max_reschedules + 1):
+                    async with semaphore:
+                        if attempt == 0 and self.metrics is not None:
+                            # 拿到并发名额即离开等待队列
+                            self.metrics.add('annotator_queue_depth', -1)
+                        if attempt == 0 and self.tracer is not None:
+                            self.tracer.record('queue', input_tuple[-1], enqueued_at, time.time())
+                        # 截止时间只计算请求实际发出后的耗时，超时的尝试被取消，占用的并发名额随即释放
+                        deadline = Deadline(self.timeout)
+                        result = await self.run_attempt_async(input_tuple, deadline)
+                        if not deadline.cancelled:
+                            break
+                        result = None
+                        self.timed_out.append(input_tuple[-1])
+                        self.count('annotator_timeouts_total')
+                        print(f"Task {input_tuple[-1]} timed out ({attempt + 1}/{self.max_reschedules + 1}).")
+                if keep_results:
+                    results[idx] = result
+                elif not (result and result[0] is not None):
+                    failed.append(input_tuple[-1])
+                if self.cost_tracker is not None:
+                    self.cost_tracker.complete(self.unit_prompt(input_tuple))
+                    pbar.set_postfix(cost=f"{self.cost_tracker.spent:.4f}", projected=f"{self.cost_tracker.projected_cost():.4f}")
+                if journal is not None and result and result[0] is not None:
+                    journal.append(result[0], result[1], key=journal.task_key(input_tuple))
+                if on_result is not None:
+                    on_result(input_tuple, result)
+                pbar.update(1)
+
+            if streaming:
+                with tqdm(total=0) as pbar:
+                    loop = asyncio.get_running_loop()
+                    iterator = iter(tuple_list)
+                    finished = object()
+                    tasks = []
+                    try:
+                        while True:
+                            # 取下一个任务可能要等待（例如文件仍在分析中），放到线程池里避免阻塞事件循环
+                            input_tuple = await loop.run_in_executor(self.executor, next, iterator, finished)
+                            if input_tuple is finished:
+                                break
+                            if keep_results:
+                                results.append(None)
+                            arrived += 1
+                            pbar.total += 1
+                            pbar.refresh()
+                            if self.metrics is not None:
+                                self.metrics.add('annotator_queue_depth', 1)
+                            tasks.append(asyncio.ensure_future(run_one(arrived - 1, input_tuple, pbar, time.time())))
+                    finally:
+                        # 取任务出错时同样等已启动的单元结束
+                        await asyncio.gather(*tasks)
+                return results if keep_results else failed
+
+            with tqdm(total=len(tuple_list)) as pbar:
+                # 信号量按等待顺序放行，协程的创建顺序即调度顺序
+                await asyncio.gather(*(run_one(idx, input_tuple, pbar) for idx, input_tuple in order_tasks(tuple_list, self.schedule)))
+
+            return results if keep_results else failed
+        finally:
+            # 超时被取消的协程不会中断线程中的同步请求，不等待这些线程结束
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def multitask_perform(self, tuple_list, num_threads, journal=None, on_result=None, on_chunk=None, keep_results=True):
+        """同步入口，num_threads 表示允许同时在途的请求数。"""
+        coroutine = self.multitask_perform_async(tuple_list, num_threads, journal=journal, on_result=on_result, on_chunk=on_chunk, keep_results=keep_results)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coroutine)
+
+        # 在Jupyter等已有事件循环的环境中，换到独立线程里运行新的事件循环
+        outcome = {}
+
+        def runner():
+            try:
+                outcome['results'] = asyncio.run(coroutine)
+            except BaseException as e:
+                outcome['error'] = e
+
+        thread = threading.Thread(target=runner)
+        thread.start()
+        thread.join()
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['results']
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import time
+
+class BatchRunner:
+    """离线批量模式：把所有提示词写成JSONL批量任务提交给服务，轮询完成后按单元索引合并结果。
+
+    服务需提供 batch_request / submit_batch / batch_status / batch_results 接口。
+    提示词、校验、解析、缓存和花费统计沿用 processor 的设置；没有结果或校验失败的单元由 run 返回，交给在线请求处理。
+    """
+    TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+    def __init__(self, processor, llm, batch_dir, poll_interval=60):
+        self.processor = processor
+        self.llm = llm
+        self.batch_dir = batch_dir
+        self.poll_interval = poll_interval  # 轮询批量任务状态的间隔（秒）
+        self.state_path = os.path.join(batch_dir, 'batch_state.json')
+
+    def write_batch(self, tuple_list, file_path):
+        """写出批量请求文件，custom_id 为单元索引，返回 custom_id -> 提示词。"""
+        prompts = {}
+        with open(file_path, 'w', encoding='utf-8') as file:
+            for input_tuple in tuple_list:
+                input_data = input_tuple[:-1]
+                custom_id = str(input_tuple[-1])
+                prompts[custom_id] = self.processor.generate_prompt(**{f'input_{i+1}': input_data[i] for i in range(len(input_data))})
+                file.write(json.dumps(self.llm.batch_request(custom_id, prompts[custom_id]), ensure_ascii=False) + '\n')
+        return prompts
+
+    def submit(self, file_path):
+        """提交批量任务。同一份请求文件已经提交过时沿用原任务，进程中断后重新运行不会重复提交。"""
+        with open(file_path, 'rb') as file:
+            input_hash = hashlib.sha256(file.read()).hexdigest()
+        if os.path.isfile(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as file:
+                state = json.load(file)
+            if state.get('input_hash') == input_hash:
+                print(f"沿用已提交的批量任务 {state['batch_id']}")
+                return state['batch_id']
+
+        batch_id = self.llm.submit_batch(file_path)
+        temp_path = self.state_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({'batch_id': batch_id, 'input_hash': input_hash}, file)
+        os.replace(temp_path, self.state_path)
+        print(f"已提交批量任务 {batch_id}")
+        return batch_id
+
+    def wait(self, batch_id):
+        """轮询直到批量任务结束，返回最终状态。"""
+        while True:
+            status = self.llm.batch_status(batch_id)
+            print(f"批量任务 {batch_id}: {status['status']}，已完成 {status.get('completed', 0)}/{status.get('total', 0)}")
+            if status['status'] in self.TERMINAL_STATUSES:
+                return status
+            time.sleep(self.poll_interval)
+
+    @staticmethod
+    def parse_record(record):
+        """从OpenAI兼容格式的批量结果中取出 (回答, (输入token数, 输出token数))，失败时回答为None。"""
+        response = record.get('response') or {}
+        if response.get('status_code') != 200:
+            return None, None
+        body = response.get('body') or {}
+        choices = body.get('choices') or []
+        if not choices:
+            return None, None
+        usage = body.get('usage')
+        usage = (usage['prompt_tokens'], usage['completion_tokens']) if usage else None
+        return choices[0].get('message', {}).get('content'), usage
+
+    def run(self, tuple_list, on_result=None):
+        """提交批量任务并合并结果。
+
+        :return: (results, failed_list)，results 为 (structured_data, index) 列表，failed_list 为需要在线处理的任务
+        """
+        processor = self.processor
+        results = []
+        pending_list = []
+        keys = {}
+        for input_tuple in tuple_list:
+            # 缓存命中的单元不进入批量任务
+            if processor.cache is not None:
+                keys[input_tuple[-1]] = processor.cache_key(input_tuple[:-1])
+                cached = processor.cache.get(keys[input_tuple[-1]])
+                if cached is not None:
+                    results.append((cached, input_tuple[-1]))
+                    if on_result is not None:
+                        on_result(input_tuple, (cached, input_tuple[-1]))
+                    continue
+            pending_list.append(input_tuple)
+        if not pending_list:
+            return results, []
+
+        os.makedirs(self.batch_dir, exist_ok=True)
+        input_path = os.path.join(self.batch_dir, 'batch_input.jsonl')
+        prompts = self.write_batch(pending_list, input_path)
+        batch_id = self.submit(input_path)
+        status = self.wait(batch_id)
+        if status['status'] != 'completed':
+            print(f"批量任务 {batch_id} 以状态 {status['status']} 结束，未完成的任务改为在线请求")
+
+        answers = {}
+        for record in self.llm.batch_results(batch_id):
+            custom_id = str(record.get('custom_id'))
+            if custom_id not in prompts:
+                continue
+            answer, usage = self.parse_record(record)
+            if processor.cost_tracker is not None and answer is not None:
+                # 服务的批量接口按折扣价计费；本地替身逐条发出在线请求，按在线价格计费
+                processor.cost_tracker.record(int(custom_id), prompts[custom_id], answer, usage, model=getattr(self.llm, 'version', None),
+                                              batch=getattr(self.llm, 'batch_discounted', True))
+            answers[custom_id] = answer
+
+        failed_list = []
+        for input_tuple in pending_list:
+            answer = answers.get(str(input_tuple[-1]))
+            structured_data = None
+            if answer and processor.validator(answer):
+                try:
+                    structured_data = processor.parse_method(answer)
+                except Exception as e:
+                    print(f"Error in batch result {input_tuple[-1]}: {str(e)}")
+            if structured_data is None:
+                failed_list.append(input_tuple)
+                continue
+            if processor.cache is not None:
+                processor.cache.set(keys[input_tuple[-1]], structured_data)
+            results.append((structured_data, input_tuple[-1]))
+            if on_result is not None:
+                on_result(input_tuple, (structured_data, input_tuple[-1]))
+        print(f"批量任务完成 {len(results)} 个任务，{len(failed_list)} 个任务改为在线请求")
+        return results, failed_list
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+class CheckpointJournal:
+    """只追加的JSONL检查点日志，记录每个已完成任务的 (result, index) 以及任务内容的哈希。
+
+    读取时只采用内容哈希与当前任务一致的记录，源码或排除列表变化后索引错位的旧结果会被忽略。
+    所有任务完成后调用 finish 把日志改名为 .done，之后的运行不会再读取它。
+    """
+
+    def __init__(self, journal_path, fsync_every=32, fsync_interval=1.0):
+        self.journal_path = journal_path
+        self.fsync_every = fsync_every  # 每累计多少条记录强制落盘一次
+        self.fsync_interval = fsync_interval  # 距离上次落盘超过多少秒强制落盘一次
+        self.lock = threading.Lock()
+        self.file = None
+        self.pending = 0
+        self.last_sync = time.time()
+
+    @staticmethod
+    def task_key(input_tuple):
+        """任务内容（不含索引）的哈希，用于确认日志中的记录属于同一个单元。"""
+        return hashlib.sha256(json.dumps(list(input_tuple[:-1]), ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def load(self, tuple_list=None):
+        """读取日志中已完成的结果，返回 index -> result 的字典。
+
+        传入 tuple_list 时只返回其中各任务的记录，且内容哈希必须一致，不一致或没有哈希的记录视为过期并忽略。
+        """
+        completed = {}
+        if not os.path.isfile(self.journal_path):
+            return completed
+        keys = {input_tuple[-1]: self.task_key(input_tuple) for input_tuple in tuple_list} if tuple_list is not None else None
+        stale = 0
+        with open(self.journal_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 进程崩溃时最后一行可能只写了一半，直接忽略
+                    continue
+                if keys is not None:
+                    if record['index'] not in keys:
+                        # 不在本次任务列表中的单元（例如已由打包请求完成）与本次无关
+                        continue
+                    if keys[record['index']] != record.get('key'):
+                        stale += 1
+                        continue
+                completed[record['index']] = record['result']
+        if stale:
+            print(f"检查点日志中有 {stale} 条记录与当前单元内容不一致，已忽略")
+        return completed
+
+    def append(self, result, index, key=None):
+        """追加一条记录，按条数或时间批量fsync；key 为任务的 task_key。"""
+        line = json.dumps({'index': index, 'key': key, 'result': result}, ensure_ascii=False) + '\n'
+        with self.lock:
+            if self.file is None:
+                journal_dir = os.path.dirname(self.journal_path)
+                if journal_dir:
+                    os.makedirs(journal_dir, exist_ok=True)
+                self.file = open(self.journal_path, 'a', encoding='utf-8')
+            self.file.write(line)
+            self.file.flush()
+            self.pending += 1
+            if self.pending >= self.fsync_every or time.time() - self.last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_sync = time.time()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self._sync()
+                self.file.close()
+                self.file = None
+
+    def finish(self):
+        """所有任务都已完成：关闭日志并改名为 .done，保留记录但不再被后续运行读取。"""
+        self.close()
+        if os.path.isfile(self.journal_path):
+            os.replace(self.journal_path, self.journal_path + '.done')
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import deque
+
+class AIMDController:
+    """加性增、乘性减（AIMD）的自适应并发控制器。
+
+    请求健康（延迟正常、错误率低）时每个成功请求把并发上限增加 increase/limit，
+    即大约每一轮增加 increase；遇到限流时把上限乘以 decrease_factor。
+    """
+
+    def __init__(self, initial_limit=8, min_limit=1, max_limit=200, increase=1.0, decrease_factor=0.5,
+                 error_threshold=0.2, latency_tolerance=3.0, window=50):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.error_threshold = error_threshold  # 窗口内错误率超过该值时视为不健康
+        self.latency_tolerance = latency_tolerance  # 延迟超过历史最低延迟的多少倍时停止增加
+        self.outcomes = deque(maxlen=window)  # 最近请求是否出错
+        self.in_flight = 0
+        self.min_latency = None
+        self.latency_ewma = None
+        self.throttle_count = 0
+        self.decrease_count = 0
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def current_limit(self):
+        return max(self.min_limit, int(self.limit))
+
+    def try_acquire(self):
+        """在不超过当前上限时占用一个并发名额，成功返回True。"""
+        with self.condition:
+            if self.in_flight < self.current_limit():
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        """阻塞直到获得一个并发名额。"""
+        with self.condition:
+            while self.in_flight >= self.current_limit():
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release_unused(self):
+        """归还未实际发出请求的名额（例如任务已被放弃），不影响并发上限的调整。"""
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def release(self, latency, error=False, throttled=False):
+        """归还名额，并根据本次请求的延迟和结果调整并发上限。"""
+        with self.condition:
+            self.in_flight -= 1
+            self.outcomes.append(error or throttled)
+
+            if not throttled and not error:
+                self.min_latency = latency if self.min_latency is None else min(self.min_latency, latency)
+                self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+
+            if throttled:
+                self.throttle_count += 1
+                self._decrease(latency)
+            elif self._error_rate() > self.error_threshold:
+                self._decrease(latency)
+            elif not error and self._latency_healthy():
+                self.limit = min(self.max_limit, self.limit + self.increase / max(self.limit, 1.0))
+            self.condition.notify_all()
+
+    def _decrease(self, latency):
+        # 同一批在途请求可能同时被限流，一个延迟周期内只减少一次
+        now = time.time()
+        if now - self.last_decrease < max(latency, self.latency_ewma or 0.0):
+            return
+        self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+        self.last_decrease = now
+        self.decrease_count += 1
+        self.outcomes.clear()
+
+    def _error_rate(self):
+        if len(self.outcomes) < self.outcomes.maxlen // 2:
+            return 0.0
+        return sum(self.outcomes) / len(self.outcomes)
+
+    def _latency_healthy(self):
+        if self.min_latency is None or self.latency_ewma is None:
+            return True
+        return self.latency_ewma <= self.min_latency * self.latency_tolerance
+
+    def metrics(self):
+        """返回当前并发上限等指标。"""
+        with self.condition:
+            return {
+                'limit': self.current_limit(),
+                'in_flight': self.in_flight,
+                'latency_ewma': self.latency_ewma,
+                'error_rate': self._error_rate(),
+                'throttles': self.throttle_count,
+                'decreases': self.decrease_count
+            }
@@ -0,0 +1,83 @@
+import contextvars
+import threading
+import time
+
+# 当前线程正在执行的任务尝试的截止时间，对冲请求的线程复制上下文后共用同一个
+current_deadline = contextvars.ContextVar('current_deadline', default=None)
+
+
+class Cancelled(Exception):
+    """任务已被看门狗放弃（重新排队或记为超时），被放弃的线程不再发出新的请求。"""
+
+
+class Deadline:
+    """一次任务尝试的截止时间，只计算请求实际发出后的耗时。
+
+    等待并发名额、等待限流额度和限流退避期间不计时，被正确限流的单元不会因此被判为超时并重复提交。
+    看门狗判定超时后设置 cancelled，被放弃的线程在下一次发请求前检查该标志并退出。
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.used = 0.0  # 已结束的请求累计耗时
+        self.active = 0  # 正在进行中的请求数（对冲时可能有两个）
+        self.since = None  # 当前计时区间的开始时间
+        self.cancelled = False
+        self.finished = False
+        self.condition = threading.Condition()
+
+    def resume(self):
+        """请求发出，开始计时。"""
+        with self.condition:
+            if self.active == 0:
+                self.since = time.monotonic()
+                self.condition.notify_all()
+            self.active += 1
+
+    def pause(self):
+        """请求结束，停止计时。"""
+        with self.condition:
+            self.active -= 1
+            if self.active == 0:
+                self.used += time.monotonic() - self.since
+                self.since = None
+
+    def finish(self):
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+
+    def expire(self):
+        """放弃本次尝试，此后的请求不再发出。"""
+        with self.condition:
+            self.cancelled = True
+            self.condition.notify_all()
+
+    def remaining(self):
+        """剩余的请求耗时（秒），timeout 为None时返回None。
+
+        时钟暂停期间剩余时间不变，因此至少要再过这么久截止时间才可能耗尽，异步引擎据此安排下一次检查。
+        """
+        with self.condition:
+            return self._remaining()
+
+    def _remaining(self):
+        if self.timeout is None:
+            return None
+        used = self.used + (time.monotonic() - self.since if self.since is not None else 0.0)
+        return self.timeout - used
+
+    def wait(self):
+        """等待任务结束，按时完成返回True；请求累计耗时超过 timeout 时设置 cancelled 并返回False。"""
+        with self.condition:
+            while not self.finished:
+                if self.since is None or self.timeout is None:
+                    # 没有请求在进行中，时钟暂停
+                    self.condition.wait()
+                    continue
+                remaining = self._remaining()
+                if remaining <= 0:
+                    self.cancelled = True
+                    return False
+                self.condition.wait(remaining)
+            return True
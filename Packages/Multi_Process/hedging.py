@@ -0,0 +1,62 @@
+import threading
+from collections import deque
+
+class HedgePolicy:
+    """对冲请求策略：请求耗时超过历史延迟的某个分位数时，再发一个重复请求，取先通过校验的结果。
+
+    额外请求数不超过主请求数的 max_extra_ratio，并统计对冲节省的尾延迟。
+    """
+
+    def __init__(self, percentile=95, max_extra_ratio=0.1, min_samples=20, window=500, hedge_llm=None):
+        self.percentile = percentile  # 触发对冲的延迟分位数
+        self.max_extra_ratio = max_extra_ratio  # 额外请求数占主请求数的比例上限
+        self.min_samples = min_samples  # 样本不足时不对冲
+        self.hedge_llm = hedge_llm  # 对冲请求使用的服务，None表示使用主服务
+        self.latencies = deque(maxlen=window)
+        self.lock = threading.Lock()
+        self.primary_requests = 0
+        self.hedged_requests = 0
+        self.hedge_wins = 0
+        self.saved_time = 0.0  # 对冲请求胜出时，比主请求提前完成的总秒数
+
+    def delay(self):
+        """返回触发对冲前等待的秒数，样本不足时返回None。"""
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return None
+            ordered = sorted(self.latencies)
+            position = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+            return ordered[position]
+
+    def record_latency(self, latency):
+        with self.lock:
+            self.latencies.append(latency)
+
+    def record_primary(self):
+        with self.lock:
+            self.primary_requests += 1
+
+    def try_hedge(self):
+        """额外请求预算允许时登记一次对冲并返回True。"""
+        with self.lock:
+            if self.hedged_requests + 1 > self.primary_requests * self.max_extra_ratio:
+                return False
+            self.hedged_requests += 1
+            return True
+
+    def record_win(self):
+        with self.lock:
+            self.hedge_wins += 1
+
+    def record_saved(self, seconds):
+        with self.lock:
+            self.saved_time += seconds
+
+    def stats(self):
+        with self.lock:
+            return {
+                'primary_requests': self.primary_requests,
+                'hedged_requests': self.hedged_requests,
+                'hedge_wins': self.hedge_wins,
+                'saved_time': self.saved_time
+            }
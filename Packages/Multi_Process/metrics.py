@@ -0,0 +1,207 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 延迟直方图的默认桶上界（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# 流水线各组件记录的指标及说明
+HELP = {
+    'annotator_llm_request_seconds': '每个服务单次请求的耗时',
+    'annotator_llm_requests_total': '每个服务的请求数，status 为 ok、error 或 throttled',
+    'annotator_llm_tokens_total': '每个服务的输入（in）和输出（out）token数',
+    'annotator_llm_in_flight': '每个服务正在进行中的请求数',
+    'annotator_unit_seconds': '单元从开始处理到得到结果的耗时（不含缓存命中）',
+    'annotator_units_total': '处理结束的单元数，status 为 ok、failed、cached、skipped 或 timed_out',
+    'annotator_retries_total': '单元重试次数，reason 为 throttled、error 或 empty',
+    'annotator_corrections_total': '发出的纠错请求数',
+    'annotator_validations_total': '回答校验次数，result 为 pass 或 fail',
+    'annotator_timeouts_total': '超过截止时间的任务数',
+    'annotator_queue_depth': '等待处理的单元数',
+    'annotator_in_flight_units': '正在处理中的单元数',
+    'annotator_concurrency_limit': '自适应并发控制器当前允许的在途请求数',
+    'annotator_analyse_file_seconds': '分析单个源文件的耗时',
+    'annotator_analysed_files_total': '分析的源文件数',
+    'annotator_analysed_units_total': '分析得到的单元数',
+    'annotator_write_file_seconds': '写出单个文件的耗时',
+    'annotator_written_files_total': '写出的文件数',
+    'annotator_written_bytes_total': '写出的字节数',
+}
+
+
+class MetricsRegistry:
+    """线程安全的指标注册表，支持计数器、仪表和直方图，可导出为 Prometheus 文本或 JSON 快照。
+
+    指标名与标签都在第一次记录时创建，同名指标的类型必须一致。
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.types = {}  # 指标名 -> 'counter' / 'gauge' / 'histogram'
+        self.series = {}  # 指标名 -> {排序后的标签元组: 数值或直方图}
+
+    def _series(self, name, kind, labels):
+        if self.types.setdefault(name, kind) != kind:
+            raise ValueError(f'指标 {name} 已注册为 {self.types[name]}，不能作为 {kind} 使用')
+        return self.series.setdefault(name, {}), tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """计数器加 value。"""
+        with self.lock:
+            series, key = self._series(name, 'counter', labels)
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """把仪表设置为 value。"""
+        with self.lock:
+            series, key = self._series(name, 'gauge', labels)
+            series[key] = value
+
+    def add(self, name, value, **labels):
+        """仪表加 value，可以为负数。"""
+        with self.lock:
+            series, key = self._series(name, 'gauge', labels)
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """在直方图中记录一次观测值。"""
+        with self.lock:
+            series, key = self._series(name, 'histogram', labels)
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram['counts'][i] += 1
+                    break
+            else:
+                histogram['counts'][-1] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """记录 with 代码块的耗时。"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+    def get(self, name, **labels):
+        """返回计数器或仪表的当前值，直方图返回 (观测次数, 总和)。"""
+        with self.lock:
+            value = self.series.get(name, {}).get(tuple(sorted((key, str(label)) for key, label in labels.items())))
+        if isinstance(value, dict):
+            return value['count'], value['sum']
+        return value
+
+    def _quantile(self, histogram, q):
+        # 与 Prometheus 的 histogram_quantile 相同：在目标所在的桶内线性插值
+        if not histogram['count']:
+            return None
+        target = q * histogram['count']
+        cumulative = 0
+        for i, count in enumerate(histogram['counts']):
+            if cumulative + count >= target and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (target - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def snapshot(self):
+        """返回所有指标的JSON快照，计数器附带按运行时长计算的每秒速率，直方图附带估算的分位数。"""
+        with self.lock:
+            uptime = time.time() - self.start_time
+            metrics = {}
+            for name in sorted(self.series):
+                entries = []
+                for key, value in sorted(self.series[name].items()):
+                    entry = {'labels': dict(key)}
+                    if self.types[name] == 'histogram':
+                        cumulative = 0
+                        buckets = {}
+                        for bound, count in zip(self.buckets + ('+Inf',), value['counts']):
+                            cumulative += count
+                            buckets[str(bound)] = cumulative
+                        entry.update(count=value['count'], sum=value['sum'], buckets=buckets,
+                                     p50=self._quantile(value, 0.5), p95=self._quantile(value, 0.95), p99=self._quantile(value, 0.99))
+                    else:
+                        entry['value'] = value
+                        if self.types[name] == 'counter':
+                            entry['rate'] = value / uptime if uptime > 0 else 0.0
+                    entries.append(entry)
+                metrics[name] = {'type': self.types[name], 'help': HELP.get(name, ''), 'series': entries}
+        return {'timestamp': time.time(), 'uptime': uptime, 'metrics': metrics}
+
+    @staticmethod
+    def _format_labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+    def to_prometheus(self):
+        """导出为 Prometheus 文本格式。"""
+        lines = []
+        with self.lock:
+            for name in sorted(self.series):
+                kind = self.types[name]
+                if name in HELP:
+                    lines.append(f'# HELP {name} {HELP[name]}')
+                lines.append(f'# TYPE {name} {kind}')
+                for key, value in sorted(self.series[name].items()):
+                    if kind != 'histogram':
+                        lines.append(f'{name}{self._format_labels(key)} {value}')
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + ('+Inf',), value['counts']):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{self._format_labels(key, [("le", bound)])} {cumulative}')
+                    lines.append(f'{name}_sum{self._format_labels(key)} {value["sum"]}')
+                    lines.append(f'{name}_count{self._format_labels(key)} {value["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """写出到文件：扩展名为 .prom 或 .txt 时为 Prometheus 文本，否则为JSON快照。"""
+        text = self.to_prometheus() if path.endswith(('.prom', '.txt')) else json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        # 先写临时文件再替换，抓取方不会读到写了一半的文件
+        os.replace(temp_path, path)
+
+    def serve(self, port, host='127.0.0.1'):
+        """在后台线程中提供HTTP接口：/metrics 为 Prometheus 文本，/metrics.json 为JSON快照。"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/metrics.json'):
+                    body, content_type = json.dumps(registry.snapshot(), ensure_ascii=False).encode('utf-8'), 'application/json'
+                elif self.path.startswith('/metrics'):
+                    body, content_type = registry.to_prometheus().encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"指标接口: http://{host}:{server.server_address[1]}/metrics")
+        return server
@@ -1,39 +1,289 @@
+import contextvars
+import inspect
 import threading
 import time
 import random
-from queue import Queue
+from queue import Queue, Empty
 from tqdm import tqdm
+from .scheduling import order_tasks
+from .tracing import NULL_SPAN
+from .deadline import Deadline, Cancelled, current_deadline
+from ..LLM_API.errors import ERROR_PREFIXES, THROTTLE_MARKERS, is_throttled
+
+# 当前线程（或协程）正在处理的单元索引，用于把请求花费归到对应单元
+current_unit = contextvars.ContextVar('current_unit', default=None)
 
 class MultiProcessor:
+    # 错误前缀和限流判断与 CompositeService 共用，见 LLM_API/errors.py
+    ERROR_PREFIXES = ERROR_PREFIXES
+    THROTTLE_MARKERS = THROTTLE_MARKERS
+    is_throttled = staticmethod(is_throttled)
 
-    def __init__(self, llm, parse_method, data_template, prompt_template, correction_template, validator):
+    def __init__(self, llm, parse_method, data_template, prompt_template, correction_template, validator, cache=None, timeout=100, max_reschedules=1, concurrency=None, cost_tracker=None, schedule='fifo', hedge=None, stream_detector=None, stream_retries=1, metrics=None, tracer=None):
         self.llm = llm
         self.parse_method = parse_method
         self.data_template = data_template
         self.prompt_template = prompt_template
         self.correction_template = correction_template
         self.validator = validator
+        self.cache = cache  # 可选的ResultCache，命中时跳过LLM请求
+        self.timeout = timeout  # 单个任务的截止时间（秒），只计算请求实际发出后的耗时，同时作为请求超时传给LLM服务
+        self.max_reschedules = max_reschedules  # 超时任务最多重新排队的次数
+        self.timed_out = []  # 最近一次运行中发生超时的单元索引
+        self.skipped = []  # 最近一次运行中因预算不足而跳过的单元索引
+        self.concurrency = concurrency  # 可选的AIMDController，根据限流情况自适应调整在途请求数
+        self.cost_tracker = cost_tracker  # 可选的CostTracker，统计花费并在预算不足时停止接收新单元
+        self.hedge = hedge  # 可选的HedgePolicy，为拖尾请求发出对冲请求
+        self.schedule = schedule  # 任务队列的调度策略：'fifo'、'lpt'（最长优先）、'spt'（最短优先）或自定义排序键
+        self.stream_detector = stream_detector  # 可选的检测器工厂（如PadDetector），服务支持ask_stream时边接收边校验
+        self.stream_retries = stream_retries  # 流式回答被提前中止后立即重试的次数
+        self.stream_aborts = []  # 最近一次运行中流式回答被提前中止的单元索引
+        self.on_chunk = None  # 流式请求确认一段内容时的回调 on_chunk(单元索引, 内容)，内容可能作废，见 multitask_perform
+        self.metrics = metrics  # 可选的MetricsRegistry，记录单元耗时、重试、纠错、校验结果和队列深度
+        self.tracer = tracer  # 可选的Tracer，为每个单元的排队、请求、纠错、退避和解析记录 span
+        ask = getattr(llm, 'ask', None)
+        self.ask_accepts_timeout = ask is not None and 'timeout' in inspect.signature(ask).parameters
+
+    def count(self, name, value=1, **labels):
+        if self.metrics is not None:
+            self.metrics.inc(name, value, **labels)
+
+    def finish_unit(self, start_time, status):
+        """记录单元的处理结果和耗时。"""
+        if self.metrics is not None:
+            self.metrics.add('annotator_in_flight_units', -1)
+            self.metrics.observe('annotator_unit_seconds', time.time() - start_time)
+            self.metrics.inc('annotator_units_total', status=status)
+
+    def trace_unit(self, index):
+        return self.tracer.trace(index) if self.tracer is not None else NULL_SPAN
+
+    def span(self, name, **attrs):
+        return self.tracer.span(name, **attrs) if self.tracer is not None else NULL_SPAN
+
+    def trace_tokens(self, span, prompt, answer, llm=None, use_last_usage=True, error=False):
+        """在请求的 span 上记录token数和是否出错，未采样时直接返回。"""
+        if span is NULL_SPAN:
+            return
+        last_usage = getattr(llm or self.llm, 'last_usage', None) if use_last_usage else None
+        usage = last_usage() if callable(last_usage) else None
+        if usage is None and self.tracer.token_counter is not None and not error:
+            usage = (self.tracer.token_counter(prompt), self.tracer.token_counter(answer or ''))
+        if usage:
+            span.set(prompt_tokens=usage[0], completion_tokens=usage[1])
+        if error:
+            span.set(error=str(answer)[:200])
+
+    @classmethod
+    def check_answer(cls, answer):
+        # 部分服务把限流错误作为字符串返回而不是抛出异常，这里统一转换为异常
+        if isinstance(answer, str) and answer.startswith(cls.ERROR_PREFIXES) and cls.is_throttled(answer):
+            raise RuntimeError(answer)
+        return answer
+
+    def ask_llm(self, prompt, llm=None):
+        llm = llm or self.llm
+        deadline = current_deadline.get()
+        admission = None
+        if self.concurrency is not None:
+            # 等待并发名额期间截止时间不计时
+            self.concurrency.acquire()
+        try:
+            admission = self.admit(prompt, llm) if deadline is not None else None
+            if deadline is not None and deadline.cancelled:
+                # 等待期间任务已被看门狗放弃，不再发出请求，避免同一单元被重复请求和计费
+                raise Cancelled()
+        except BaseException:
+            # 请求没有发出，归还并发名额和限流额度
+            self.release_unused(admission)
+            raise
+        if deadline is not None:
+            deadline.resume()
+        start_time = time.time()
+        error = throttled = False
+        try:
+            with self.span('llm.ask', provider=getattr(llm, 'version', type(llm).__name__)) as span:
+                # 服务支持时把截止时间传给底层HTTP客户端，让超时的请求真正结束
+                accepts_timeout = self.ask_accepts_timeout if llm is self.llm else 'timeout' in inspect.signature(llm.ask).parameters
+                if self.stream_detector is not None and hasattr(llm, 'ask_stream'):
+                    answer = self.stream_llm(prompt, llm)
+                elif self.timeout is not None and accepts_timeout:
+                    answer = llm.ask(prompt, timeout=self.timeout)
+                else:
+                    answer = llm.ask(prompt)
+                error = isinstance(answer, str) and answer.startswith(self.ERROR_PREFIXES)
+                self.record_cost(prompt, answer, llm=llm)
+                self.trace_tokens(span, prompt, answer, llm, error=error)
+                return self.check_answer(answer)
+        except Exception as e:
+            error = True
+            throttled = self.is_throttled(e)
+            raise
+        finally:
+            if deadline is not None:
+                deadline.pause()
+            if self.concurrency is not None:
+                self.release_concurrency(time.time() - start_time, error, throttled)
+
+    def release_concurrency(self, latency, error, throttled):
+        """归还请求占用的并发名额，并导出调整后的并发上限。"""
+        self.concurrency.release(latency, error=error, throttled=throttled)
+        if self.metrics is not None:
+            self.metrics.set('annotator_concurrency_limit', self.concurrency.current_limit())
+
+    def release_unused(self, admission):
+        """请求没有发出时归还限流额度和并发名额。"""
+        if admission is not None:
+            admission.discard()
+        if self.concurrency is not None:
+            self.concurrency.release_unused()
+
+    @staticmethod
+    def admission_of(llm):
+        """返回负责预先取得限流额度的对象：服务自身（如 CompositeService）或其限流器，不支持时返回None。"""
+        return llm if hasattr(llm, 'admit') else getattr(llm, 'rate_limiter', None)
+
+    @classmethod
+    def admit(cls, prompt, llm):
+        """在截止时间开始计时之前取得限流额度，返回持有额度的对象，服务不支持时返回None。"""
+        admission = cls.admission_of(llm)
+        if admission is None:
+            return None
+        admission.admit(prompt)
+        return admission
+
+    def stream_llm(self, prompt, llm):
+        """流式请求并增量校验，回答开头不符合格式时中止并立即重试，最后一次不再中止。"""
+        for attempt in range(self.stream_retries + 1):
+            detector = self.stream_detector()
+            if self.timeout is not None and 'timeout' in inspect.signature(llm.ask_stream).parameters:
+                stream = llm.ask_stream(prompt, timeout=self.timeout)
+            else:
+                stream = llm.ask_stream(prompt)
+            try:
+                for chunk in stream:
+                    content = detector.feed(chunk)
+                    if content and self.on_chunk is not None:
+                        self.on_chunk(current_unit.get(), content)
+                    if detector.rejected and attempt < self.stream_retries:
+                        break
+            finally:
+                # 关闭生成器即关闭连接，服务端停止生成
+                stream.close()
+            if not detector.rejected or attempt == self.stream_retries:
+                return detector.text
+            self.stream_aborts.append(current_unit.get())
+            # 中止的请求也已产生花费，按已收到的文本计入
+            self.record_cost(prompt, detector.text, use_last_usage=False, llm=llm)
+            print(f"Stream aborted: start pad missing in the first {len(detector.text)} chars. Retry {attempt + 1}/{self.stream_retries}")
+
+    def record_cost(self, prompt, answer, use_last_usage=True, llm=None):
+        if self.cost_tracker is None:
+            return
+        # 服务提供本次请求的真实用量时优先使用，否则按文本估算
+        llm = llm or self.llm
+        last_usage = getattr(llm, 'last_usage', None) if use_last_usage else None
+        usage = last_usage() if callable(last_usage) else None
+        # 组合服务按实际回答的后端计价
+        served_version = getattr(llm, 'served_version', None)
+        model = served_version() if callable(served_version) else getattr(llm, 'version', None)
+        self.cost_tracker.record(current_unit.get(), prompt, answer, usage, model=model)
+
+    def hedged_ask(self, prompt):
+        """请求耗时超过延迟分位数时发出对冲请求，返回先通过校验的回答，另一个请求的结果被忽略。"""
+        hedge = self.hedge
+        delay = hedge.delay()
+        hedge.record_primary()
+        outcomes = Queue()
+        race = {'hedge_won_at': None}
+
+        def branch(name, llm):
+            start_time = time.time()
+            try:
+                answer, error = self.ask_llm(prompt, llm), None
+            except Exception as e:
+                answer, error = None, e
+            if name == 'primary':
+                hedge.record_latency(time.time() - start_time)
+                # 对冲请求胜出后主请求才完成，二者的时间差即节省的尾延迟
+                if race['hedge_won_at'] is not None:
+                    hedge.record_saved(time.time() - race['hedge_won_at'])
+            outcomes.put((name, answer, error))
+
+        def start(name, llm):
+            # 新线程不会继承 contextvars，复制上下文以保留当前单元索引
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(branch, name, llm), daemon=True).start()
+
+        start('primary', self.llm)
+        pending = 1
+        can_hedge = delay is not None
+        fallback = None
+        while pending:
+            try:
+                name, answer, error = outcomes.get(timeout=delay if can_hedge else None)
+            except Empty:
+                # 主请求超过延迟分位数仍未返回，预算允许时发出对冲请求
+                can_hedge = False
+                if hedge.try_hedge():
+                    start('hedge', hedge.hedge_llm or self.llm)
+                    pending += 1
+                continue
+            pending -= 1
+            if error is None and self.validator(answer):
+                if name == 'hedge':
+                    race['hedge_won_at'] = time.time()
+                    hedge.record_win()
+                return answer
+            if fallback is None or fallback[1] is not None:
+                fallback = (answer, error)
+
+        answer, error = fallback
+        if error is not None:
+            raise error
+        return answer
+
+    def cache_key(self, input_data):
+        # 缓存键覆盖单元源码、提示词模板、纠错模板以及模型名
+        model_id = getattr(self.llm, 'version', type(self.llm).__name__)
+        return self.cache.make_key(*input_data, self.prompt_template, self.correction_template, self.data_template, model_id)
 
     def generate_prompt(self, **kwargs):
         kwargs['data_template'] = self.data_template
         return self.prompt_template.format(**kwargs)
 
+    def unit_prompt(self, input_tuple):
+        """生成单元的提示词，供 CostTracker 在请求前估算花费。"""
+        input_data = input_tuple[:-1]
+        return self.generate_prompt(**{f'input_{i+1}': input_data[i] for i in range(len(input_data))})
+
     def generate_correction_prompt(self, answer):
         return self.correction_template.format(answer=answer, data_template=self.data_template)
 
     def task_perform(self, **kwargs):
         try:
             prompt = self.generate_prompt(**kwargs)
-            answer = self.llm.ask(prompt)
-            structured_data = self.parse_method(answer)
-            return structured_data
+            return self.hedged_ask(prompt) if self.hedge is not None else self.ask_llm(prompt)
+        except Cancelled:
+            raise
         except Exception as e:
+            # 限流错误交给 process_tuple 退避重试
+            if self.is_throttled(e):
+                raise
             print(f"Error in task_perform: {str(e)}")
             return None
 
+    def validate(self, answer):
+        with self.span('validate') as span:
+            valid = self.validator(answer)
+            span.set(valid=valid)
+        self.count('annotator_validations_total', result='pass' if valid else 'fail')
+        return valid
+
     def correct_data(self, answer):
-        correction_prompt = self.generate_correction_prompt(answer)
-        correction = self.llm.ask(correction_prompt)
+        with self.span('correct_data'):
+            correction_prompt = self.generate_correction_prompt(answer)
+            correction = self.ask_llm(correction_prompt)
         return correction
 
     def process_tuple(self, input_tuple):
@@ -41,62 +291,230 @@ class MultiProcessor:
         index = input_tuple[-1]
         attempts = 0
         base_wait_time = 1  # 初始等待时间
+        current_unit.set(index)
 
-        while attempts < 3:
-            try:
-                input_dict = {f'input_{i+1}': input_data[i] for i in range(len(input_data))}
-                structured_data = self.task_perform(**input_dict)
-                if self.validator(structured_data):
-                    return (structured_data, index)
-                corrected_answer = self.correct_data(structured_data)
-                if corrected_answer and self.validator(corrected_answer):
-                    return (corrected_answer, index)
-                break
-            except Exception as e:
-                if 'Throttling.RateQuota' in str(e):
-                    wait_time = base_wait_time * (2 ** attempts) + random.uniform(0, 1)
-                    print(f"Rate limit exceeded. Retrying in {wait_time:.2f} seconds. Attempt {attempts + 1}/3")
-                    time.sleep(wait_time)
-                    attempts += 1
-                else:
-                    print(f"An error occurred: {str(e)}. Attempt {attempts + 1}/3")
-                    attempts += 1
+        with self.trace_unit(index) as unit_span:
+            key = None
+            if self.cache is not None:
+                key = self.cache_key(input_data)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    self.count('annotator_units_total', status='cached')
+                    unit_span.set(status='cached')
+                    return (cached, index)
 
-        return (None, index)
+            start_time = time.time()
+            if self.metrics is not None:
+                self.metrics.add('annotator_in_flight_units', 1)
+            while attempts < 3:
+                with self.span('attempt', attempt=attempts + 1):
+                    try:
+                        input_dict = {f'input_{i+1}': input_data[i] for i in range(len(input_data))}
+                        answer = self.task_perform(**input_dict)
+                        if answer is None:
+                            self.count('annotator_retries_total', reason='empty')
+                            attempts += 1
+                            continue
+                        # 先校验原始回答，通过后再解析；纠错后的回答同样先校验再解析
+                        if not self.validate(answer):
+                            self.count('annotator_corrections_total')
+                            answer = self.correct_data(answer)
+                            if not answer or not self.validate(answer):
+                                break
+                        with self.span('parse'):
+                            structured_data = self.parse_method(answer)
+                        if key is not None:
+                            self.cache.set(key, structured_data)
+                        self.finish_unit(start_time, 'ok')
+                        unit_span.set(status='ok', attempts=attempts + 1)
+                        return (structured_data, index)
+                    except Cancelled:
+                        # 看门狗已放弃本次尝试，结果由重新排队的任务或超时处理负责
+                        self.finish_unit(start_time, 'timed_out')
+                        unit_span.set(status='timed_out', attempts=attempts + 1)
+                        return (None, index)
+                    except Exception as e:
+                        if self.is_throttled(e):
+                            self.count('annotator_retries_total', reason='throttled')
+                            wait_time = base_wait_time * (2 ** attempts) + random.uniform(0, 1)
+                            print(f"Rate limit exceeded. Retrying in {wait_time:.2f} seconds. Attempt {attempts + 1}/3")
+                            with self.span('backoff', wait=wait_time):
+                                time.sleep(wait_time)
+                            attempts += 1
+                        else:
+                            self.count('annotator_retries_total', reason='error')
+                            print(f"An error occurred: {str(e)}. Attempt {attempts + 1}/3")
+                            attempts += 1
+
+            self.finish_unit(start_time, 'failed')
+            unit_span.set(status='failed', attempts=attempts)
+            return (None, index)
+
+    def run_attempt(self, result_queue, input_tuple, deadline):
+        """在独立线程中处理一次任务尝试，截止时间通过上下文传给 ask_llm。"""
+        current_deadline.set(deadline)
+        try:
+            result_queue.put(self.process_tuple(input_tuple))
+        finally:
+            deadline.finish()
 
-    def multitask_perform(self, tuple_list, num_threads):
-        results = [None] * len(tuple_list)
+    def multitask_perform(self, tuple_list, num_threads, journal=None, on_result=None, on_chunk=None, keep_results=True):
+        """并发处理任务列表，返回与 tuple_list 顺序一致的结果。
+
+        tuple_list 也可以是迭代器（例如仓库仍在分析中时逐个产出的任务）：任务边产生边入队，
+        按到达顺序处理而不做调度排序，返回的结果按到达顺序排列。
+        keep_results=False 时结果只交给 on_result 而不保留，返回没有结果的单元索引（失败、超时或跳过）。
+        on_chunk 收到的是 PadDetector 暂时确认的内容，不保证最终有效：同一单元可能因中止重试、纠错或超时重新排队
+        而再次收到内容，或最终没有结果。调用方应在 on_result 得到该单元的有效结果前缓存这些内容，
+        结果为 None 或单元被重新请求时丢弃已收到的内容；需要落盘的输出应以 on_result 为准。
+        """
+        streaming = not isinstance(tuple_list, (list, tuple))
+        results = [] if streaming or not keep_results else [None] * len(tuple_list)
+        failed = []
+        reschedules = [] if streaming else [0] * len(tuple_list)
+        self.timed_out = []
+        self.skipped = []
+        self.stream_aborts = []
+        self.on_chunk = on_chunk
         queue = Queue()
+        fed = threading.Event()  # 所有任务都已入队
+        feed_errors = []
+
+        enqueued_at = [] if streaming else [time.time()] * len(tuple_list)  # 入队时间，用于记录排队的 span
+        if not streaming:
+            for idx, input_tuple in order_tasks(tuple_list, self.schedule):
+                queue.put((input_tuple, idx))
+            fed.set()
 
-        for idx, input_tuple in enumerate(tuple_list):
-            queue.put((input_tuple, idx))
+        def feeder(pbar):
+            try:
+                for input_tuple in tuple_list:
+                    # 只有入队线程追加列表，索引即到达顺序
+                    if keep_results:
+                        results.append(None)
+                    reschedules.append(0)
+                    enqueued_at.append(time.time())
+                    pbar.total += 1
+                    pbar.refresh()
+                    queue.put((input_tuple, len(reschedules) - 1))
+            except BaseException as e:
+                feed_errors.append(e)
+            finally:
+                fed.set()
 
         def worker(pbar):
-            while not queue.empty():
-                input_tuple, idx = queue.get()
+            while True:
+                if fed.is_set():
+                    try:
+                        input_tuple, idx = queue.get_nowait()
+                    except Empty:
+                        break
+                else:
+                    # 任务仍在陆续产生，队列暂时为空时等待而不退出
+                    try:
+                        input_tuple, idx = queue.get(timeout=0.1)
+                    except Empty:
+                        continue
+                if self.tracer is not None:
+                    self.tracer.record('queue', input_tuple[-1], enqueued_at[idx], time.time(), reschedules=reschedules[idx])
+                if self.metrics is not None:
+                    self.metrics.set('annotator_queue_depth', queue.qsize())
+                if self.cost_tracker is not None and reschedules[idx] == 0 and not self.cost_tracker.admit(self.unit_prompt(input_tuple)):
+                    # 预算不足，不再请求该单元；下游按原始源码写出，保证部分结果完整落盘
+                    self.skipped.append(input_tuple[-1])
+                    self.count('annotator_units_total', status='skipped')
+                    if not keep_results:
+                        failed.append(input_tuple[-1])
+                    if on_result is not None:
+                        on_result(input_tuple, None)
+                    queue.task_done()
+                    pbar.update(1)
+                    continue
                 result = None
-                thread = threading.Thread(target=lambda q, arg1: q.put(self.process_tuple(arg1)), args=(queue, input_tuple))
+                # 结果使用独立的队列返回，避免与任务队列混在一起
+                result_queue = Queue()
+                deadline = Deadline(self.timeout)
+                thread = threading.Thread(target=self.run_attempt, args=(result_queue, input_tuple, deadline), daemon=True)
                 thread.start()
-                thread.join(timeout=100)  # 设置单线程100s超时
-                if thread.is_alive():
-                    print(f"Thread processing {input_tuple} timed out.")
-                    thread.join()
-                else:
-                    result = queue.get()
-                results[idx] = result
+                # 单个任务的截止时间，只计算请求实际发出后的耗时
+                if not deadline.wait():
+                    # 放弃超时的请求线程，不再等待它结束，工作线程立即处理下一个任务；
+                    # 被放弃的线程在下一次发请求前看到 cancelled 标志后退出
+                    self.timed_out.append(input_tuple[-1])
+                    self.count('annotator_timeouts_total')
+                    if reschedules[idx] < self.max_reschedules:
+                        reschedules[idx] += 1
+                        enqueued_at[idx] = time.time()
+                        print(f"Task {input_tuple[-1]} timed out, rescheduled ({reschedules[idx]}/{self.max_reschedules}).")
+                        queue.put((input_tuple, idx))
+                        queue.task_done()
+                        continue
+                    print(f"Task {input_tuple[-1]} timed out.")
+                elif not result_queue.empty():
+                    result = result_queue.get()
+                if keep_results:
+                    results[idx] = result
+                elif not (result and result[0] is not None):
+                    failed.append(input_tuple[-1])
+                if self.cost_tracker is not None:
+                    self.cost_tracker.complete(self.unit_prompt(input_tuple))
+                    pbar.set_postfix(cost=f"{self.cost_tracker.spent:.4f}", projected=f"{self.cost_tracker.projected_cost():.4f}")
+                # 成功的结果立即写入检查点日志，失败的单元留给resume重试
+                if journal is not None and result and result[0] is not None:
+                    journal.append(result[0], result[1], key=journal.task_key(input_tuple))
+                # 每完成一个任务就通知下游（例如流式写出器）
+                if on_result is not None:
+                    on_result(input_tuple, result)
                 queue.task_done()
                 pbar.update(1)
 
-        with tqdm(total=len(tuple_list)) as pbar:
+        with tqdm(total=0 if streaming else len(tuple_list)) as pbar:
             threads = []
-            for _ in range(min(num_threads, len(tuple_list))):
+            for _ in range(num_threads if streaming else min(num_threads, len(tuple_list))):
                 thread = threading.Thread(target=worker, args=(pbar,))
                 threads.append(thread)
                 thread.start()
 
+            if streaming:
+                # 在当前线程中逐个入队，全部入队后才等待队列清空，否则队列在第一个任务到达前就会被视为已清空
+                feeder(pbar)
+
             queue.join()
 
             for thread in threads:
                 thread.join()
 
-        return results
+        if feed_errors:
+            raise feed_errors[0]
+        return results if keep_results else failed
+
+    def resume(self, tuple_list, num_threads, journal, on_result=None, on_chunk=None, keep_results=True):
+        """从检查点日志恢复，只处理日志中尚未完成的任务；全部完成后日志改名为 .done。
+
+        keep_results=False 时与 multitask_perform 相同，只返回没有结果的单元索引。
+        """
+        completed = journal.load(tuple_list)
+        pending_list = [input_tuple for input_tuple in tuple_list if input_tuple[-1] not in completed]
+        print(f"从检查点恢复: 已完成 {len(tuple_list) - len(pending_list)} 个任务，剩余 {len(pending_list)} 个任务")
+
+        if on_result is not None:
+            for input_tuple in tuple_list:
+                if input_tuple[-1] in completed:
+                    on_result(input_tuple, (completed[input_tuple[-1]], input_tuple[-1]))
+
+        try:
+            pending_results = self.multitask_perform(pending_list, num_threads, journal=journal, on_result=on_result, on_chunk=on_chunk, keep_results=keep_results)
+        finally:
+            journal.close()
+        if not keep_results:
+            if not pending_results:
+                journal.finish()
+            return pending_results
+        if all(result and result[0] is not None for result in pending_results):
+            # 没有失败、超时或跳过的单元，日志不再需要，避免之后复用同一路径时读到过期结果
+            journal.finish()
+        pending_results = iter(pending_results)
+
+        # 按原始顺序合并日志中的结果和本次的结果
+        return [(completed[input_tuple[-1]], input_tuple[-1]) if input_tuple[-1] in completed else next(pending_results)
+                for input_tuple in tuple_list]
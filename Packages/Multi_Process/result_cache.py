@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+class ResultCache:
+    """基于内容寻址的磁盘缓存，用于跳过已经标注过的代码单元。"""
+
+    def __init__(self, cache_dir, max_size=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_size = max_size  # 缓存目录允许占用的最大字节数
+        self.hits = 0  # 命中次数
+        self.misses = 0  # 未命中次数
+        self.evictions = 0  # 淘汰次数
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> 字节数，按最近访问从旧到新排列
+        self.total_size = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_key(*parts):
+        """根据单元源码、模板和模型名等内容生成缓存键。"""
+        payload = json.dumps([str(part) for part in parts], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def _load_index(self):
+        # 启动时扫描缓存目录，按修改时间（命中时会更新）从旧到新重建内存中的索引
+        files = []
+        for file_name in os.listdir(self.cache_dir):
+            if not file_name.endswith('.json'):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, file_name))
+            files.append((stat.st_mtime, file_name[:-len('.json')], stat.st_size))
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total_size += size
+
+    def get(self, key):
+        """读取缓存，未命中时返回None。"""
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            try:
+                with open(self._entry_path(key), 'r', encoding='utf-8') as file:
+                    value = json.load(file)['value']
+            except (OSError, ValueError, KeyError):
+                # 缓存文件损坏或被外部删除时视为未命中
+                self._remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            # 更新修改时间，重新加载索引时保留最近访问的顺序
+            try:
+                os.utime(self._entry_path(key))
+            except OSError:
+                pass
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """写入缓存，并在超出容量时淘汰最久未使用的条目。"""
+        data = json.dumps({'value': value}, ensure_ascii=False).encode('utf-8')
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            temp_path = self._entry_path(key) + '.tmp'
+            with open(temp_path, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, self._entry_path(key))
+            self.entries[key] = len(data)
+            self.total_size += len(data)
+            self._evict()
+
+    def _remove(self, key):
+        self.total_size -= self.entries.pop(key)
+        self._delete_file(key)
+
+    def _delete_file(self, key):
+        try:
+            os.remove(self._entry_path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        # 从最久未访问的一端淘汰，每淘汰一个条目为常数时间
+        while self.total_size > self.max_size and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total_size -= size
+            self._delete_file(key)
+            self.evictions += 1
+
+    def stats(self):
+        """返回缓存的命中统计。"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'size': self.total_size
+            }
@@ -0,0 +1,26 @@
+def unit_size(input_tuple):
+    """任务大小的默认估计：输入数据的总字符数。"""
+    return sum(len(str(item)) for item in input_tuple[:-1])
+
+
+# 调度策略：None 表示保持原顺序，其余为排序键和是否降序
+SCHEDULES = {
+    'fifo': None,
+    'lpt': (unit_size, True),  # 最长任务优先，缩短整体完成时间
+    'spt': (unit_size, False),  # 最短任务优先，尽快产出部分结果
+}
+
+
+def order_tasks(tuple_list, schedule='fifo'):
+    """按调度策略返回 (idx, input_tuple) 的处理顺序。
+
+    schedule 可以是 SCHEDULES 中的名称，也可以是 (排序键函数, 是否降序) 二元组，
+    例如用预估输出token数作为排序键。
+    """
+    indexed = list(enumerate(tuple_list))
+    policy = SCHEDULES[schedule] if isinstance(schedule, str) else schedule
+    if policy is None:
+        return indexed
+    key, reverse = policy
+    # sorted 是稳定排序，大小相同的任务保持原顺序
+    return sorted(indexed, key=lambda item: key(item[1]), reverse=reverse)
@@ -0,0 +1,150 @@
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+import zlib
+
+# 当前协程或线程所在的 span，新的 span 以它为父节点
+current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    """一个计时区间，退出时写入追踪文件。set 可在区间内随时补充属性（如回答的token数）。"""
+    __slots__ = ('tracer', 'name', 'trace_id', 'span_id', 'parent_id', 'attrs', 'start', 'token')
+
+    def __init__(self, tracer, name, trace_id, parent_id, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = next(tracer.ids)
+        self.parent_id = parent_id
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.token = current_span.set(self)
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        end = time.time()
+        current_span.reset(self.token)
+        if exc_type is not None:
+            self.attrs.setdefault('error', f'{exc_type.__name__}: {exc}')
+        self.tracer.emit(self.name, self.trace_id, self.span_id, self.parent_id, self.start, end, self.attrs)
+        return False
+
+
+class NullSpan:
+    """未采样或未启用追踪时使用的空 span，所有操作都不做任何事。"""
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Tracer:
+    """按单元记录各处理阶段的 span，写入本地 JSONL 文件或 Chrome trace 文件。
+
+    每个单元是一条 trace（trace_id 为单元索引），是否采样按索引的哈希决定，同一单元的所有 span 同进同出。
+    Chrome trace 文件可以直接在 chrome://tracing 或 Perfetto 中打开，每个单元显示为一行。
+    """
+
+    def __init__(self, path, sample_rate=1.0, format=None, token_counter=None):
+        """
+        :param sample_rate: 采样比例，0到1之间
+        :param format: 'jsonl' 或 'chrome'，默认按扩展名判断（.jsonl 为 JSONL，其余为 Chrome trace）
+        :param token_counter: 服务没有返回真实用量时估算token数的函数
+        """
+        self.path = path
+        self.sample_rate = sample_rate
+        self.format = format or ('jsonl' if path.endswith('.jsonl') else 'chrome')
+        self.token_counter = token_counter
+        self.files = {}  # 单元索引 -> 文件路径，写入每个单元的根 span
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.named_units = set()
+        self.events = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, 'w', encoding='utf-8')
+        if self.format == 'chrome':
+            self.file.write('[\n')
+
+    def sampled(self, trace_id):
+        if self.sample_rate >= 1:
+            return True
+        # 按索引哈希采样，多次运行时采到的单元相同，便于对比
+        return zlib.crc32(str(trace_id).encode('utf-8')) / 0xFFFFFFFF < self.sample_rate
+
+    def trace(self, trace_id, name='unit', **attrs):
+        """开始一个单元的根 span，未采样时返回空 span，其中的子 span 也都不会记录。"""
+        if not self.sampled(trace_id):
+            current_span.set(None)
+            return NULL_SPAN
+        if trace_id in self.files:
+            attrs.setdefault('file_path', self.files[trace_id])
+        return Span(self, name, trace_id, None, dict(attrs, unit=trace_id))
+
+    def span(self, name, **attrs):
+        """在当前 span 下开始一个子 span；当前单元未采样时返回空 span。"""
+        parent = current_span.get()
+        if parent is None:
+            return NULL_SPAN
+        return Span(self, name, parent.trace_id, parent.span_id, attrs)
+
+    def record(self, name, trace_id, start, end, **attrs):
+        """补记一个已经结束的区间（例如单元在队列中等待的时间）。"""
+        if self.sampled(trace_id):
+            self.emit(name, trace_id, next(self.ids), None, start, end, attrs)
+
+    def emit(self, name, trace_id, span_id, parent_id, start, end, attrs):
+        if self.format == 'jsonl':
+            line = json.dumps({
+                'trace_id': trace_id, 'span_id': span_id, 'parent_id': parent_id, 'name': name,
+                'start': start, 'duration': end - start, 'thread': threading.current_thread().name, 'attrs': attrs
+            }, ensure_ascii=False, default=str)
+            with self.lock:
+                if not self.file.closed:
+                    self.file.write(line + '\n')
+            return
+
+        event = json.dumps({
+            'name': name, 'ph': 'X', 'pid': 1, 'tid': trace_id, 'ts': start * 1e6, 'dur': (end - start) * 1e6,
+            'args': dict(attrs, span_id=span_id, parent_id=parent_id)
+        }, ensure_ascii=False, default=str)
+        with self.lock:
+            if self.file.closed:
+                return
+            if trace_id not in self.named_units:
+                # 元数据事件：把单元所在的行命名为 "unit 索引 文件路径"
+                self.named_units.add(trace_id)
+                label = f'unit {trace_id} {self.files.get(trace_id, "")}'.strip()
+                self._write_event(json.dumps({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': trace_id, 'args': {'name': label}}, ensure_ascii=False))
+            self._write_event(event)
+
+    def _write_event(self, event):
+        # Chrome trace 为JSON数组，事件之间以逗号分隔
+        if self.events:
+            self.file.write(',\n')
+        self.file.write(event)
+        self.events += 1
+
+    def close(self):
+        with self.lock:
+            if self.file.closed:
+                return
+            if self.format == 'chrome':
+                self.file.write('\n]\n')
+            self.file.close()
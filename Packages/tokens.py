@@ -0,0 +1,14 @@
+import re
+
+# 中日韩字符大致一个字符一个token，其余文本大致四个字符一个token
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]')
+
+def estimate_tokens(text):
+    """在请求发出前粗略估计文本的token数。
+
+    只依赖标准库，代码分析器（包括进程池中的子进程）导入时不会加载各服务的SDK。
+    """
+    if not text:
+        return 0
+    cjk_count = len(CJK_PATTERN.findall(text))
+    return cjk_count + (len(text) - cjk_count + 3) // 4
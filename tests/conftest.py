@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 将项目根目录添加到 sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+
+from Applications.RepoAnnotator.Config.code_annotator import data_template, prompt, correction, validation
+from Packages.LLM_API import FakeService
+from Packages.LLM_Parser import LLMParser
+from Packages.Multi_Process import AsyncMultiProcessor, MultiProcessor
+
+
+class CountingService:
+    """记录同时在途请求数的同步服务。"""
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _enter(self):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    @staticmethod
+    def answer(message):
+        return f'=start_pad=\n# 注释\n{message.strip()[-20:]}\n=end_pad='
+
+    def ask(self, message):
+        self._enter()
+        try:
+            time.sleep(self.delay)
+            return self.answer(message)
+        finally:
+            self._leave()
+
+
+class AsyncCountingService(CountingService):
+    """提供 ask_async 协程的版本。"""
+
+    async def ask_async(self, message):
+        self._enter()
+        try:
+            await asyncio.sleep(self.delay)
+            return self.answer(message)
+        finally:
+            self._leave()
+
+
+def make_processor(processor_class, llm, **options):
+    return processor_class(llm, LLMParser().parse_pads, data_template, prompt, correction, validation, **options)
+
+
+def test_async_results_match_threaded_engine():
+    tasks = [(f'def f{i}(x):\n    return x + {i}', i) for i in range(20)]
+    threaded = make_processor(MultiProcessor, FakeService(prompt_templates=[prompt], correction_templates=[correction])).multitask_perform(tasks, 4)
+    native = make_processor(AsyncMultiProcessor, FakeService(prompt_templates=[prompt], correction_templates=[correction])).multitask_perform(tasks, 4)
+    assert native == threaded
+    assert all(result is not None for result, _ in native)
+
+
+def test_in_flight_requests_bounded_by_num_threads():
+    llm = AsyncCountingService()
+    results = make_processor(AsyncMultiProcessor, llm).multitask_perform([(f'x = {i}', i) for i in range(30)], 5)
+    assert [index for _, index in results] == list(range(30))
+    assert 1 < llm.max_in_flight <= 5
+
+
+def test_sync_service_runs_in_executor():
+    llm = CountingService()
+    results = make_processor(AsyncMultiProcessor, llm).multitask_perform([(f'x = {i}', i) for i in range(12)], 4)
+    assert all(result is not None for result, _ in results)
+    assert 1 < llm.max_in_flight <= 4
+
+
+def test_runs_inside_an_existing_event_loop():
+    async def main():
+        return make_processor(AsyncMultiProcessor, AsyncCountingService(delay=0)).multitask_perform([('x = 1', 0)], 1)
+    assert asyncio.run(main())[0][1] == 0
@@ -0,0 +1,54 @@
+import os
+
+from Applications.RepoAnnotator.Config.code_annotator import data_template, prompt, correction, validation
+from Packages.LLM_API import FakeService, LocalBatchService
+from Packages.LLM_Parser import LLMParser
+from Packages.Multi_Process import BatchRunner, MultiProcessor
+
+
+class FailsOnMarker(FakeService):
+    """提示词含有 broken 时抛出异常，其余请求正常回答。"""
+
+    def ask(self, prompt, timeout=None):
+        if 'broken' in prompt:
+            raise RuntimeError('模拟的批量请求失败')
+        return super().ask(prompt, timeout)
+
+
+def make_runner(batch_dir):
+    llm = FailsOnMarker(prompt_templates=[prompt])
+    processor = MultiProcessor(llm, LLMParser().parse_pads, data_template, prompt, correction, validation)
+    batch_llm = LocalBatchService(llm, os.path.join(batch_dir, 'service'), num_threads=2)
+    return BatchRunner(processor, batch_llm, batch_dir, poll_interval=0.01), llm
+
+
+def test_results_are_merged_by_index_and_failures_returned(tmp_path):
+    runner, _ = make_runner(str(tmp_path))
+    tasks = [('a = 1', 3), ('broken = 2', 7), ('c = 3', 11)]
+    seen = []
+    results, failed_list = runner.run(tasks, on_result=lambda input_tuple, result: seen.append(result[1]))
+    assert sorted(index for _, index in results) == [3, 11]
+    assert all('a = 1' in data for data, index in results if index == 3)
+    assert failed_list == [('broken = 2', 7)]
+    assert sorted(seen) == [3, 11]
+
+
+def test_rerun_reuses_the_submitted_batch(tmp_path):
+    tasks = [(f'x{i} = {i}', i) for i in range(4)]
+    runner, llm = make_runner(str(tmp_path))
+    first, _ = runner.run(tasks)
+    requests = llm.stats['requests']
+
+    runner, llm = make_runner(str(tmp_path))
+    second, _ = runner.run(tasks)
+    assert sorted(first, key=lambda result: result[1]) == sorted(second, key=lambda result: result[1])
+    assert len(os.listdir(tmp_path / 'service')) == 1
+    assert requests == 4 and llm.stats['requests'] == 0
+
+
+def test_parse_record_reads_content_and_usage():
+    record = {'custom_id': '0', 'response': {'status_code': 200, 'body': {
+        'choices': [{'message': {'content': 'answer'}}], 'usage': {'prompt_tokens': 5, 'completion_tokens': 2}}}}
+    assert BatchRunner.parse_record(record) == ('answer', (5, 2))
+    assert BatchRunner.parse_record({'custom_id': '1', 'response': None, 'error': {'message': 'x'}}) == (None, None)
+    assert BatchRunner.parse_record({'response': {'status_code': 500, 'body': {}}}) == (None, None)
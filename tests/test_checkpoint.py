@@ -0,0 +1,55 @@
+import os
+
+from Applications.RepoAnnotator.Config.code_annotator import data_template, prompt, correction, validation
+from Packages.LLM_API import FakeService
+from Packages.LLM_Parser import LLMParser
+from Packages.Multi_Process import CheckpointJournal, MultiProcessor
+
+
+def make_processor():
+    llm = FakeService(prompt_templates=[prompt], correction_templates=[correction])
+    return MultiProcessor(llm, LLMParser().parse_pads, data_template, prompt, correction, validation), llm
+
+
+def test_load_ignores_stale_and_partial_records(tmp_path):
+    journal_path = str(tmp_path / 'journal.jsonl')
+    tasks = [('a = 1', 0), ('b = 2', 1)]
+    journal = CheckpointJournal(journal_path)
+    journal.append('done a', 0, key=journal.task_key(tasks[0]))
+    journal.append('done b', 1, key=journal.task_key(('b = 1', 1)))
+    journal.close()
+    with open(journal_path, 'a', encoding='utf-8') as file:
+        file.write('{"index": 1, "res')
+    assert CheckpointJournal(journal_path).load(tasks) == {0: 'done a'}
+
+
+def test_resume_skips_completed_units(tmp_path):
+    journal_path = str(tmp_path / 'journal.jsonl')
+    tasks = [(f'x{i} = {i}', i) for i in range(4)]
+    journal = CheckpointJournal(journal_path)
+    journal.append('from journal', 1, key=journal.task_key(tasks[1]))
+    journal.close()
+
+    processor, llm = make_processor()
+    seen = []
+    results = processor.resume(tasks, 2, CheckpointJournal(journal_path), on_result=lambda input_tuple, result: seen.append(input_tuple[-1]))
+    assert llm.stats['requests'] == 3
+    assert [index for _, index in results] == [0, 1, 2, 3]
+    assert results[1][0] == 'from journal'
+    assert all(result for result, _ in results)
+    assert sorted(seen) == [0, 1, 2, 3]
+    # 全部完成后日志改名为 .done，之后的运行不再读取
+    assert not os.path.exists(journal_path) and os.path.exists(journal_path + '.done')
+
+
+def test_interrupted_run_keeps_journal(tmp_path):
+    journal_path = str(tmp_path / 'journal.jsonl')
+    tasks = [(f'x{i} = {i}', i) for i in range(3)]
+    processor, llm = make_processor()
+    llm.error_rate = 1.0
+    results = processor.resume(tasks[:1], 1, CheckpointJournal(journal_path))
+    assert results == [(None, 0)]
+
+    llm.error_rate = 0.0
+    processor.multitask_perform(tasks[1:], 1, journal=CheckpointJournal(journal_path))
+    assert sorted(CheckpointJournal(journal_path).load(tasks)) == [1, 2]
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from Packages.LLM_API import CompositeService, FakeService, RateLimiter
+from Packages.LLM_API.errors import is_throttled
+from Packages.Multi_Process import MultiProcessor
+
+
+class Backend:
+    def __init__(self, version, answer=None):
+        self.version = version
+        self.answer = answer
+        self.calls = 0
+
+    def ask(self, prompt):
+        self.calls += 1
+        return self.answer if self.answer is not None else f'{self.version}: {prompt}'
+
+
+class StatusError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@pytest.mark.parametrize('error, throttled', [
+    ('请求失败: 429 - too many requests', True),
+    ('Error code: 429 - {}', True),
+    ('请求失败: Throttling.RateQuota - limit', True),
+    ('无法获取回答: Too Many Requests', True),
+    (StatusError('boom', 429), True),
+    ('请求失败: 500 - prompt has 429 lines', False),
+    ('请求过程中发生错误: read 4290 bytes', False),
+    (StatusError('boom 429 tokens', 500), False),
+])
+def test_throttle_detection(error, throttled):
+    assert is_throttled(error) is throttled
+    assert CompositeService.is_throttled(error) is throttled
+    assert MultiProcessor.is_throttled(error) is throttled
+
+
+def test_weighted_round_robin():
+    backends = [Backend('a'), Backend('b')]
+    composite = CompositeService(backends, weights=[2, 1])
+    for i in range(30):
+        composite.ask(str(i))
+    assert [backend.calls for backend in backends] == [20, 10]
+
+
+def test_failover_and_cooldown_after_errors():
+    broken, healthy = Backend('broken', answer='请求失败: 500 - down'), Backend('healthy')
+    composite = CompositeService([broken, healthy], cooldown=60)
+    assert composite.ask('x') == 'healthy: x'
+    assert composite.served_version() == 'healthy'
+    for _ in range(5):
+        composite.ask('x')
+    # 出错的服务在冷却期内不再被首选
+    assert broken.calls == 1
+    assert composite.stats[0] == {'requests': 1, 'errors': 1, 'throttles': 0}
+
+
+def test_all_backends_failing_raises():
+    composite = CompositeService([Backend('a', answer='请求失败: 500'), Backend('b', answer='无法获取回答: 超时')])
+    with pytest.raises(RuntimeError):
+        composite.ask('x')
+
+
+def test_least_latency_prefers_the_fastest_backend():
+    composite = CompositeService([Backend('slow'), Backend('fast')], routing='least_latency')
+    composite.latency_ewma = [1.0, 0.1]
+    composite.ask('x')
+    assert composite.served_version() == 'fast'
+
+
+def test_admit_pins_the_backend_that_holds_the_admission():
+    first, second = FakeService(version='first'), FakeService(version='second')
+    first.rate_limiter, second.rate_limiter = RateLimiter(rpm=60), RateLimiter(rpm=60)
+    composite = CompositeService([first, second])
+    composite.admit('x')
+    pinned = composite.pinned.get()[0]
+    composite._candidates()  # 其他请求推进了轮询
+    composite.ask('x')
+    assert composite.served_version() == composite.services[pinned].version
+    assert composite.pinned.get() is None
+
+
+def test_async_requests_use_native_and_sync_backends():
+    composite = CompositeService([FakeService(version='native'), Backend('sync')])
+
+    async def run():
+        answers = []
+        for _ in range(2):
+            await composite.ask_async('x')
+            answers.append(composite.served_version())
+        return answers
+
+    assert sorted(asyncio.run(run())) == ['native', 'sync']
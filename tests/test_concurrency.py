@@ -0,0 +1,74 @@
+import pytest
+
+from Packages.LLM_API import FakeService
+from Packages.Multi_Process import AIMDController, MetricsRegistry, MultiProcessor
+from Packages.Multi_Process.deadline import Deadline, current_deadline
+
+
+def test_limit_grows_by_about_one_per_round():
+    controller = AIMDController(initial_limit=4, max_limit=10)
+    for _ in range(4):
+        assert controller.try_acquire()
+        controller.release(0.1)
+    assert controller.limit == pytest.approx(5.0, abs=0.1)
+
+
+def test_throttle_halves_the_limit_once_per_latency_window():
+    controller = AIMDController(initial_limit=8)
+    for _ in range(3):
+        controller.acquire()
+    for _ in range(3):
+        controller.release(10.0, throttled=True)
+    assert controller.current_limit() == 4
+    assert controller.metrics()['throttles'] == 3 and controller.metrics()['decreases'] == 1
+
+
+def test_limit_stays_within_bounds():
+    controller = AIMDController(initial_limit=2, min_limit=1, max_limit=3, decrease_factor=0.1)
+    for _ in range(50):
+        controller.acquire()
+        controller.release(0.01)
+    assert controller.current_limit() == 3
+    controller.acquire()
+    controller.release(0.01, throttled=True)
+    assert controller.current_limit() == 1
+
+
+def test_try_acquire_respects_the_limit_and_release_unused_keeps_it():
+    controller = AIMDController(initial_limit=2)
+    assert controller.try_acquire() and controller.try_acquire()
+    assert not controller.try_acquire()
+    controller.release_unused()
+    assert controller.limit == 2.0
+    assert controller.try_acquire()
+
+
+class FailingAdmission:
+    """取得限流额度时出错的服务。"""
+
+    def admit(self, prompt):
+        raise RuntimeError('admission failed')
+
+    def ask(self, prompt):
+        return prompt
+
+
+def test_failed_admission_returns_the_slot():
+    controller = AIMDController(initial_limit=1, max_limit=1)
+    processor = MultiProcessor(FailingAdmission(), lambda answer: answer, '', '{input_1}', '{answer}', lambda data: True, concurrency=controller)
+    token = current_deadline.set(Deadline(1.0))
+    try:
+        with pytest.raises(RuntimeError):
+            processor.ask_llm('x')
+    finally:
+        current_deadline.reset(token)
+    assert controller.in_flight == 0
+
+
+def test_limit_is_exported_as_a_gauge():
+    metrics = MetricsRegistry()
+    controller = AIMDController(initial_limit=2, max_limit=5)
+    processor = MultiProcessor(FakeService(), lambda answer: answer, '', '{input_1}', '{answer}', lambda data: True, concurrency=controller, metrics=metrics)
+    processor.multitask_perform([(f'u{i}', i) for i in range(10)], 4)
+    assert metrics.get('annotator_concurrency_limit') == controller.current_limit()
+    assert controller.in_flight == 0
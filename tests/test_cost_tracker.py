@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from Applications.RepoAnnotator.Config.code_annotator import data_template, prompt, correction, validation
+from Packages.LLM_API import CompositeService, CostTracker, FakeService
+from Packages.LLM_Parser import LLMParser
+from Packages.Multi_Process import MultiProcessor
+
+
+def test_record_prices_tokens_by_model_and_batch():
+    tracker = CostTracker(1.0, 2.0, prices={'cheap': (0.1, 0.2, 0.5)})
+    tracker.record(0, 'prompt', 'answer', usage=(10, 5))
+    tracker.record(1, 'prompt', 'answer', usage=(10, 5), model='cheap')
+    tracker.record(2, 'prompt', 'answer', usage=(10, 5), model='cheap', batch=True)
+    assert tracker.unit_costs == pytest.approx({0: 20.0, 1: 2.0, 2: 1.0})
+    assert tracker.spent == pytest.approx(23.0)
+
+
+def test_split_cost_by_weight():
+    tracker = CostTracker(1.0, 0.0)
+    tracker.record('pack', 'p', 'a', usage=(30, 0))
+    tracker.split_cost('pack', [1, 2], weights=[1, 2])
+    assert tracker.unit_costs == pytest.approx({1: 10.0, 2: 20.0})
+
+
+def test_first_wave_is_limited_by_prompt_estimates():
+    tracker = CostTracker(0.01, 0.01, budget=1.0)
+    unit_prompt = 'x' * 120  # 约30个token，预计花费 0.6 元
+    assert tracker.estimate_cost(unit_prompt) == pytest.approx(0.6)
+    assert tracker.admit(unit_prompt)
+    assert not tracker.admit(unit_prompt)
+    tracker.complete(unit_prompt)
+    assert tracker.in_flight == 0 and tracker.in_flight_estimate == 0.0
+
+
+def test_average_cost_is_used_after_the_first_unit():
+    tracker = CostTracker(1.0, 0.0, budget=10.0)
+    assert tracker.admit()
+    tracker.record(0, 'p', 'a', usage=(4, 0))
+    tracker.complete()
+    assert tracker.admit()
+    assert not tracker.admit()
+    assert tracker.summary()['skipped_units'] == 1
+
+
+def test_missing_price_with_budget_raises(tmp_path):
+    price_file = tmp_path / 'price.json'
+    price_file.write_text(json.dumps({'known': {'input_price': 0.1, 'output_price': 0.2}}), encoding='utf-8')
+    assert CostTracker.read_price(str(price_file), 'known', budget=1.0)[:2] == (0.1, 0.2)
+    with pytest.raises(ValueError):
+        CostTracker.read_price(str(price_file), 'unknown', budget=1.0)
+
+
+def test_composite_service_is_priced_per_backend():
+    cheap = FakeService(version='cheap', input_price=0.1, output_price=0.1)
+    dear = FakeService(version='dear', input_price=1.0, output_price=2.0)
+    tracker = CostTracker.from_service(CompositeService([cheap, dear]))
+    assert set(tracker.prices) == {'cheap', 'dear'}
+    assert (tracker.input_price, tracker.output_price) == (1.0, 2.0)
+
+
+@pytest.mark.parametrize('num_threads', [1, 20])
+def test_budget_stops_admitting_units(num_threads):
+    llm = FakeService(prompt_templates=[prompt], correction_templates=[correction], input_price=0.001, output_price=0.001)
+    tasks = [(f'def f{i}(x):\n    return x + {i}', i) for i in range(20)]
+    tracker = CostTracker.from_service(llm, total_units=len(tasks))
+    processor = MultiProcessor(llm, LLMParser().parse_pads, data_template, prompt, correction, validation, cost_tracker=tracker)
+    tracker.budget = budget = 3.5 * tracker.estimate_cost(processor.unit_prompt(tasks[0]))
+    results = processor.multitask_perform(tasks, num_threads)
+    assert 0 < len(processor.skipped) < len(tasks)
+    assert tracker.spent <= budget
+    assert sum(1 for result in results if result and result[0] is not None) == len(tasks) - len(processor.skipped)
@@ -0,0 +1,67 @@
+import threading
+import time
+
+import pytest
+
+from Packages.LLM_API import FakeService, RateLimiter
+from Packages.Multi_Process import AsyncMultiProcessor, MultiProcessor
+from Packages.Multi_Process.deadline import Deadline
+
+
+def make_processor(processor_class, llm, **options):
+    return processor_class(llm, lambda answer: answer, '', '{input_1}', '{answer}', lambda data: True, **options)
+
+
+def test_clock_only_runs_while_requests_are_active():
+    deadline = Deadline(1.0)
+    assert deadline.remaining() == pytest.approx(1.0)
+    deadline.resume()
+    time.sleep(0.05)
+    deadline.pause()
+    used = 1.0 - deadline.remaining()
+    time.sleep(0.05)
+    assert 0.04 < used < 0.5
+    assert 1.0 - deadline.remaining() == pytest.approx(used)
+
+
+def test_wait_reports_expiry_of_request_time():
+    deadline = Deadline(0.05)
+    worker = threading.Thread(target=lambda: (deadline.resume(), time.sleep(0.3), deadline.pause(), deadline.finish()))
+    worker.start()
+    assert deadline.wait() is False
+    assert deadline.cancelled
+    worker.join()
+
+
+def test_wait_ignores_paused_time():
+    deadline = Deadline(0.05)
+
+    def work():
+        time.sleep(0.2)  # 等待限流额度，不计时
+        deadline.resume()
+        deadline.pause()
+        deadline.finish()
+
+    threading.Thread(target=work).start()
+    assert deadline.wait() is True
+    assert not deadline.cancelled
+
+
+@pytest.mark.parametrize('processor_class', [MultiProcessor, AsyncMultiProcessor])
+def test_rate_limiter_wait_does_not_time_out_units(processor_class):
+    llm = FakeService(latency=0.01)
+    llm.rate_limiter = RateLimiter(rpm=600)
+    llm.rate_limiter.request_level = 1  # 之后每0.1秒放行一个请求
+    processor = make_processor(processor_class, llm, timeout=0.15)
+    results = processor.multitask_perform([(f'u{i}', i) for i in range(5)], 5)
+    assert processor.timed_out == []
+    assert llm.stats['requests'] == 5
+    assert all(result is not None for result, _ in results)
+
+
+@pytest.mark.parametrize('processor_class', [MultiProcessor, AsyncMultiProcessor])
+def test_slow_requests_time_out_and_are_rescheduled(processor_class):
+    processor = make_processor(processor_class, FakeService(latency=0.5), timeout=0.1, max_reschedules=1)
+    results = processor.multitask_perform([('w', 0)], 1)
+    assert results == [None]
+    assert processor.timed_out == [0, 0]
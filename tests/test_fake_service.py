@@ -0,0 +1,55 @@
+from Applications.RepoAnnotator.Config.code_annotator import data_template, prompt, correction, validation
+from Packages.LLM_API import FakeService, LLMLoader
+from Packages.LLM_API.errors import is_throttled
+from Packages.LLM_Parser import LLMParser
+from Packages.Multi_Process import MultiProcessor
+
+
+def answers(llm, prompts):
+    return [llm.ask(text) for text in prompts]
+
+
+def test_answers_depend_only_on_seed_and_attempt():
+    prompts = [f'code {i}' for i in range(20)]
+    first = answers(FakeService(malformed_rate=0.5, seed=1), prompts)
+    assert first == answers(FakeService(malformed_rate=0.5, seed=1), prompts)
+    assert first != answers(FakeService(malformed_rate=0.5, seed=2), prompts)
+    # 同一提示词的重试会重新抽样
+    llm = FakeService(malformed_rate=0.5, seed=1)
+    assert len({llm.ask('code 0') for _ in range(10)}) == 2
+
+
+def test_error_throttle_and_malformed_injection():
+    assert FakeService(error_rate=1.0).ask('x').startswith('请求过程中发生错误')
+    assert is_throttled(FakeService(throttle_rate=1.0).ask('x'))
+    malformed = FakeService(malformed_rate=1.0).ask('x = 1')
+    assert malformed.startswith('**start_pad**') and malformed.endswith('**end_pad**')
+    llm = FakeService(correction_templates=[correction])
+    fixed = llm.ask(correction.replace('{answer}', malformed))
+    assert fixed.startswith('=start_pad=') and fixed.endswith('=end_pad=')
+
+
+def test_prompt_template_and_packed_units():
+    llm = FakeService(prompt_templates=[prompt])
+    answer = llm.ask(prompt.replace('{input_1}', 'a = 1'))
+    assert answer == '=start_pad=\n# 模拟注释: 第1行\na = 1\n=end_pad='
+    packed = llm.ask('=unit_1=\na = 1\n\n=unit_2=\nb = 2')
+    assert '=start_pad_1=' in packed and '=end_pad_2=' in packed
+
+
+def test_loader_builds_fake_service():
+    llm = LLMLoader('fake', rate_limit=False, service_options={'latency': 0.0, 'seed': 3}).service
+    assert isinstance(llm, FakeService) and llm.seed == 3
+
+
+def test_processor_corrects_malformed_answers():
+    llm = FakeService(malformed_rate=0.3, seed=4, prompt_templates=[prompt], correction_templates=[correction])
+    processor = MultiProcessor(llm, LLMParser().parse_pads, data_template, prompt, correction, validation)
+    tasks = [(f'x{i} = {i}', i) for i in range(20)]
+    results = processor.multitask_perform(tasks, 4)
+    failed = [index for data, index in results if data is None]
+    assert sorted(result[1] for result in results) == list(range(20))
+    assert all(f'x{index} = {index}' in data for data, index in results if data is not None)
+    # 只有原始回答和纠错回答都格式错误的单元才会失败
+    assert 0 < llm.stats['malformed'] and len(failed) * 2 <= llm.stats['malformed']
+    assert llm.stats['requests'] == 20 + llm.stats['malformed'] - len(failed)
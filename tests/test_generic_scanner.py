@@ -0,0 +1,55 @@
+import re
+
+from Applications.RepoAnnotator.Tools import CodeAnalyser
+
+JS_SOURCE = '''import a from 'a'
+function first() {
+  return 1
+}
+export const b = 2
+class Second {
+  run() {}
+}
+import c from 'c'
+function third() {
+  return 3
+}
+'''
+
+C_SOURCE = '''#include <stdio.h>
+typedef struct point {
+    int x;
+} point;
+int main() {
+    return 0;
+}
+'''
+
+
+def spans(units):
+    # threshold=0 时每个单元单独成块，过滤掉合并时产生的空单元
+    return [(unit['start_line'], unit['end_line']) for unit in units if unit['source_code']]
+
+
+def test_units_follow_source_order_across_patterns():
+    # 关键行各自成为一个单元，两个关键行之间的代码成为一个单元
+    units = CodeAnalyser(threshold=0).js_analyser(JS_SOURCE, 'a.js')
+    assert spans(units) == [(1, 1), (2, 2), (3, 4), (5, 5), (6, 6), (7, 8), (9, 9), (10, 10), (11, 12)]
+
+
+def test_units_are_contiguous_and_cover_the_file():
+    units = [unit for unit in CodeAnalyser(threshold=0).js_analyser(JS_SOURCE, 'a.js') if unit['source_code']]
+    assert units[0]['start_line'] == 1 and units[-1]['end_line'] == len(JS_SOURCE.splitlines())
+    assert all(b['start_line'] == a['end_line'] + 1 for a, b in zip(units, units[1:]))
+
+
+def test_line_matched_by_several_patterns_starts_one_unit():
+    # typedef struct 同时匹配类型定义和结构体两个正则
+    assert spans(CodeAnalyser(threshold=0).c_analyser(C_SOURCE, 'a.c')) == [(1, 1), (2, 2), (3, 4), (5, 5), (6, 7)]
+
+
+def test_overlapping_multiline_matches_do_not_duplicate_lines():
+    source_code = 'head\nA\nB\nC\ntail'
+    patterns = [re.compile(r'^A\nB', re.MULTILINE), re.compile(r'^B\nC', re.MULTILINE), re.compile(r'^B$', re.MULTILINE)]
+    units = CodeAnalyser(threshold=0).generic_analyser(source_code, 'a.txt', patterns)
+    assert spans(units) == [(1, 1), (2, 3), (4, 4), (5, 5)]
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from Packages.Multi_Process import AsyncMultiProcessor, HedgePolicy, MultiProcessor
+
+
+class FirstCallSlow:
+    """每个提示词的第一次请求很慢，之后的请求立即返回，模拟拖尾请求。"""
+
+    def __init__(self, slow=1.0):
+        self.slow = slow
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def _is_first(self, prompt):
+        with self.lock:
+            self.calls[prompt] = self.calls.get(prompt, 0) + 1
+            return self.calls[prompt] == 1
+
+    def ask(self, prompt):
+        if self._is_first(prompt):
+            time.sleep(self.slow)
+        return prompt
+
+    async def ask_async(self, prompt):
+        if self._is_first(prompt):
+            await asyncio.sleep(self.slow)
+        return prompt
+
+
+def primed_policy(**options):
+    policy = HedgePolicy(percentile=90, min_samples=5, **options)
+    for _ in range(10):
+        policy.record_latency(0.01)
+    return policy
+
+
+def test_delay_needs_enough_samples():
+    policy = HedgePolicy(percentile=50, min_samples=3)
+    policy.record_latency(1.0)
+    assert policy.delay() is None
+    for latency in (3.0, 2.0):
+        policy.record_latency(latency)
+    assert policy.delay() == 2.0
+
+
+def test_extra_requests_are_capped_by_ratio():
+    policy = HedgePolicy(max_extra_ratio=0.1)
+    for _ in range(20):
+        policy.record_primary()
+    assert [policy.try_hedge() for _ in range(3)] == [True, True, False]
+
+
+@pytest.mark.parametrize('processor_class', [MultiProcessor, AsyncMultiProcessor])
+def test_hedged_request_beats_a_straggler(processor_class):
+    policy = primed_policy(max_extra_ratio=1.0)
+    processor = processor_class(FirstCallSlow(), lambda answer: answer, '', '{input_1}', '{answer}', lambda data: True, hedge=policy)
+    start = time.time()
+    results = processor.multitask_perform([('x', 0)], 1)
+    assert time.time() - start < 0.8
+    assert results == [('x', 0)]
+    assert policy.stats()['hedged_requests'] == 1 and policy.stats()['hedge_wins'] == 1
+
+
+def test_no_hedge_without_budget():
+    policy = primed_policy(max_extra_ratio=0.0)
+    processor = MultiProcessor(FirstCallSlow(slow=0.2), lambda answer: answer, '', '{input_1}', '{answer}', lambda data: True, hedge=policy)
+    assert processor.multitask_perform([('x', 0)], 1) == [('x', 0)]
+    assert policy.stats()['hedged_requests'] == 0
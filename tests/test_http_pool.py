@@ -0,0 +1,100 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from Packages.LLM_API import HTTPPool
+from Packages.LLM_API import huida, sense_time
+
+
+class OkHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 保持长连接
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def base_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), OkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_one_pool_per_base_url(base_url):
+    assert HTTPPool.client(base_url) is HTTPPool.client(base_url)
+    assert HTTPPool.session(base_url) is HTTPPool.session(base_url)
+    assert HTTPPool.client(base_url) is not HTTPPool.client(base_url + '/other')
+
+
+def test_connections_are_reused(base_url):
+    client = HTTPPool.client(base_url)
+    for _ in range(5):
+        assert client.get(base_url + '/chat').text == 'ok'
+    counter = HTTPPool.metrics()[base_url]
+    assert counter['requests'] == 5
+    assert counter['connections'] == 1
+    assert counter['reuse_ratio'] == pytest.approx(0.8)
+
+
+def test_async_clients_are_per_event_loop(base_url):
+    async def get_client():
+        return HTTPPool.async_client(base_url)
+
+    async def same_loop():
+        return await get_client() is await get_client()
+
+    assert asyncio.run(same_loop())
+    assert asyncio.run(get_client()) is not asyncio.run(get_client())
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload or {}
+        self.text = ''
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.urls = []
+
+    def post(self, url, **kwargs):
+        self.urls.append(url)
+        return self.responses.pop(0)
+
+
+def test_huida_session_is_keyed_by_base_url(monkeypatch):
+    monkeypatch.setenv('HUIDA_API_KEY', 'key')
+    keys = []
+    session = FakeSession([FakeResponse(200, {'choices': [{'message': {'content': 'answer'}}]})])
+    monkeypatch.setattr(HTTPPool, 'session', classmethod(lambda cls, key: (keys.append(key), session)[1]))
+    service = huida.HuidaService()
+    assert service.ask('hello') == 'answer'
+    assert keys == ['https://api.huida.app/v1']
+    assert session.urls == ['https://api.huida.app/v1/chat/completions']
+
+
+def test_sense_time_refreshes_token_and_retries_on_401(monkeypatch):
+    refreshes = []
+    monkeypatch.setattr(sense_time.SenseService, 'refresh_token', lambda self: refreshes.append(1) or setattr(self, 'authorization', 'token'))
+    ok = FakeResponse(200, {'data': {'usage': {'total_tokens': 3}, 'choices': [{'message': 'answer'}]}})
+    session = FakeSession([FakeResponse(401), ok])
+    monkeypatch.setattr(HTTPPool, 'session', classmethod(lambda cls, key: session))
+    service = sense_time.SenseService()
+    assert service.ask('hello') == 'answer'
+    assert len(refreshes) == 2  # 构造时一次，401之后一次
+    assert service.total_tokens_used == 3
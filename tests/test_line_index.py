@@ -0,0 +1,50 @@
+import ast
+
+from Applications.RepoAnnotator.Tools import CodeAnalyser, LineIndex
+
+SOURCE = '''import os
+from sys import path
+
+CONSTANT = 1
+
+
+class A:
+    def method(self):
+        return os.sep
+
+
+async def b():
+    return path
+
+print(CONSTANT)
+'''
+
+
+def test_line_of_matches_newline_count():
+    for source_code in (SOURCE, '', 'a', '\n\n', 'a\r\nb\r\n'):
+        line_index = LineIndex(source_code)
+        assert all(line_index.line_of(offset) == source_code.count('\n', 0, offset) for offset in range(len(source_code) + 1))
+
+
+def test_segment_is_a_slice_of_the_split_lines():
+    line_index = LineIndex(SOURCE)
+    lines = SOURCE.splitlines()
+    assert len(line_index) == len(lines)
+    for start in range(len(lines)):
+        for end in range(start, len(lines) + 1):
+            assert line_index.segment(start, end) == '\n'.join(lines[start:end])
+
+
+def test_source_segment_accepts_string_or_index():
+    analyser = CodeAnalyser()
+    line_index = LineIndex(SOURCE)
+    for node in ast.iter_child_nodes(ast.parse(SOURCE)):
+        expected = '\n'.join(SOURCE.splitlines()[node.lineno - 1:node.end_lineno])
+        assert analyser.get_source_segment(SOURCE, node) == analyser.get_source_segment(line_index, node) == expected
+
+
+def test_python_units_are_slices_of_the_file():
+    units = [unit for unit in CodeAnalyser(threshold=30).py_analyser(SOURCE, 'a.py') if unit['source_code']]
+    lines = SOURCE.splitlines()
+    assert [(unit['start_line'], unit['end_line']) for unit in units] == [(1, 6), (7, 9), (10, 11), (12, 13), (14, 15)]
+    assert all(unit['source_code'] == '\n'.join(lines[unit['start_line'] - 1:unit['end_line']]) for unit in units)
@@ -0,0 +1,63 @@
+import os
+
+from Applications.RepoAnnotator.Tools import RunManifest
+
+
+def make_units(root, file_path, blocks, first_index=0):
+    """把代码块写入文件，返回与 CodeAnalyser 输出相同结构的单元列表。"""
+    with open(os.path.join(root, file_path), 'w', encoding='utf-8') as file:
+        file.write('\n'.join(blocks))
+    units = []
+    line = 1
+    for offset, block in enumerate(blocks):
+        end_line = line + block.count('\n')
+        units.append({'file_path': file_path, 'start_line': line, 'end_line': end_line, 'source_code': block, 'index': first_index + offset})
+        line = end_line + 1
+    return units
+
+
+def save_run(manifest_path, root, units):
+    manifest = RunManifest(manifest_path)
+    manifest.split(units, root)
+    manifest.update(units, [(f"annotated {unit['index']}", unit['index']) for unit in units], root)
+    manifest.save()
+
+
+def test_unchanged_file_is_reused(tmp_path):
+    root, manifest_path = str(tmp_path), str(tmp_path / 'manifest.json')
+    units = make_units(root, 'a.py', ['def f():\n    return 1', 'def g():\n    return 2'])
+    save_run(manifest_path, root, units)
+    reused, pending = RunManifest(manifest_path).split(units, root)
+    assert reused == [('annotated 0', 0), ('annotated 1', 1)]
+    assert pending == []
+
+
+def test_edited_file_reuses_unchanged_units_by_hash(tmp_path):
+    root, manifest_path = str(tmp_path), str(tmp_path / 'manifest.json')
+    units = make_units(root, 'a.py', ['def f():\n    return 1', 'def g():\n    return 2'])
+    save_run(manifest_path, root, units)
+    edited = make_units(root, 'a.py', ['import os', 'def f():\n    return 1', 'def g():\n    return 3'])
+    reused, pending = RunManifest(manifest_path).split(edited, root)
+    assert reused == [('annotated 0', 1)]
+    assert [unit['source_code'] for unit in pending] == ['import os', 'def g():\n    return 3']
+
+
+def test_failed_units_and_new_files_are_pending(tmp_path):
+    root, manifest_path = str(tmp_path), str(tmp_path / 'manifest.json')
+    units = make_units(root, 'a.py', ['x = 1', 'y = 2'])
+    manifest = RunManifest(manifest_path)
+    manifest.split(units, root)
+    manifest.update(units, [('annotated 0', 0), (None, 1)], root)
+    manifest.save()
+    units += make_units(root, 'b.py', ['z = 3'], first_index=2)
+    reused, pending = RunManifest(manifest_path).split(units, root)
+    assert reused == [('annotated 0', 0)]
+    assert [unit['index'] for unit in pending] == [1, 2]
+
+
+def test_deleted_files_are_dropped(tmp_path):
+    root, manifest_path = str(tmp_path), str(tmp_path / 'manifest.json')
+    units = make_units(root, 'a.py', ['x = 1']) + make_units(root, 'b.py', ['y = 2'], first_index=1)
+    save_run(manifest_path, root, units)
+    save_run(manifest_path, root, units[:1])
+    assert list(RunManifest(manifest_path).files) == ['a.py']
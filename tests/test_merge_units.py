@@ -0,0 +1,46 @@
+import random
+
+import pytest
+
+from Applications.RepoAnnotator.Tools import CodeAnalyser, LineIndex
+from Benchmarks.merge_units_benchmark import build_source, legacy_merge_units
+
+
+def random_units(num_lines, rng):
+    """把 1..num_lines 行随机切成首尾相接的单元。"""
+    units = []
+    start = 1
+    while start <= num_lines:
+        end = min(num_lines, start + rng.randint(0, 5))
+        units.append({'start_line': start, 'end_line': end})
+        start = end + 1
+    return units
+
+
+@pytest.mark.parametrize('threshold', [0, 10, 80, 500, 100000])
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_the_legacy_algorithm(threshold, seed):
+    rng = random.Random(seed)
+    source_code = '\n'.join('x' * rng.choice([0, 0, 3, 20, 90]) for _ in range(300))
+    units = random_units(300, rng)
+    merged = CodeAnalyser(threshold=threshold).merge_units(units, source_code, 'a.py')
+    assert [(unit['start_line'], unit['end_line']) for unit in merged] == legacy_merge_units(units, source_code, threshold)
+    lines = source_code.splitlines()
+    assert all(unit['source_code'] == '\n'.join(lines[unit['start_line'] - 1:unit['end_line']]) for unit in merged)
+    assert [unit['index'] for unit in merged] == list(range(1, len(merged) + 1))
+
+
+def test_matches_the_legacy_algorithm_on_one_unit_per_line():
+    source_code, units = build_source(2000, seed=1)
+    merged = CodeAnalyser(threshold=4096).merge_units(units, source_code, 'a.py')
+    assert [(unit['start_line'], unit['end_line']) for unit in merged] == legacy_merge_units(units, source_code, 4096)
+
+
+def test_accepts_a_line_index():
+    source_code, units = build_source(500, seed=2)
+    analyser = CodeAnalyser(threshold=300)
+    assert analyser.merge_units(units, LineIndex(source_code), 'a.py') == analyser.merge_units(units, source_code, 'a.py')
+
+
+def test_cumulative_costs_count_line_breaks():
+    assert CodeAnalyser().cumulative_costs(['ab', '', 'c']) == [0, 3, 4, 6]
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from Applications.RepoAnnotator.Config.code_annotator import data_template, prompt, correction, validation
+from Packages.LLM_API import LLMLoader
+from Packages.LLM_Parser import LLMParser
+from Packages.Multi_Process import MetricsRegistry, MultiProcessor
+
+
+def test_counters_gauges_and_histograms():
+    metrics = MetricsRegistry(buckets=(0.1, 1.0))
+    metrics.inc('requests', provider='a')
+    metrics.inc('requests', 2, provider='a')
+    metrics.add('in_flight', 3)
+    metrics.add('in_flight', -1)
+    for value in (0.05, 0.5, 0.5, 5.0):
+        metrics.observe('latency', value)
+    assert metrics.get('requests', provider='a') == 3
+    assert metrics.get('requests', provider='b') is None
+    assert metrics.get('in_flight') == 2
+    assert metrics.get('latency') == (4, pytest.approx(6.05))
+    with pytest.raises(ValueError):
+        metrics.set('requests', 1, provider='a')
+
+
+def test_snapshot_reports_cumulative_buckets_and_quantiles():
+    metrics = MetricsRegistry(buckets=(1.0, 2.0))
+    for value in (0.5, 1.5, 1.5, 1.5):
+        metrics.observe('latency', value)
+    entry = metrics.snapshot()['metrics']['latency']['series'][0]
+    assert entry['buckets'] == {'1.0': 1, '2.0': 4, '+Inf': 4}
+    # 中位数落在 (1, 2] 桶内，按桶内线性插值
+    assert entry['p50'] == pytest.approx(1 + 1 / 3)
+
+
+def test_prometheus_text_and_file_export(tmp_path):
+    metrics = MetricsRegistry(buckets=(1.0,))
+    metrics.inc('annotator_corrections_total')
+    metrics.observe('annotator_unit_seconds', 0.5, status='ok')
+    text = metrics.to_prometheus()
+    assert '# TYPE annotator_corrections_total counter' in text
+    assert 'annotator_corrections_total 1' in text
+    assert 'annotator_unit_seconds_bucket{status="ok",le="+Inf"} 1' in text
+    assert 'annotator_unit_seconds_count{status="ok"} 1' in text
+
+    metrics.write(str(tmp_path / 'metrics.prom'))
+    metrics.write(str(tmp_path / 'metrics.json'))
+    assert (tmp_path / 'metrics.prom').read_text(encoding='utf-8') == text
+    snapshot = json.loads((tmp_path / 'metrics.json').read_text(encoding='utf-8'))
+    assert snapshot['metrics']['annotator_corrections_total']['series'][0]['value'] == 1
+
+
+def test_processor_and_service_metrics():
+    metrics = MetricsRegistry()
+    llm = LLMLoader('fake', 'fake-a', rate_limit=False, metrics=metrics, service_options={'prompt_templates': [prompt]}).service
+    processor = MultiProcessor(llm, LLMParser().parse_pads, data_template, prompt, correction, validation, metrics=metrics)
+    processor.multitask_perform([(f'x{i} = {i}', i) for i in range(5)], 2)
+    assert metrics.get('annotator_units_total', status='ok') == 5
+    assert metrics.get('annotator_unit_seconds')[0] == 5
+    assert metrics.get('annotator_llm_requests_total', status='ok', provider='fake-a') == 5
+    assert metrics.get('annotator_llm_tokens_total', direction='out', provider='fake-a') > 0
+    assert metrics.get('annotator_llm_in_flight', provider='fake-a') == 0
+    assert metrics.get('annotator_in_flight_units') == 0
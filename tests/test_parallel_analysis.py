@@ -0,0 +1,50 @@
+import os
+
+from Applications.RepoAnnotator.Tools import CodeAnalyser
+from Applications.RepoAnnotator.repo_annotator import RepoAnnotator
+from Benchmarks.pipeline_benchmark import generate_repo
+from Packages.Multi_Process import MetricsRegistry
+
+
+def read_tree(root):
+    return {os.path.relpath(os.path.join(folder, name), root): open(os.path.join(folder, name), encoding='utf-8').read()
+            for folder, _, names in os.walk(root) for name in names}
+
+
+def test_process_pool_gives_the_same_units_as_the_serial_path(tmp_path):
+    generate_repo(str(tmp_path), 24, seed=3)
+    analyser = CodeAnalyser(threshold=128)
+    serial = analyser.get_units(str(tmp_path))
+    parallel = analyser.get_units(str(tmp_path), processes=4)
+    assert [unit['index'] for unit in serial] == list(range(1, len(serial) + 1))
+    assert parallel == serial
+
+
+def test_files_are_streamed_in_traversal_order(tmp_path):
+    generate_repo(str(tmp_path), 24, seed=3)
+    metrics = MetricsRegistry()
+    analyser = CodeAnalyser(token_budget=200, metrics=metrics)
+    serial = list(analyser.worker_copy().iter_file_units(str(tmp_path)))
+    parallel = list(analyser.iter_file_units(str(tmp_path), processes=4))
+    assert parallel == serial
+    # 子进程不带指标注册表，指标由主进程记录
+    languages = ('c', 'cpp', 'go', 'html', 'java', 'js', 'php', 'py', 'rb')
+    assert sum(metrics.get('annotator_analysed_files_total', language=language) or 0 for language in languages) == 24
+    assert sum(metrics.get('annotator_analysed_units_total', language=language) or 0 for language in languages) == sum(len(units) for units in parallel)
+
+
+def test_stopping_early_shuts_the_pool_down(tmp_path):
+    generate_repo(str(tmp_path), 40, seed=4)
+    iterator = CodeAnalyser().iter_file_units(str(tmp_path), processes=4)
+    first = next(iterator)
+    iterator.close()
+    assert first and first[0]['index'] == 1
+
+
+def test_streamed_parallel_run_writes_the_same_tree(tmp_path):
+    generate_repo(str(tmp_path / 'repo'), 12, seed=5)
+    options = dict(service_type='fake', threshold=128, num_threads=4, service_options={'seed': 0})
+    serial = RepoAnnotator.run(str(tmp_path / 'repo'), [], str(tmp_path / 'serial'), **options)
+    parallel = RepoAnnotator.run(str(tmp_path / 'repo'), [], str(tmp_path / 'parallel'), analysis_processes=4, **options)
+    assert parallel['total_units'] == serial['total_units'] > 0
+    assert read_tree(str(tmp_path / 'parallel')) == read_tree(str(tmp_path / 'serial'))
@@ -0,0 +1,51 @@
+import argparse
+import os
+
+from Benchmarks.pipeline_benchmark import compare, generate_repo, percentile, run_benchmark
+from Packages.LLM_API import FakeService
+
+
+def bench_args(**overrides):
+    options = dict(files=6, skew=1.2, threshold=256, threads=4, engine='thread', schedule='fifo', pack_budget=None,
+                   analysis_processes=None, latency=0.0, distribution='constant', seconds_per_token=0.0,
+                   error_rate=0.0, malformed_rate=0.0, seed=0, output=None, baseline=None, tolerance=0.1)
+    options.update(overrides)
+    return argparse.Namespace(**options)
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 50) is None
+
+
+def test_generated_repo_is_deterministic(tmp_path):
+    def contents(root):
+        return {os.path.relpath(os.path.join(folder, name), root): open(os.path.join(folder, name), encoding='utf-8').read()
+                for folder, _, names in os.walk(root) for name in names}
+
+    generate_repo(str(tmp_path / 'a'), 8, seed=5)
+    generate_repo(str(tmp_path / 'b'), 8, seed=5)
+    files = contents(str(tmp_path / 'a'))
+    assert len(files) == 8 and files == contents(str(tmp_path / 'b'))
+    assert len({os.path.splitext(name)[1] for name in files}) == 8
+
+
+def test_report_covers_throughput_latency_and_stages():
+    original_ask = FakeService.ask
+    report = run_benchmark(bench_args())
+    assert report['processed_units'] == report['total_units'] > 0
+    assert report['units_per_second'] > 0
+    assert report['unit_latency']['count'] == report['processed_units']
+    assert report['unit_latency']['p50'] <= report['unit_latency']['p99']
+    assert {'analyse', 'schedule', 'llm', 'parse', 'write'} <= set(report['stages'])
+    # 运行结束后恢复被包装的函数
+    assert FakeService.ask is original_ask
+
+
+def test_compare_flags_throughput_regressions():
+    baseline = {'units_per_second': 100.0, 'unit_latency': {'p95': 0.1}}
+    assert compare({'units_per_second': 80.0, 'unit_latency': {'p95': 0.1}}, baseline, tolerance=0.1)
+    assert not compare({'units_per_second': 95.0, 'unit_latency': {'p95': 0.1}}, baseline, tolerance=0.1)
@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import pytest
+
+from Packages.LLM_API import RateLimiter
+
+
+def test_rpm_spaces_out_requests():
+    limiter = RateLimiter(rpm=600)
+    limiter.request_level = 1
+    start = time.monotonic()
+    for _ in range(3):
+        limiter.acquire('x')
+    # 第一个请求立即放行，之后每0.1秒一个
+    assert 0.15 < time.monotonic() - start < 1.0
+
+
+def test_tpm_charges_estimated_tokens_and_correct_settles_them():
+    limiter = RateLimiter(tpm=1000, output_ratio=1.0)
+    tokens = limiter.acquire('x' * 40)
+    assert tokens == 20
+    assert limiter.token_level == pytest.approx(980, abs=1)
+    limiter.correct(tokens, 50)
+    assert limiter.token_level == pytest.approx(950, abs=1)
+
+
+def test_admitted_request_does_not_wait_again():
+    limiter = RateLimiter(rpm=60)
+    limiter.request_level = 1
+    limiter.admit('x')
+    start = time.monotonic()
+    limiter.acquire('x')
+    assert time.monotonic() - start < 0.1
+    assert limiter.admitted.get() is None
+
+
+def test_discard_refunds_the_admission():
+    limiter = RateLimiter(rpm=60, tpm=1000)
+    limiter.request_level, limiter.token_level = 10, 500
+    limiter.admit('x' * 40)
+    assert limiter.request_level == pytest.approx(9, abs=0.1)
+    limiter.discard()
+    assert limiter.request_level == pytest.approx(10, abs=0.1)
+    assert limiter.token_level == pytest.approx(500, abs=1)
+    # 没有预先取得的额度时不再退还
+    limiter.discard()
+    assert limiter.request_level == pytest.approx(10, abs=0.1)
+
+
+def test_async_acquire_honours_admission():
+    limiter = RateLimiter(rpm=60)
+    limiter.request_level = 1
+
+    async def run():
+        await limiter.admit_async('x')
+        start = time.monotonic()
+        await limiter.acquire_async('x')
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) < 0.1
+
+
+def test_admissions_are_per_task():
+    limiter = RateLimiter(rpm=600)
+
+    async def admit_only():
+        await limiter.admit_async('x')
+
+    async def run():
+        await asyncio.gather(admit_only(), admit_only())
+        return limiter.admitted.get()
+
+    assert asyncio.run(run()) is None
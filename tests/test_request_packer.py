@@ -0,0 +1,49 @@
+from Applications.RepoAnnotator.Config.code_annotator import packed_data_template, packed_prompt, packed_correction, packed_validation
+from Applications.RepoAnnotator.Tools import RequestPacker
+from Packages.LLM_API import FakeService
+from Packages.LLM_Parser import LLMParser
+from Packages.Multi_Process import MultiProcessor
+
+
+def by_length(text):
+    return len(text)
+
+
+def test_packs_in_order_within_budget():
+    packer = RequestPacker(token_budget=10, estimator=by_length)
+    tasks = [('aaaa', 0), ('bbbb', 1), ('cccc', 2), ('x' * 20, 3), ('dd', 4), ('ee', 5)]
+    packed_list, single_list = packer.pack(tasks)
+    assert [[task[-1] for task in packer.packs[index]] for _, index in packed_list] == [[0, 1], [2, 4, 5]]
+    assert single_list == [('x' * 20, 3)]
+    assert packed_list[0] == ('=unit_1=\naaaa\n\n=unit_2=\nbbbb', -1)
+
+
+def test_max_units_and_lonely_units():
+    packer = RequestPacker(token_budget=100, max_units=2, estimator=by_length)
+    packed_list, single_list = packer.pack([('a', 0), ('b', 1), ('c', 2)])
+    assert len(packed_list) == 1
+    assert single_list == [('c', 2)]
+
+
+def test_unpack_returns_none_for_missing_units():
+    packer = RequestPacker(token_budget=100, estimator=by_length)
+    packed_list, _ = packer.pack([('a', 0), ('bb', 1), ('ccc', 2)])
+    answer = LLMParser().parse_numbered_pads('=start_pad_1=\nA\n=end_pad_1=\n=START_PAD_3=\nC\n=end_pad_3=')
+    assert packer.unpack(packed_list[0], (answer, -1)) == [(('a', 0), 'A'), (('bb', 1), None), (('ccc', 2), 'C')]
+    # 从缓存读回的结果键是字符串
+    assert packer.unpack(packed_list[0], ({'2': 'B'}, -1))[1] == (('bb', 1), 'B')
+    assert packer.weights(-1) == [1, 2, 3]
+
+
+def test_packed_requests_round_trip_through_the_processor():
+    tasks = [(f'x{i} = {i}', i) for i in range(6)]
+    packer = RequestPacker(token_budget=20)
+    packed_list, single_list = packer.pack(tasks)
+    llm = FakeService(prompt_templates=[packed_prompt], correction_templates=[packed_correction])
+    processor = MultiProcessor(llm, LLMParser().parse_numbered_pads, packed_data_template, packed_prompt, packed_correction, packed_validation)
+    results = processor.multitask_perform(packed_list, 2)
+    unpacked = [item for input_tuple, result in zip(packed_list, results) for item in packer.unpack(input_tuple, result)]
+    assert single_list == []
+    assert llm.stats['requests'] == len(packed_list) < len(tasks)
+    assert sorted(task[-1] for task, content in unpacked) == list(range(6))
+    assert all(task[0] in content for task, content in unpacked)
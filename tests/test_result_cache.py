@@ -0,0 +1,53 @@
+import os
+
+from Packages.Multi_Process import ResultCache
+
+
+def entry_size(cache, key):
+    return os.path.getsize(cache._entry_path(key))
+
+
+def test_set_and_get_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    key = ResultCache.make_key('def f():\n    pass', 'prompt', 'model')
+    assert cache.get(key) is None
+    cache.set(key, '# 注释\ndef f():\n    pass')
+    assert cache.get(key) == '# 注释\ndef f():\n    pass'
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_key_changes_with_any_part():
+    assert ResultCache.make_key('code', 'prompt', 'model-a') != ResultCache.make_key('code', 'prompt', 'model-b')
+    assert ResultCache.make_key('code', 'prompt', 'model-a') == ResultCache.make_key('code', 'prompt', 'model-a')
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    for key in 'abc':
+        cache.set(key, 'x' * 10)
+    cache.max_size = 2 * entry_size(cache, 'a')
+    cache.get('a')
+    cache.set('d', 'x' * 10)
+    assert cache.get('a') is not None
+    assert cache.get('b') is None
+    assert not os.path.exists(cache._entry_path('b'))
+    assert cache.stats()['evictions'] == 2
+
+
+def test_recency_survives_reload(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    for number, key in enumerate('abc'):
+        cache.set(key, 'x' * 10)
+        os.utime(cache._entry_path(key), (1000 + number, 1000 + number))
+    cache.get('a')
+    reloaded = ResultCache(str(tmp_path))
+    assert list(reloaded.entries) == ['b', 'c', 'a']
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.set('a', 'value')
+    with open(cache._entry_path('a'), 'w', encoding='utf-8') as file:
+        file.write('{broken')
+    assert cache.get('a') is None
+    assert cache.stats()['entries'] == 0
@@ -0,0 +1,42 @@
+import threading
+
+import pytest
+
+from Packages.Multi_Process import AsyncMultiProcessor, MultiProcessor, order_tasks
+
+TASKS = [('bb', 0), ('a', 1), ('dddd', 2), ('cc', 3)]
+
+
+def test_fifo_keeps_the_original_order():
+    assert [idx for idx, _ in order_tasks(TASKS, 'fifo')] == [0, 1, 2, 3]
+
+
+def test_lpt_and_spt_sort_by_size_and_stay_stable():
+    assert [idx for idx, _ in order_tasks(TASKS, 'lpt')] == [2, 0, 3, 1]
+    assert [idx for idx, _ in order_tasks(TASKS, 'spt')] == [1, 0, 3, 2]
+
+
+def test_custom_sort_key():
+    assert [idx for idx, _ in order_tasks(TASKS, (lambda task: task[-1] % 2, False))] == [0, 2, 1, 3]
+
+
+class RecordingService:
+    """按请求顺序记录被注释的代码。"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.order = []
+
+    def ask(self, prompt):
+        with self.lock:
+            self.order.append(prompt)
+        return prompt
+
+
+@pytest.mark.parametrize('processor_class', [MultiProcessor, AsyncMultiProcessor])
+def test_results_keep_input_order_under_lpt(processor_class):
+    llm = RecordingService()
+    processor = processor_class(llm, lambda answer: answer, '', '{input_1}', '{answer}', lambda data: True, schedule='lpt')
+    results = processor.multitask_perform(TASKS, 1)
+    assert llm.order == ['dddd', 'bb', 'cc', 'a']
+    assert results == [(code, index) for code, index in TASKS]
@@ -0,0 +1,120 @@
+import threading
+from functools import partial
+
+import pytest
+
+from Applications.RepoAnnotator.Config.code_annotator import data_template, prompt, correction, validation
+from Packages.LLM_Parser import LLMParser, PadDetector
+from Packages.Multi_Process import AsyncMultiProcessor, MultiProcessor
+
+
+def feed_all(detector, chunks):
+    return ''.join(detector.feed(chunk) for chunk in chunks)
+
+
+@pytest.mark.parametrize('size', [1, 3, 7, 100])
+def test_detector_matches_parse_pads_for_any_chunking(size):
+    answer = '说明\n=START_PAD=\n# 注释\nx = 1\n=end_pad=\n多余的文字'
+    chunks = [answer[i:i + size] for i in range(0, len(answer), size)]
+    detector = PadDetector()
+    assert feed_all(detector, chunks).strip() == LLMParser().parse_pads(answer)
+    assert detector.text == answer
+    assert not detector.rejected
+
+
+def test_content_after_a_later_end_pad_is_included():
+    detector = PadDetector()
+    emitted = feed_all(detector, ['=start_pad=a=end', '_pad=b', '=end_pad=c'])
+    assert emitted == 'a=end_pad=b'
+
+
+def test_rejects_when_start_pad_is_missing_from_the_prefix():
+    detector = PadDetector(max_prefix=10)
+    detector.feed('这段回答没有按格式开头')
+    # 前10个字符之后仍可能是一个完整的 =start_pad=，要再收到这么多字符才能确定
+    assert not detector.rejected
+    detector.feed('，后面还有更多的文字')
+    assert detector.rejected
+
+    accepted = PadDetector(max_prefix=10)
+    feed_all(accepted, ['前面的说明', '=start_pad=', 'x = 1'])
+    assert not accepted.rejected
+
+
+def test_content_is_provisional_until_end_pad():
+    detector = PadDetector()
+    emitted = detector.feed('=start_pad=\nx = 1\ny = 2\n')
+    # =end_pad= 出现之前已经交出了部分内容，调用方需要缓存或在校验失败时丢弃
+    assert emitted and detector.end_index == -1
+    assert not validation(detector.text)
+
+
+class StreamingService:
+    """第一次流式回答缺少 =start_pad=，之后的回答格式正确。"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.streams = 0
+        self.closed = 0
+
+    def ask(self, message):
+        return f'=start_pad=\n{message}\n=end_pad='
+
+    def chunks(self):
+        with self.lock:
+            self.streams += 1
+            first = self.streams == 1
+        if first:
+            return ['这是一段没有按照格式的回答，'] * 20
+        return ['=start', '_pad=\n# 注释\n', 'x = 1\n=end_', 'pad=']
+
+    def ask_stream(self, message):
+        try:
+            yield from self.chunks()
+        finally:
+            self.closed += 1
+
+    async def ask_stream_async(self, message):
+        try:
+            for chunk in self.chunks():
+                yield chunk
+        finally:
+            self.closed += 1
+
+
+@pytest.mark.parametrize('processor_class', [MultiProcessor, AsyncMultiProcessor])
+def test_malformed_stream_is_aborted_and_retried(processor_class):
+    llm = StreamingService()
+    processor = processor_class(llm, LLMParser().parse_pads, data_template, prompt, correction, validation, stream_detector=partial(PadDetector, max_prefix=20))
+    chunks = []
+    results = processor.multitask_perform([('x = 1', 0)], 1, on_chunk=lambda index, text: chunks.append((index, text)))
+    assert results == [('# 注释\nx = 1', 0)]
+    assert llm.streams == 2 and llm.closed == 2
+    assert processor.stream_aborts == [0]
+    assert ''.join(text for _, text in chunks).strip() == '# 注释\nx = 1'
+
+
+class RecordingService:
+    """记录收到的提示词，格式正确的回答不应触发纠错请求。"""
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.prompts = []
+
+    def ask(self, message):
+        self.prompts.append(message)
+        return self.answers.pop(0)
+
+
+def test_valid_answer_is_parsed_without_correction():
+    llm = RecordingService(['=start_pad=\n# 注释\nx = 1\n=end_pad='])
+    processor = MultiProcessor(llm, LLMParser().parse_pads, data_template, prompt, correction, validation)
+    assert processor.multitask_perform([('x = 1', 0)], 1) == [('# 注释\nx = 1', 0)]
+    assert len(llm.prompts) == 1
+
+
+def test_corrected_answer_is_parsed():
+    llm = RecordingService(['# 注释\nx = 1', '=start_pad=\n# 注释\nx = 1\n=end_pad='])
+    processor = MultiProcessor(llm, LLMParser().parse_pads, data_template, prompt, correction, validation)
+    assert processor.multitask_perform([('x = 1', 0)], 1) == [('# 注释\nx = 1', 0)]
+    assert len(llm.prompts) == 2
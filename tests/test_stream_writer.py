@@ -0,0 +1,65 @@
+import os
+
+from Applications.RepoAnnotator.Config.code_annotator import data_template, prompt, correction, validation
+from Applications.RepoAnnotator.Tools import StreamWriter
+from Packages.LLM_API import FakeService
+from Packages.LLM_Parser import LLMParser
+from Packages.Multi_Process import MultiProcessor
+
+
+def read(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+def make_writer(tmp_path):
+    file_path_list = [(0, 'a.py'), (1, 'a.py'), (2, 'pkg/b.py')]
+    source_list = [('a0', 0), ('a1', 1), ('b0', 2)]
+    return StreamWriter(file_path_list, 'old', str(tmp_path), source_list)
+
+
+def test_file_is_written_once_all_its_units_finish(tmp_path):
+    writer = make_writer(tmp_path)
+    writer.add(1, 'annotated a1')
+    assert not os.path.exists(tmp_path / 'a.py')
+    writer.on_result(('b0', 2), ('annotated b0', 2))
+    assert read(tmp_path / 'pkg' / 'b.py') == 'annotated b0\n'
+    writer.add(0, 'annotated a0')
+    # 单元按索引顺序写出，与完成顺序无关
+    assert read(tmp_path / 'a.py') == 'annotated a0\nannotated a1\n'
+    assert writer.index_to_path == {} and writer.sources == {}
+
+
+def test_failed_units_fall_back_to_source(tmp_path):
+    writer = make_writer(tmp_path)
+    writer.on_result(('a0', 0), None)
+    writer.on_result(('a1', 1), (None, 1))
+    assert read(tmp_path / 'a.py') == 'a0\na1\n'
+
+
+def test_close_writes_unfinished_files(tmp_path):
+    writer = make_writer(tmp_path)
+    writer.add(0, 'annotated a0')
+    writer.close()
+    assert read(tmp_path / 'a.py') == 'annotated a0\na1\n'
+    assert read(tmp_path / 'pkg' / 'b.py') == 'b0\n'
+    assert not any(name.endswith('.tmp') for name in os.listdir(tmp_path))
+
+
+def test_units_registered_while_streaming(tmp_path):
+    writer = StreamWriter([], 'old', str(tmp_path))
+    writer.register([(5, 'c.py'), (6, 'c.py')], [('c5', 5), ('c6', 6)])
+    writer.add(6, 'annotated c6')
+    writer.add(5, None)
+    assert read(tmp_path / 'c.py') == 'c5\nannotated c6\n'
+
+
+def test_processor_streams_without_keeping_results(tmp_path):
+    tasks = [('x = 1', 0), ('y = 2', 1), ('z = 3', 2)]
+    llm = FakeService(prompt_templates=[prompt], correction_templates=[correction])
+    processor = MultiProcessor(llm, LLMParser().parse_pads, data_template, prompt, correction, validation)
+    writer = StreamWriter([(0, 'a.py'), (1, 'a.py'), (2, 'b.py')], 'old', str(tmp_path), [(code, index) for code, index in tasks])
+    failed = processor.multitask_perform(tasks, 2, on_result=writer.on_result, keep_results=False)
+    assert failed == []
+    assert 'x = 1' in read(tmp_path / 'a.py') and '模拟注释' in read(tmp_path / 'a.py')
+    assert 'z = 3' in read(tmp_path / 'b.py')
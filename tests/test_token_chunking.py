@@ -0,0 +1,57 @@
+from Applications.RepoAnnotator.Tools import CodeAnalyser
+from Packages.tokens import estimate_tokens
+
+
+def unit_cost(analyser, unit):
+    return sum(analyser.estimator(line + '\n') for line in unit['source_code'].split('\n')) * (1 + analyser.output_ratio)
+
+
+def functions(count, body):
+    return '\n'.join(f'def f{i}():\n    {body}\n' for i in range(count))
+
+
+def test_estimate_tokens_counts_cjk_per_character():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('abcdefgh') == 2
+    assert estimate_tokens('注释') == 2
+    assert estimate_tokens('# 注释') == 3
+
+
+def test_units_stay_within_the_token_budget():
+    analyser = CodeAnalyser(token_budget=60)
+    source = functions(30, 'return 1')
+    units = analyser.py_analyser(source, 'a.py')
+    assert len(units) > 1
+    assert all(unit_cost(analyser, unit) <= 60 for unit in units)
+    # 单元首尾相接，覆盖整个文件
+    assert units[0]['start_line'] == 1
+    assert all(b['start_line'] == a['end_line'] + 1 for a, b in zip(units, units[1:]))
+    assert '\n'.join(unit['source_code'] for unit in units) == '\n'.join(source.splitlines())
+
+
+def test_cjk_text_produces_more_units_than_ascii_of_the_same_length():
+    ascii_units = CodeAnalyser(token_budget=200).py_analyser(functions(20, "return '" + 'a' * 20 + "'"), 'a.py')
+    cjk_units = CodeAnalyser(token_budget=200).py_analyser(functions(20, "return '" + '注' * 20 + "'"), 'a.py')
+    assert len(cjk_units) > len(ascii_units)
+
+
+def test_oversized_unit_is_split_by_lines():
+    body = '\n'.join(f'    x{i} = {i}' for i in range(40))
+    analyser = CodeAnalyser(token_budget=50)
+    units = analyser.py_analyser(f'def big():\n{body}\n', 'a.py')
+    assert len(units) > 1
+    assert all(unit_cost(analyser, unit) <= 50 for unit in units)
+    assert units[-1]['end_line'] == 41
+
+
+def test_estimator_and_output_ratio_are_pluggable():
+    source = functions(10, 'return 1')
+    by_line = CodeAnalyser(token_budget=10, estimator=lambda text: 1, output_ratio=0.0).py_analyser(source, 'a.py')
+    assert all(unit['end_line'] - unit['start_line'] + 1 <= 10 for unit in by_line)
+    doubled = CodeAnalyser(token_budget=10, estimator=lambda text: 1, output_ratio=1.0).py_analyser(source, 'a.py')
+    assert len(doubled) > len(by_line)
+
+
+def test_character_threshold_is_used_without_a_budget():
+    units = CodeAnalyser(threshold=40).py_analyser(functions(10, 'return 1'), 'a.py')
+    assert all(len(unit['source_code']) <= 40 for unit in units)
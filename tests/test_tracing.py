@@ -0,0 +1,84 @@
+import json
+
+from Applications.RepoAnnotator.Config.code_annotator import data_template, prompt, correction, validation
+from Packages.LLM_API import FakeService
+from Packages.LLM_Parser import LLMParser
+from Packages.Multi_Process import MultiProcessor, Tracer
+
+
+def read_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+def test_jsonl_spans_nest_under_the_unit(tmp_path):
+    tracer = Tracer(str(tmp_path / 'trace.jsonl'))
+    tracer.files = {7: 'pkg/module.py'}
+    with tracer.trace(7) as unit:
+        with tracer.span('llm.ask', provider='fake') as span:
+            span.set(tokens_out=12)
+        unit.set(status='ok')
+    tracer.record('queue', 7, 1.0, 1.5)
+    tracer.close()
+
+    spans = {span['name']: span for span in read_jsonl(tracer.path)}
+    assert spans['unit']['parent_id'] is None
+    assert spans['unit']['attrs'] == {'unit': 7, 'file_path': 'pkg/module.py', 'status': 'ok'}
+    assert spans['llm.ask']['parent_id'] == spans['unit']['span_id']
+    assert spans['llm.ask']['attrs'] == {'provider': 'fake', 'tokens_out': 12}
+    assert spans['queue']['trace_id'] == 7 and spans['queue']['duration'] == 0.5
+
+
+def test_error_is_recorded_on_the_span(tmp_path):
+    tracer = Tracer(str(tmp_path / 'trace.jsonl'))
+    try:
+        with tracer.trace(1):
+            raise RuntimeError('boom')
+    except RuntimeError:
+        pass
+    tracer.close()
+    assert read_jsonl(tracer.path)[0]['attrs']['error'] == 'RuntimeError: boom'
+
+
+def test_chrome_trace_is_a_json_array_with_named_rows(tmp_path):
+    tracer = Tracer(str(tmp_path / 'trace.json'))
+    tracer.files = {3: 'a.py'}
+    with tracer.trace(3):
+        with tracer.span('parse'):
+            pass
+    tracer.close()
+    with open(tracer.path, 'r', encoding='utf-8') as file:
+        events = json.load(file)
+    assert events[0] == {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 3, 'args': {'name': 'unit 3 a.py'}}
+    assert [event['name'] for event in events[1:]] == ['parse', 'unit']
+    assert all(event['ph'] == 'X' and event['tid'] == 3 for event in events[1:])
+
+
+def test_sampling_is_by_unit_and_drops_child_spans(tmp_path):
+    tracer = Tracer(str(tmp_path / 'trace.jsonl'), sample_rate=0.3)
+    sampled = [index for index in range(200) if tracer.sampled(index)]
+    assert 20 < len(sampled) < 100
+    # 采样只取决于单元索引，另一次运行采到的单元相同
+    other = Tracer(str(tmp_path / 'other.jsonl'), sample_rate=0.3)
+    assert sampled == [index for index in range(200) if other.sampled(index)]
+    other.close()
+    for index in range(200):
+        with tracer.trace(index):
+            with tracer.span('attempt'):
+                pass
+    tracer.close()
+    spans = read_jsonl(tracer.path)
+    assert sorted({span['trace_id'] for span in spans}) == sampled
+    assert len(spans) == 2 * len(sampled)
+
+
+def test_processor_writes_phase_spans(tmp_path):
+    tracer = Tracer(str(tmp_path / 'trace.jsonl'))
+    llm = FakeService(prompt_templates=[prompt])
+    processor = MultiProcessor(llm, LLMParser().parse_pads, data_template, prompt, correction, validation, tracer=tracer)
+    processor.multitask_perform([('a = 1', 0), ('b = 2', 1)], 2)
+    tracer.close()
+    spans = read_jsonl(tracer.path)
+    for index in (0, 1):
+        names = {span['name'] for span in spans if span['trace_id'] == index}
+        assert {'unit', 'attempt', 'llm.ask', 'validate', 'parse'} <= names